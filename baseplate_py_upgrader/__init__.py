@@ -1,83 +1,49 @@
 import argparse
 import logging
-import subprocess
 import sys
 
 from pathlib import Path
-from typing import Callable
-from typing import Dict
+from typing import List
 from typing import Optional
 
+from .api import DirtyRepository
+from .api import get_target_series
+from .api import get_upgrades
+from .api import PREFIX_OVERRIDE
+from .api import upgrade
+from .api import UpgradeCancelled
+from .api import UpgradeError
+from .api import UpgradeOptions
+from .api import UpgradeResult
+from .api import UPGRADES
+from .api import UpgradeStart
+from .api import UpgradeWarning
 from .colors import Color
 from .colors import colorize
 from .colors import print
-from .docker import upgrade_docker_image_references
-from .fixes import v0_29
-from .fixes import v1_0
-from .fixes import v1_3
-from .fixes import v2_0
-from .package_repo import PackageRepo
-from .python_version import guess_python_version
-from .python_version import PythonVersion
-from .requirements import RequirementsFile
-
-
-def no_op_upgrade(
-    root: Path,
-    python_version: Optional[PythonVersion],
-    requirements_file: RequirementsFile,
-    package_repo: PackageRepo,
-) -> int:
-    # nothing to do here!
-    return 0
-
-
-# what prefix should upgrade to what series
-UPGRADES: Dict[str, str] = {
-    "0.26": "0.27",
-    "0.27": "0.28",
-    "0.28": "0.29",
-    "0.29": "0.30",
-    "0.30": "1.0",
-    "1.0": "1.1",
-    "1.1": "1.2",
-    "1.2": "1.3",
-    "1.3": "1.4",
-    "1.4": "1.5",
-    "1.5": "2.0",
-    "2.0": "2.6",
-    "2.1": "2.6",
-    "2.2": "2.6",
-    "2.3": "2.6",
-    "2.4": "2.6",
-    "2.5": "2.6",
-}
-
-# this is useful if we're dealing with pre-releases temporarily
-PREFIX_OVERRIDE: Dict[str, str] = {}
-
-# packages for updating to a series
-UPDATERS: Dict[
-    str, Callable[[Path, Optional[PythonVersion], RequirementsFile, PackageRepo], int]
-] = {
-    "0.27": no_op_upgrade,
-    "0.28": no_op_upgrade,
-    "0.29": v0_29.update,
-    "0.30": no_op_upgrade,
-    "1.0": v1_0.update,
-    "1.1": no_op_upgrade,
-    "1.2": no_op_upgrade,
-    "1.3": v1_3.update,
-    "1.4": no_op_upgrade,
-    "1.5": no_op_upgrade,
-    "2.0": v2_0.update,
-    "2.1": no_op_upgrade,
-    "2.2": no_op_upgrade,
-    "2.3": no_op_upgrade,
-    "2.4": no_op_upgrade,
-    "2.5": no_op_upgrade,
-    "2.6": no_op_upgrade,
-}
+from .context import split_names
+from .runlog import RunLog
+from .scheduler import ScheduleReport
+from .shard import parse_shard
+from .shard import ShardError
+from .shard import ShardResult
+from .workers import DEFAULT_MAX_FILES_PER_WORKER
+from .workers import WorkerSettings
+
+
+__all__ = [
+    "PREFIX_OVERRIDE",
+    "UPGRADES",
+    "UpgradeCancelled",
+    "UpgradeError",
+    "UpgradeOptions",
+    "UpgradeResult",
+    "UpgradeStart",
+    "UpgradeWarning",
+    "get_target_series",
+    "get_upgrades",
+    "upgrade",
+]
 
 
 class LogFormatter(logging.Formatter):
@@ -101,18 +67,109 @@ class LogFormatter(logging.Formatter):
         return f" {self.prefixes[record.levelno]} {colorize(super().format(record), self.text_colors[record.levelno])}"
 
 
-def is_git_repo_and_clean(root: Path) -> bool:
-    result = subprocess.run(
-        ["git", "status", "-s", "--untracked-files=no"], cwd=root, capture_output=True
+def _print_start(start: UpgradeStart, args: argparse.Namespace) -> None:
+    print("Baseplate.py Upgrader", color=Color.CYAN.BOLD)
+    if args.check or args.shard:
+        if args.shard:
+            index, count = args.shard
+            print(f"Upgrading shard {index + 1}/{count} of {start.root}")
+        else:
+            print(f"Checking {start.root}")
+        print(f"Current version: v{start.current_version}")
+        print(f"Target series: {start.target_series}")
+        print()
+        return
+
+    print(f"Upgrading {start.root}")
+    if start.python_version:
+        print(f"Python version: {'.'.join(str(v) for v in start.python_version)}")
+    else:
+        print("Failed to detect Python version.", color=Color.YELLOW.BOLD)
+    print(f"Current version: v{start.current_version}")
+    if start.target_version:
+        print(f"Target version: v{start.target_version} ({start.target_series} series)")
+    else:
+        print(f"Target series: {start.target_series}")
+    print()
+
+    if start.resuming:
+        print("Resuming an interrupted run.", color=Color.CYAN.BOLD)
+
+
+def _confirm_prerelease(target_version: str) -> bool:
+    print(f"v{target_version} is a pre-release!", color=Color.YELLOW.BOLD)
+    print("Upgrades to this version may not be stable yet.")
+    answer = input("To continue, type YES: ")
+    if answer.upper() != "YES":
+        return False
+    print("OK! Be careful!")
+    return True
+
+
+def _print_skipped(result: UpgradeResult) -> None:
+    if not result.skipped_files:
+        return
+
+    print()
+    print(
+        f"Skipped {len(result.skipped_files)} file(s) that exceeded their budget:",
+        color=Color.YELLOW.BOLD,
     )
-    return result.returncode == 0 and not result.stdout
+    for path, reason in result.skipped_files:
+        print(f" • {path} ({reason})")
+    print("These files must be checked and upgraded by hand.")
+
+
+def _print_timings(step_reports: List[ScheduleReport]) -> None:
+    for report in step_reports:
+        print()
+        print(f"Steps ({report.duration:.2f}s):", color=Color.WHITE.BOLD)
+        for timing in report.timings:
+            print(f" • {timing.name}: {timing.duration:.2f}s")
+        path = " → ".join(
+            f"{timing.name} ({timing.duration:.2f}s)" for timing in report.critical_path
+        )
+        print(f"Critical path: {path}")
+
 
+def _check(result: UpgradeResult) -> int:
+    _print_skipped(result)
+
+    print()
+    if result.changed_files:
+        print(
+            f"The upgrade would change {len(result.changed_files)} file(s):",
+            color=Color.RED.BOLD,
+        )
+        for path in result.changed_files:
+            print(f" • {path}")
+    elif result.status != 0:
+        print("Check failed. Please see above for details.", color=Color.RED.BOLD)
+    else:
+        print("Nothing to change!", color=Color.CYAN.BOLD)
+    return result.status
 
-def get_target_series(current_version: str) -> str:
-    for prefix, target in UPGRADES.items():
-        if current_version.startswith(prefix):
-            return target
-    raise Exception(f"No major upgrades available from {repr(current_version)}!")
+
+def _save_shard(result: UpgradeResult, args: argparse.Namespace) -> int:
+    assert result.shard_result
+    shard = result.shard_result
+    shard.dump(args.shard_output)
+    args.shard_output.close()
+
+    _print_skipped(result)
+    print()
+    if result.status == 0:
+        print(
+            f"Shard {shard.shard_index + 1}/{shard.shard_count} done.",
+            color=Color.CYAN.BOLD,
+        )
+        print("Collect the results of every shard and apply them with --merge.")
+    else:
+        print(
+            f"Shard {shard.shard_index + 1}/{shard.shard_count} failed.",
+            color=Color.RED.BOLD,
+        )
+    return result.status
 
 
 def _main() -> int:
@@ -124,61 +181,231 @@ def _main() -> int:
         help="path to the source code of a service you want to upgrade",
         type=Path,
     )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="don't change anything, just fail if the upgrade would change any files",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="with --check, stop at the first change that would be needed",
+    )
+    parser.add_argument(
+        "--diff",
+        metavar="PATCH",
+        type=argparse.FileType("r"),
+        help="only look at files touched by this unified diff ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="REV",
+        help="only look at files changed since this Git revision. requirements and Docker images are still checked in full",
+    )
+    parser.add_argument(
+        "--exclude",
+        metavar="GLOB",
+        action="append",
+        default=[],
+        help="skip paths (relative to source_dir) matching this pattern. generated and vendored code is always skipped. may be given multiple times",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        metavar="N",
+        type=int,
+        default=1,
+        help="refactor Python files in N worker processes",
+    )
+    parser.add_argument(
+        "--file-timeout",
+        metavar="SECONDS",
+        type=float,
+        help="skip Python files that take longer than this to refactor",
+    )
+    parser.add_argument(
+        "--file-memory-limit",
+        metavar="MB",
+        type=int,
+        help="limit each worker process to this much memory and skip Python files that run out of it",
+    )
+    parser.add_argument(
+        "--max-files-per-worker",
+        metavar="N",
+        type=int,
+        default=DEFAULT_MAX_FILES_PER_WORKER,
+        help="replace worker processes after they've refactored N files",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        type=parse_shard,
+        help="only upgrade the files in the I'th of N slices of the repository (1-based). requirements and Docker images are left for --merge",
+    )
+    parser.add_argument(
+        "--shard-output",
+        metavar="PATH",
+        type=argparse.FileType("w"),
+        help="with --shard, where to save the shard's results",
+    )
+    parser.add_argument(
+        "--merge",
+        metavar="PATH",
+        action="append",
+        type=argparse.FileType("r"),
+        help="apply the results saved by every shard, then upgrade requirements and Docker images. given once per shard",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="show how long each step took and which steps held up the upgrade",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue a run that was interrupted, skipping work it already finished",
+    )
+    parser.add_argument(
+        "--select",
+        metavar="NAME",
+        action="append",
+        help="only run these stages (python, config, thrift, text, requirements, docker) or fixers (e.g. sentry). comma-separated, may be given multiple times",
+    )
+    parser.add_argument(
+        "--ignore",
+        metavar="NAME",
+        action="append",
+        help="don't run these stages or fixers. comma-separated, may be given multiple times",
+    )
+    parser.add_argument(
+        "--trigram-index",
+        action="store_true",
+        help="keep an index of the repository's contents in .git to make later runs faster on large repositories",
+    )
+    parser.add_argument(
+        "--log-file",
+        metavar="PATH",
+        type=argparse.FileType("w"),
+        help="also log the run to this file",
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=["text", "jsonl"],
+        default="text",
+        help="with --log-file, log plain text or one JSON event per line",
+    )
     args = parser.parse_args()
 
-    if not is_git_repo_and_clean(args.source_dir):
-        print(
-            f"{args.source_dir} is not a Git repository or has uncommitted changes!",
-            color=Color.RED.BOLD,
-        )
-        print(
-            "This tool makes potentially destructive changes. For safety, please commit first."
-        )
-        return 1
-
-    requirements_file = RequirementsFile.from_root(args.source_dir)
+    if args.log_format == "jsonl" and not args.log_file:
+        parser.error("--log-format jsonl requires --log-file")
+    if args.shard and not args.shard_output:
+        parser.error("--shard requires --shard-output")
+    if args.check and (args.shard or args.merge):
+        parser.error("--check can't be combined with --shard or --merge")
+    if args.shard and args.merge:
+        parser.error("--shard and --merge can't be combined")
+    if args.resume and (args.check or args.merge):
+        parser.error("--resume can't be combined with --check or --merge")
+
+    run_log: Optional[RunLog] = None
+    log_handler: Optional[logging.Handler] = None
+    if args.log_file and args.log_format == "jsonl":
+        run_log = RunLog(args.log_file)
+    elif args.log_file:
+        log_handler = logging.StreamHandler(args.log_file)
+        log_handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        logging.getLogger().addHandler(log_handler)
 
     try:
-        current_version = requirements_file["baseplate"]
-    except KeyError:
-        print("That project doesn't seem to use Baseplate.py!", color=Color.RED.BOLD)
-        return 1
+        return _run(args, run_log)
+    finally:
+        if log_handler:
+            logging.getLogger().removeHandler(log_handler)
+        if args.log_file:
+            args.log_file.close()
 
-    python_version = guess_python_version(args.source_dir)
 
-    package_repo = PackageRepo.new()
-    target_series = get_target_series(current_version)
-    prefix = PREFIX_OVERRIDE.get(target_series, target_series)
-    target_version = package_repo.get_latest_version("baseplate", prefix=prefix)
+def _run(args: argparse.Namespace, run_log: Optional[RunLog]) -> int:
+    try:
+        shards = [ShardResult.load(f) for f in args.merge or []]
+    except ShardError as exc:
+        print(str(exc), color=Color.RED.BOLD)
+        if run_log:
+            run_log.error(str(exc))
+        return 1
 
-    print("Baseplate.py Upgrader", color=Color.CYAN.BOLD)
-    print(f"Upgrading {args.source_dir}")
-    if python_version:
-        print(f"Python version: {'.'.join(str(v) for v in python_version)}")
-    else:
-        print("Failed to detect Python version.", color=Color.YELLOW.BOLD)
-    print(f"Current version: v{current_version}")
-    print(f"Target version: v{target_version} ({target_series} series)")
-    print()
+    def on_start(start: UpgradeStart) -> None:
+        _print_start(start, args)
+        if run_log:
+            run_log.start(start)
+
+    options = UpgradeOptions(
+        check=args.check,
+        fail_fast=args.fail_fast,
+        diff=args.diff.read() if args.diff else None,
+        since=args.since,
+        exclude=args.exclude,
+        workers=WorkerSettings(
+            jobs=max(args.jobs, 1),
+            file_timeout=args.file_timeout,
+            file_memory_limit=(
+                args.file_memory_limit * 1024 * 1024 if args.file_memory_limit else None
+            ),
+            max_files_per_worker=max(args.max_files_per_worker, 1),
+        ),
+        shard=args.shard,
+        merge=shards,
+        resume=args.resume,
+        trigram_index=args.trigram_index,
+        select=split_names(args.select),
+        ignore=split_names(args.ignore),
+        confirm_prerelease=_confirm_prerelease,
+        on_start=on_start,
+    )
+    if run_log:
+        options = options._replace(
+            on_stage_started=run_log.stage_started,
+            on_file_processed=run_log.file_processed,
+            on_stage_done=run_log.stage_done,
+            on_warning=run_log.warning,
+            on_requirement_change=run_log.requirement_changed,
+        )
 
-    if "a" in target_version or "b" in target_version or "rc" in target_version:
-        print(f"v{target_version} is a pre-release!", color=Color.YELLOW.BOLD)
-        print("Upgrades to this version may not be stable yet.")
-        answer = input("To continue, type YES: ")
-        if answer.upper() != "YES":
+    try:
+        result = upgrade(args.source_dir, options)
+    except UpgradeError as exc:
+        if run_log:
+            run_log.error(str(exc))
+        if isinstance(exc, UpgradeCancelled):
             print("Bailing out!")
             return 0
-        print("OK! Be careful!")
+        print(str(exc), color=Color.RED.BOLD)
+        if isinstance(exc, DirtyRepository):
+            print(
+                "This tool makes potentially destructive changes. For safety, please commit first."
+            )
+        return 1
 
-    updater = UPDATERS[target_series]
-    result = updater(args.source_dir, python_version, requirements_file, package_repo)
+    if run_log:
+        run_log.finish(result)
 
-    upgrade_docker_image_references(target_series, args.source_dir)
+    if args.timings:
+        _print_timings(result.step_reports)
 
-    if result == 0:
-        logging.info("Updated baseplate to %s in requirements.txt", target_version)
-        requirements_file["baseplate"] = target_version
+    if result.change_required:
+        print()
+        print(f"Upgrade would change {result.change_required}.", color=Color.RED.BOLD)
+        return 1
+
+    if args.shard:
+        return _save_shard(result, args)
 
+    if args.check:
+        return _check(result)
+
+    _print_skipped(result)
+
+    if result.status == 0:
         print()
         print("Automatic upgrade successful!", color=Color.CYAN.BOLD)
         print("There's more to do:", color=Color.WHITE.BOLD)
@@ -188,7 +415,7 @@ def _main() -> int:
         print(" • Thoroughly test your application.")
         print(" • Commit the changes.")
 
-        if target_series in UPGRADES:
+        if result.target_version and result.target_series in get_upgrades():
             print(
                 "Once you're confident in this upgrade, run this tool again to upgrade further.",
                 color=Color.CYAN.BOLD,
@@ -197,9 +424,7 @@ def _main() -> int:
         print()
         print("Upgrade failed. Please see above for details.", color=Color.RED.BOLD)
 
-    requirements_file.write()
-
-    return result
+    return result.status
 
 
 def main() -> None:
@@ -0,0 +1,562 @@
+"""Upgrade services from Python rather than from the command line.
+
+upgrade() does everything the command line tool does but never prints,
+prompts, or exits. It reports progress through callbacks and returns what
+happened as data, so one process can upgrade many repositories in turn.
+
+Log records still go through the logging module as usual. While an upgrade
+runs, warnings are also collected (and passed to on_warning) along with the
+file and line they're about, where known.
+
+"""
+import logging
+import subprocess
+
+from pathlib import Path
+from typing import Callable
+from typing import Collection
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from .cache import PATTERN_CACHE
+from .context import ChangeRequired
+from .context import FILE_STAGES
+from .context import GLOBAL_STAGES
+from .context import RunContext
+from .context import RunListener
+from .context import Selection
+from .context import STAGES
+from .docker import IMAGE_FILES
+from .docker import ImageReferences
+from .docker import upgrade_docker_image_references
+from .git import get_changed_paths
+from .git import get_diff
+from .git import get_git_path
+from .git import get_head
+from .git import paths_in_diff
+from .journal import Journal
+from .journal import JOURNAL_NAME
+from .journal import JournalError
+from .package_repo import CheckingPackageRepo
+from .package_repo import DeferredPackageRepo
+from .package_repo import PackageRepo
+from .python_version import guess_python_version
+from .python_version import PythonVersion
+from .requirements import RequirementChange
+from .requirements import RequirementsFile
+from .scheduler import run_steps
+from .scheduler import ScheduleReport
+from .scheduler import Step
+from .shard import merge_shards
+from .shard import RepeatFilter
+from .shard import ShardError
+from .shard import ShardResult
+from .trigrams import TrigramIndex
+from .updaters import get_fixer_names
+from .updaters import get_plugin_series
+from .updaters import get_updater
+from .workers import CapturingHandler
+from .workers import WorkerSettings
+
+
+# what prefix should upgrade to what series
+UPGRADES: Dict[str, str] = {
+    "0.26": "0.27",
+    "0.27": "0.28",
+    "0.28": "0.29",
+    "0.29": "0.30",
+    "0.30": "1.0",
+    "1.0": "1.1",
+    "1.1": "1.2",
+    "1.2": "1.3",
+    "1.3": "1.4",
+    "1.4": "1.5",
+    "1.5": "2.0",
+    "2.0": "2.6",
+    "2.1": "2.6",
+    "2.2": "2.6",
+    "2.3": "2.6",
+    "2.4": "2.6",
+    "2.5": "2.6",
+}
+
+# this is useful if we're dealing with pre-releases temporarily
+PREFIX_OVERRIDE: Dict[str, str] = {}
+
+
+class UpgradeError(Exception):
+    """The upgrade can't be done."""
+
+
+class DirtyRepository(UpgradeError):
+    """The repository has uncommitted changes the upgrade could clobber."""
+
+
+class UpgradeCancelled(UpgradeError):
+    """The upgrade would be to a pre-release that wasn't confirmed."""
+
+
+class UpgradeWarning(NamedTuple):
+    level: int
+    message: str
+    path: Optional[str] = None
+    line: Optional[int] = None
+    fixer: Optional[str] = None
+
+
+class UpgradeStart(NamedTuple):
+    """What an upgrade is about to do."""
+
+    root: Path
+    current_version: str
+    target_series: str
+    target_version: Optional[str]
+    python_version: Optional[PythonVersion]
+    resuming: bool
+
+
+class UpgradeOptions(NamedTuple):
+    """How to run an upgrade. These match the command line options.
+
+    :param check: Don't change anything, just report what would change.
+    :param fail_fast: In check mode, stop at the first change that's needed.
+    :param diff: Only look at files touched by this unified diff.
+    :param since: Only look at files changed since this Git revision.
+    :param exclude: Glob patterns for paths to skip.
+    :param workers: How to refactor Python files.
+    :param shard: Only upgrade this (index, count) slice of the repository.
+    :param merge: Apply the results of these shards.
+    :param resume: Continue an interrupted run.
+    :param trigram_index: Keep an index of the repository's files that makes
+        finding the files a stage needs to read cheaper on later runs.
+    :param select: Only run these stages and fixers.
+    :param ignore: Don't run these stages and fixers.
+    :param package_repo: Where to look up package versions. Reusing one
+        between upgrades saves looking the same packages up again.
+    :param confirm_prerelease: Called with the target version if it's a
+        pre-release. The upgrade is cancelled unless this returns True.
+    :param on_start: Called once the upgrade has worked out what to do.
+    :param on_stage_started: Called with the name of each stage that starts.
+    :param on_file_processed: Called with the stage and path of each file
+        a stage finishes with.
+    :param on_stage_done: Called with the name of each stage that finishes.
+    :param on_warning: Called with each warning as it's logged. Warnings
+        passed to it aren't also kept for the result.
+    :param on_requirement_change: Called with each change to a pinned
+        requirement as it's made. Changes are only reported if requirements
+        are being upgraded.
+
+    """
+
+    check: bool = False
+    fail_fast: bool = False
+    diff: Optional[str] = None
+    since: Optional[str] = None
+    exclude: Sequence[str] = ()
+    workers: WorkerSettings = WorkerSettings()
+    shard: Optional[Tuple[int, int]] = None
+    merge: Sequence[ShardResult] = ()
+    resume: bool = False
+    trigram_index: bool = False
+    select: Sequence[str] = ()
+    ignore: Sequence[str] = ()
+    package_repo: Optional[PackageRepo] = None
+    confirm_prerelease: Optional[Callable[[str], bool]] = None
+    on_start: Optional[Callable[[UpgradeStart], None]] = None
+    on_stage_started: Optional[Callable[[str], None]] = None
+    on_file_processed: Optional[Callable[[str, Path], None]] = None
+    on_stage_done: Optional[Callable[[str], None]] = None
+    on_warning: Optional[Callable[[UpgradeWarning], None]] = None
+    on_requirement_change: Optional[Callable[[RequirementChange], None]] = None
+
+
+class UpgradeResult(NamedTuple):
+    """What an upgrade did (or, in check mode, would do).
+
+    :param status: Zero if the upgrade (or check) succeeded.
+    :param changed_files: Files that were (or would be) changed.
+    :param skipped_files: Python files that exceeded their budget, and why.
+    :param warnings: The warnings that were logged, unless they were passed
+        to on_warning instead.
+    :param requirement_changes: The pinned requirements that were (or would
+        be) added, changed, or removed, compared to before the upgrade.
+    :param change_required: In fail-fast check mode, the file that stopped
+        the check.
+    :param shard_result: In shard mode, what to pass on to the merge.
+
+    """
+
+    status: int
+    root: Path
+    current_version: str
+    target_series: str
+    target_version: Optional[str]
+    changed_files: List[Path]
+    skipped_files: List[Tuple[Path, str]]
+    warnings: List[UpgradeWarning]
+    requirement_changes: List[RequirementChange]
+    step_reports: List[ScheduleReport]
+    change_required: Optional[Path] = None
+    shard_result: Optional[ShardResult] = None
+
+
+def is_git_repo_and_clean(root: Path) -> bool:
+    result = subprocess.run(
+        ["git", "status", "-s", "--untracked-files=no"], cwd=root, capture_output=True
+    )
+    return result.returncode == 0 and not result.stdout
+
+
+def _series_key(series: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in series.split("."))
+
+
+def get_upgrades() -> Dict[str, str]:
+    """Get UPGRADES, extended with the series other packages add updaters for.
+
+    A series from another package is upgraded to from the newest series
+    before it, unless this tool already knows where that series goes.
+
+    """
+    upgrades = dict(UPGRADES)
+    known = set(UPGRADES) | set(UPGRADES.values())
+    plugin_series = []
+    for series in get_plugin_series():
+        try:
+            plugin_series.append((_series_key(series), series))
+        except ValueError:
+            logging.warning("Ignoring updater for unknown series %r", series)
+
+    for key, series in sorted(plugin_series):
+        if series in known:
+            continue
+        earlier = [s for s in known if _series_key(s) < key]
+        if earlier:
+            previous = max(earlier, key=_series_key)
+            upgrades.setdefault(previous, series)
+        known.add(series)
+    return upgrades
+
+
+def get_target_series(current_version: str) -> str:
+    for prefix, target in get_upgrades().items():
+        if current_version.startswith(prefix):
+            return target
+    raise Exception(f"No major upgrades available from {repr(current_version)}!")
+
+
+def is_prerelease(version: str) -> bool:
+    return "a" in version or "b" in version or "rc" in version
+
+
+def get_selection(options: UpgradeOptions) -> Selection:
+    """Check the names passed to select and ignore and build a Selection."""
+    selection = Selection(frozenset(options.select), frozenset(options.ignore))
+    # finding fixer names imports every series, so only do it if there are some
+    unknown = (selection.select | selection.ignore) - set(STAGES)
+    if unknown:
+        unknown -= get_fixer_names()
+    if unknown:
+        raise UpgradeError(
+            f"Unknown stage or fixer: {', '.join(sorted(unknown))}. "
+            f"Stages are {', '.join(STAGES)}."
+        )
+    return selection
+
+
+def resume_journal(root: Path) -> Journal:
+    journal = Journal.resume(get_git_path(root, JOURNAL_NAME), root)
+
+    if get_head(root) != journal.head:
+        journal.close()
+        raise JournalError(
+            f"HEAD has moved since the interrupted run started at {journal.head}."
+        )
+
+    unexpected = get_changed_paths(root) - journal.touched_files
+    if unexpected:
+        journal.close()
+        raise JournalError(
+            f"{root} has changes the interrupted run didn't make: {', '.join(sorted(unexpected))}"
+        )
+
+    return journal
+
+
+class _WarningCollector(logging.Handler):
+    def __init__(
+        self, callback: Optional[Callable[[UpgradeWarning], None]] = None
+    ) -> None:
+        super().__init__(logging.WARNING)
+        self.callback = callback
+        # only kept for the result if nothing else is taking them
+        self.warnings: List[UpgradeWarning] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        warning = UpgradeWarning(
+            level=record.levelno,
+            message=record.getMessage(),
+            path=getattr(record, "path", None),
+            line=getattr(record, "line", None),
+            fixer=getattr(record, "fixer", None),
+        )
+        if self.callback:
+            self.callback(warning)
+        else:
+            self.warnings.append(warning)
+
+
+class _CallbackListener(RunListener):
+    def __init__(self, options: UpgradeOptions):
+        self.options = options
+
+    def stage_started(self, stage: str) -> None:
+        if self.options.on_stage_started:
+            self.options.on_stage_started(stage)
+
+    def file_processed(self, stage: str, path: Path) -> None:
+        if self.options.on_file_processed:
+            self.options.on_file_processed(stage, path)
+
+    def stage_done(self, stage: str) -> None:
+        if self.options.on_stage_done:
+            self.options.on_stage_done(stage)
+
+
+def upgrade(root: Path, options: UpgradeOptions = UpgradeOptions()) -> UpgradeResult:
+    """Upgrade the service in root to the next Baseplate.py series.
+
+    Raises UpgradeError if the upgrade can't be started.
+
+    """
+    collector = _WarningCollector(options.on_warning)
+    root_logger = logging.getLogger()
+    root_logger.addHandler(collector)
+
+    # every shard logs the same general advice
+    repeat_filter = RepeatFilter()
+    if options.merge:
+        for handler in root_logger.handlers:
+            handler.addFilter(repeat_filter)
+
+    trigram_index = TrigramIndex.open(root) if options.trigram_index else None
+    try:
+        return _upgrade(root, options, collector, trigram_index)
+    finally:
+        PATTERN_CACHE.save()
+        if trigram_index:
+            trigram_index.close()
+        root_logger.removeHandler(collector)
+        for handler in root_logger.handlers:
+            handler.removeFilter(repeat_filter)
+
+
+def _upgrade(
+    root: Path,
+    options: UpgradeOptions,
+    collector: _WarningCollector,
+    trigram_index: Optional[TrigramIndex],
+) -> UpgradeResult:
+    selection = get_selection(options)
+
+    journal: Optional[Journal] = None
+    if options.resume:
+        try:
+            journal = resume_journal(root)
+        except JournalError as exc:
+            raise UpgradeError(str(exc))
+    elif not options.check and not is_git_repo_and_clean(root):
+        raise DirtyRepository(
+            f"{root} is not a Git repository or has uncommitted changes!"
+        )
+
+    requirements_file = RequirementsFile.from_root(root)
+
+    try:
+        current_version = requirements_file["baseplate"]
+    except KeyError:
+        raise UpgradeError("That project doesn't seem to use Baseplate.py!")
+
+    # the Docker stage reuses the files read while guessing
+    images = ImageReferences()
+    python_version = guess_python_version(root, images)
+
+    file_scope = None
+    if options.since:
+        try:
+            file_scope = get_changed_paths(root, options.since)
+        except subprocess.CalledProcessError as exc:
+            raise UpgradeError(
+                f"Can't find changes since {options.since}: {exc.stderr.strip()}"
+            )
+
+    stages: Optional[Collection[str]] = None
+    if options.shard:
+        stages = FILE_STAGES
+    elif options.merge:
+        stages = GLOBAL_STAGES
+
+    context = RunContext(
+        root,
+        check=options.check,
+        fail_fast=options.fail_fast,
+        scope=paths_in_diff(options.diff) if options.diff is not None else None,
+        exclude=options.exclude,
+        workers=options.workers,
+        stages=stages,
+        shard=options.shard,
+        file_scope=file_scope,
+        trigram_index=trigram_index,
+        selection=selection,
+    )
+    context.add_listener(_CallbackListener(options))
+    target_series = get_target_series(current_version)
+
+    if options.merge:
+        try:
+            merged_series = merge_shards(root, options.merge, context)
+        except ShardError as exc:
+            raise UpgradeError(str(exc))
+
+        if merged_series != target_series:
+            raise UpgradeError(
+                f"Shards upgraded to {merged_series} but expected {target_series}!"
+            )
+
+    # requirements.txt is only written at the very end, so leaving it alone
+    # is a matter of not writing it and not upgrading packages in it
+    wants_requirements = selection.wants_stage("requirements")
+    if wants_requirements and not options.shard:
+        requirements_file.on_change = options.on_requirement_change
+
+    target_version: Optional[str] = None
+    if options.check and wants_requirements:
+        package_repo: PackageRepo = CheckingPackageRepo(context)
+    elif options.shard or not wants_requirements:
+        package_repo = DeferredPackageRepo()
+    else:
+        package_repo = options.package_repo or PackageRepo.new()
+        if journal and journal.target_version:
+            target_version = journal.target_version
+        else:
+            prefix = PREFIX_OVERRIDE.get(target_series, target_series)
+            target_version = package_repo.get_latest_version("baseplate", prefix=prefix)
+
+    if options.on_start:
+        options.on_start(
+            UpgradeStart(
+                root=root,
+                current_version=current_version,
+                target_series=target_series,
+                target_version=target_version,
+                python_version=python_version,
+                resuming=journal is not None,
+            )
+        )
+
+    if target_version and not journal and is_prerelease(target_version):
+        confirm = options.confirm_prerelease
+        if not (confirm and confirm(target_version)):
+            raise UpgradeCancelled(f"v{target_version} is a pre-release.")
+
+    if not options.check and not options.merge:
+        if journal is None:
+            journal = Journal.start(
+                get_git_path(root, JOURNAL_NAME), root, get_head(root), target_version
+            )
+        context.use_journal(journal)
+
+    shard_warnings = CapturingHandler(logging.WARNING)
+    if options.shard:
+        logging.getLogger().addHandler(shard_warnings)
+
+    # this runs alongside the updater's own steps where it can
+    context.add_step(
+        Step(
+            "upgrade Docker images",
+            lambda: upgrade_docker_image_references(target_series, context, images),
+            writes=IMAGE_FILES,
+        )
+    )
+
+    def make_result(
+        status: int,
+        change_required: Optional[Path] = None,
+        shard_result: Optional[ShardResult] = None,
+    ) -> UpgradeResult:
+        return UpgradeResult(
+            status=status,
+            root=root,
+            current_version=current_version,
+            target_series=target_series,
+            target_version=target_version,
+            changed_files=sorted(set(context.changed_files)),
+            skipped_files=list(context.skipped_files),
+            warnings=list(collector.warnings),
+            requirement_changes=(
+                requirements_file.changes() if wants_requirements else []
+            ),
+            step_reports=list(context.step_reports),
+            change_required=change_required,
+            shard_result=shard_result,
+        )
+
+    updater = get_updater(target_series)
+    try:
+        result = updater(root, python_version, requirements_file, package_repo, context)
+
+        # in case the updater doesn't run its steps through the scheduler
+        if context.queued_steps:
+            result = max(result, run_steps(context, []))
+    except ChangeRequired as exc:
+        return make_result(1, change_required=exc.path)
+    finally:
+        logging.getLogger().removeHandler(shard_warnings)
+
+    if options.shard:
+        index, count = options.shard
+        shard_result = ShardResult(
+            shard_index=index,
+            shard_count=count,
+            target_series=target_series,
+            result=result,
+            names_seen=sorted(context.names_seen),
+            warnings=shard_warnings.entries,
+            patch=get_diff(root),
+        )
+        if journal:
+            journal.remove()
+        return make_result(result, shard_result=shard_result)
+
+    if options.check:
+        if context.skipped_files and result == 0:
+            result = 1
+
+        if (
+            wants_requirements
+            and requirements_file.changed
+            and requirements_file.path not in context.changed_files
+        ):
+            context.record_change(requirements_file.path, "requirements")
+
+        if context.changed_files:
+            result = 1
+        return make_result(result)
+
+    result = max([result] + [shard.result for shard in options.merge])
+    if wants_requirements:
+        if result == 0:
+            assert target_version
+            logging.info("Updated baseplate to %s in requirements.txt", target_version)
+            requirements_file["baseplate"] = target_version
+
+        context.touch(requirements_file.path)
+        requirements_file.write()
+    if journal:
+        journal.remove()
+
+    return make_result(result)
@@ -0,0 +1,173 @@
+"""On-disk caches that make starting the upgrader cheap.
+
+lib2to3 needs two things before it can refactor anything: grammar tables for
+Python and for its pattern language, and a compiled matcher for every fixer's
+PATTERN. lib2to3 pickles its grammar tables next to its own source, which is
+often not writable, in which case they're regenerated on every start. Fixer
+patterns are compiled from scratch for every fixer instance. This module
+keeps both in a per-user cache directory instead.
+
+"""
+import logging
+import os
+import pickle
+import sys
+import tempfile
+
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+CompiledPattern = Tuple[Any, Any]
+
+
+def get_cache_dir() -> Path:
+    override = os.environ.get("BASEPLATE_PY_UPGRADER_CACHE_DIR")
+    if override:
+        return Path(override)
+
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "baseplate.py-upgrader"
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+_original_load_grammar: Optional[Callable[..., Any]] = None
+
+
+def _grammar_pickle_name(gt: str) -> str:
+    # the same name lib2to3 gives the pickles it generates
+    head, tail = os.path.splitext(gt)
+    if tail == ".txt":
+        tail = ""
+    return head + tail + ".".join(map(str, sys.version_info)) + ".pickle"
+
+
+def _is_up_to_date(gp: str, gt: str) -> bool:
+    try:
+        return os.path.getmtime(gp) >= os.path.getmtime(gt)
+    except FileNotFoundError:
+        return os.path.exists(gp)
+
+
+def _load_grammar(
+    gt: str = "Grammar.txt",
+    gp: Optional[str] = None,
+    save: bool = True,
+    force: bool = False,
+    logger: Optional[logging.Logger] = None,
+) -> Any:
+    assert _original_load_grammar is not None
+    if gp is None:
+        gp = _grammar_pickle_name(gt)
+        if not _is_up_to_date(gp, gt):
+            # the pickle that should ship with lib2to3 is missing or stale.
+            # lib2to3 would regenerate it and try to write it next to its own
+            # source which often fails, so keep our own copy instead.
+            cache_dir = get_cache_dir()
+            try:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+            except OSError:
+                pass
+            gp = str(cache_dir / os.path.basename(gp))
+    return _original_load_grammar(gt, gp, save, force, logger)
+
+
+def install_grammar_cache() -> None:
+    """Make lib2to3 keep the grammar tables it generates in our cache directory.
+
+    This only has an effect if it runs before lib2to3.pygram is imported,
+    which happens as soon as any fixers are imported.
+
+    """
+    global _original_load_grammar
+
+    # this is imported here because nothing else needs lib2to3 until an
+    # updater has been picked
+    from lib2to3.pgen2 import driver
+
+    if driver.load_grammar is not _load_grammar:
+        _original_load_grammar = driver.load_grammar
+        driver.load_grammar = _load_grammar
+
+
+class PatternCache:
+    """Compiled fixer patterns, shared between fixers and persisted to disk.
+
+    Fixers with identical PATTERNs (like the per-series rename fixers) share
+    a single compiled matcher. Compiled patterns are only read, never
+    modified, during matching so sharing them is safe.
+
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self._patterns: Optional[Dict[str, CompiledPattern]] = None
+        self._dirty = False
+
+    def _load(self) -> Dict[str, CompiledPattern]:
+        if self._patterns is not None:
+            return self._patterns
+
+        patterns: Dict[str, CompiledPattern] = {}
+        if self.path:
+            try:
+                with self.path.open("rb") as f:
+                    patterns = pickle.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as exc:
+                logger.debug("Ignoring unreadable pattern cache: %s", exc)
+        self._patterns = patterns
+        return patterns
+
+    def get(self, pattern: str) -> CompiledPattern:
+        patterns = self._load()
+        try:
+            return patterns[pattern]
+        except KeyError:
+            # this is imported late because it loads the pattern grammar.
+            from lib2to3.patcomp import PatternCompiler
+
+            compiled: CompiledPattern = PatternCompiler().compile_pattern(
+                pattern, with_tree=True
+            )
+            patterns[pattern] = compiled
+            self._dirty = True
+            return compiled
+
+    def save(self) -> None:
+        """Write newly compiled patterns to disk. Call this once per run."""
+        if not self._dirty or not self.path or self._patterns is None:
+            return
+
+        try:
+            _write_atomically(self.path, pickle.dumps(self._patterns))
+            self._dirty = False
+        except OSError as exc:
+            logger.debug("Failed to write pattern cache: %s", exc)
+
+
+def _pattern_cache_path() -> Path:
+    version = ".".join(str(v) for v in sys.version_info)
+    return get_cache_dir() / f"patterns-{version}.pickle"
+
+
+PATTERN_CACHE = PatternCache(_pattern_cache_path())
@@ -0,0 +1,230 @@
+"""Declarative rules for migrating INI config files.
+
+Each rule applies to sections of one kind, named by prefix ("app:",
+"server:") or by full name ("pshell"), and to an option given either by name
+("sentry.site") or by suffix ("*.max_retries"). Rules are compiled into
+dictionaries keyed by section kind and option name (or the last part of it
+for suffixes), so a config file is handled in a single pass whose cost
+depends on the options it actually contains, not on how many rules there
+are.
+
+Wherever a rule names another option, a "*" stands for whatever the "*" in
+the rule's own option matched.
+
+"""
+import logging
+
+from pathlib import Path
+from typing import Collection
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Union
+
+from .context import RunContext
+from .ini import IniDocument
+from .ini import IniSection
+
+
+logger = logging.getLogger(__name__)
+
+
+class When(NamedTuple):
+    """Only apply a rule if an option is set (to one of values, if given).
+
+    Values are compared case-insensitively.
+
+    """
+
+    option: str
+    values: Collection[str] = ()
+
+
+class RemoveSection(NamedTuple):
+    section: str
+
+
+class RemoveOption(NamedTuple):
+    section: str
+    option: str
+    when: Optional[When] = None
+
+
+class RenameOption(NamedTuple):
+    section: str
+    option: str
+    new_name: str
+    when: Optional[When] = None
+
+
+class WarnOnOption(NamedTuple):
+    """Warn about an option.
+
+    The message may refer to {section} and {path}.
+
+    """
+
+    section: str
+    option: str
+    message: str
+    when: Optional[When] = None
+
+
+class RequireOption(NamedTuple):
+    """Warn if a section is missing an option.
+
+    The message may refer to {section} and {path}.
+
+    """
+
+    section: str
+    option: str
+    message: str
+
+
+class AddOption(NamedTuple):
+    """Add an option to sections that don't have it yet.
+
+    The new option goes right after the option named by after, if it's there.
+
+    """
+
+    section: str
+    option: str
+    value: str
+    after: Optional[str] = None
+    when: Optional[When] = None
+
+
+OptionRule = Union[RemoveOption, RenameOption, WarnOnOption]
+SectionRule = Union[RequireOption, AddOption]
+ConfigRule = Union[RemoveSection, OptionRule, SectionRule]
+
+
+def _section_kind(name: str) -> str:
+    prefix, colon, _ = name.partition(":")
+    return prefix + colon
+
+
+def _expand(name: str, star: Optional[str]) -> str:
+    return name.replace("*", star) if star is not None else name
+
+
+class ConfigRules:
+    """A set of config rules compiled for lookup by section and option."""
+
+    def __init__(self, rules: Sequence[ConfigRule]):
+        self.removed_sections: List[str] = []
+        self._by_name: Dict[str, Dict[str, List[OptionRule]]] = {}
+        self._by_suffix: Dict[str, Dict[str, List[OptionRule]]] = {}
+        self._section_rules: Dict[str, List[SectionRule]] = {}
+
+        for rule in rules:
+            if isinstance(rule, RemoveSection):
+                self.removed_sections.append(rule.section)
+            elif isinstance(rule, (RequireOption, AddOption)):
+                self._section_rules.setdefault(rule.section, []).append(rule)
+            elif rule.option.startswith("*."):
+                by_suffix = self._by_suffix.setdefault(rule.section, {})
+                by_suffix.setdefault(rule.option[2:], []).append(rule)
+            else:
+                by_name = self._by_name.setdefault(rule.section, {})
+                by_name.setdefault(rule.option, []).append(rule)
+
+    def _applies(
+        self,
+        document: IniDocument,
+        section: IniSection,
+        when: Optional[When],
+        star: Optional[str],
+    ) -> bool:
+        if when is None:
+            return True
+        value = document.get(section, _expand(when.option, star))
+        if value is None:
+            return False
+        return not when.values or value.lower() in {v.lower() for v in when.values}
+
+    def apply(self, document: IniDocument, path: Path) -> None:
+        for name in self.removed_sections:
+            document.remove_section(name)
+
+        for section in document.sections:
+            kind = _section_kind(section.name)
+            by_name = self._by_name.get(kind, {})
+            by_suffix = self._by_suffix.get(kind, {})
+            section_rules = self._section_rules.get(kind, [])
+            if not (by_name or by_suffix or section_rules):
+                continue
+
+            for section_rule in section_rules:
+                self._apply_to_section(document, section, section_rule, path)
+
+            for name in document.options(section):
+                for rule in by_name.get(name, ()):
+                    self._apply_to_option(document, section, rule, name, None, path)
+
+                head, dot, last = name.rpartition(".")
+                for rule in by_suffix.get(last, ()) if dot else ():
+                    self._apply_to_option(document, section, rule, name, head, path)
+
+    def _apply_to_section(
+        self, document: IniDocument, section: IniSection, rule: SectionRule, path: Path
+    ) -> None:
+        if isinstance(rule, RequireOption):
+            if not document.has_option(section, rule.option):
+                logger.warning(
+                    rule.message.format(section=section.name, path=path),
+                    extra={"path": str(path)},
+                )
+        elif not document.has_option(section, rule.option):
+            if self._applies(document, section, rule.when, None):
+                section.set(rule.option, rule.value, after=rule.after)
+
+    def _apply_to_option(
+        self,
+        document: IniDocument,
+        section: IniSection,
+        rule: OptionRule,
+        name: str,
+        star: Optional[str],
+        path: Path,
+    ) -> None:
+        if not self._applies(document, section, rule.when, star):
+            return
+
+        # the option may be inherited from (or also set in) the DEFAULT section
+        targets = [section]
+        if document.defaults and document.defaults is not section:
+            targets.append(document.defaults)
+
+        if isinstance(rule, RemoveOption):
+            for target in targets:
+                target.remove(name)
+        elif isinstance(rule, RenameOption):
+            for target in targets:
+                target.rename(name, _expand(rule.new_name, star))
+        else:
+            logger.warning(
+                rule.message.format(section=section.name, path=path),
+                extra={"path": str(path)},
+            )
+
+
+def update_config_files(context: RunContext, rules: ConfigRules, what: str) -> None:
+    """Apply config rules to every INI file in the repository."""
+
+    def update_config_file(path: Path) -> None:
+        if path.is_symlink():
+            return
+
+        document = IniDocument.read(path)
+        original = str(document)
+        rules.apply(document, path)
+        new = str(document)
+        if new != original:
+            context.write_text(path, new, what)
+
+    context.process_files("config", update_config_file, context.find_files("*.ini"))
@@ -0,0 +1,357 @@
+import logging
+import os
+import threading
+
+from pathlib import Path
+from typing import Callable
+from typing import Collection
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+from typing import TypeVar
+
+from .inventory import FileInventory
+from .journal import Journal
+from .parallel import map_files
+from .scheduler import ScheduleReport
+from .scheduler import Step
+from .trigrams import TrigramIndex
+from .workers import WorkerSettings
+
+
+logger = logging.getLogger(__name__)
+
+
+T = TypeVar("T")
+
+
+# stages that look at individual files. these can be split up between shards.
+FILE_STAGES = ("python", "config", "thrift", "text")
+
+# stages that make decisions for the whole repository. these run only once.
+GLOBAL_STAGES = ("requirements", "docker")
+
+STAGES = FILE_STAGES + GLOBAL_STAGES
+
+
+class Selection(NamedTuple):
+    """Which stages and fixers a run was asked for, by name.
+
+    Names are stages (see STAGES) or fixers, named after their module without
+    the "fix_" prefix, e.g. "sentry". Selecting a fixer runs the python stage
+    with only the selected fixers. Ignoring the python stage ignores all of
+    its fixers.
+
+    :param select: If not empty, only run these.
+    :param ignore: Never run these.
+
+    """
+
+    select: FrozenSet[str] = frozenset()
+    ignore: FrozenSet[str] = frozenset()
+
+    def wants_stage(self, stage: str) -> bool:
+        if stage in self.ignore:
+            return False
+        if not self.select or stage in self.select:
+            return True
+        return stage == "python" and any(name not in STAGES for name in self.select)
+
+    def wants_fixer(self, name: str) -> bool:
+        if name in self.ignore or "python" in self.ignore:
+            return False
+        return not self.select or name in self.select or "python" in self.select
+
+
+def split_names(values: Optional[Sequence[str]]) -> List[str]:
+    """Split comma-separated command line values into a list of names."""
+    names = [name.strip() for value in values or () for name in value.split(",")]
+    return [name for name in names if name]
+
+
+class ChangeRequired(Exception):
+    """Raised in fail-fast check mode as soon as any change is needed."""
+
+    def __init__(self, path: Path, what: str):
+        super().__init__(f"{path} needs {what} updated")
+        self.path = path
+        self.what = what
+
+
+class FileContext:
+    """State recorded by fixers while refactoring a single file.
+
+    A fresh context is handed to every fixer for every file so that nothing
+    leaks from one file to the next. File contexts only hold plain data so
+    that they can be shipped back from worker processes and merged into the
+    run context.
+
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.names_seen: Set[str] = set()
+
+    def record_name(self, full_name: str) -> None:
+        """Record that a dotted name and all of its parents were referenced."""
+        parent_name = ""
+        for name in full_name.split("."):
+            if parent_name:
+                parent_name = f"{parent_name}.{name}"
+            else:
+                parent_name = name
+
+            self.names_seen.add(parent_name)
+
+
+class RunListener:
+    """Gets told about progress through a run.
+
+    Calls may come from several threads, but never from more than one at a
+    time.
+
+    """
+
+    def stage_started(self, stage: str) -> None:
+        pass
+
+    def file_processed(self, stage: str, path: Path) -> None:
+        pass
+
+    def stage_done(self, stage: str) -> None:
+        pass
+
+
+class RunContext:
+    """State shared by all stages of a single upgrade run.
+
+    Stages find the files they operate on with find_files() and write changes
+    back through write_text() so that a run can be restricted to a subset of
+    the repository or made read-only (check mode) in one place.
+
+    :param check: Don't write anything, just record which files would change.
+    :param fail_fast: In check mode, stop at the first required change.
+    :param scope: If given, only these files (relative to root) are looked at.
+    :param exclude: Glob patterns for paths (relative to root) that should
+        never be looked at, in addition to generated and vendored code.
+    :param workers: How to run (and budget) refactoring of Python files.
+    :param stages: If given, only run these stages (see FILE_STAGES and
+        GLOBAL_STAGES).
+    :param shard: If given, a (index, count) pair. Only the index'th of count
+        equal slices of the repository's files are looked at.
+    :param file_scope: If given, stages that operate on individual files only
+        look at these files (relative to root). Stages that make decisions for
+        the whole repository still see all of it.
+    :param trigram_index: If given, used to narrow down which files stages
+        read when they're looking for a string (see files_containing()).
+    :param selection: Which stages and fixers were asked for.
+
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        check: bool = False,
+        fail_fast: bool = False,
+        scope: Optional[Set[str]] = None,
+        exclude: Sequence[str] = (),
+        workers: WorkerSettings = WorkerSettings(),
+        stages: Optional[Collection[str]] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        file_scope: Optional[Set[str]] = None,
+        trigram_index: Optional[TrigramIndex] = None,
+        selection: Selection = Selection(),
+    ) -> None:
+        self.root = root
+        self.check = check
+        self.fail_fast = fail_fast
+        self.repo_inventory = FileInventory(root, scope=scope, exclude=exclude)
+        if shard is None and file_scope is None:
+            self.inventory = self.repo_inventory
+        else:
+            if scope is not None and file_scope is not None:
+                file_scope = scope & file_scope
+            self.inventory = FileInventory(
+                root,
+                scope=file_scope if file_scope is not None else scope,
+                exclude=exclude,
+                shard=shard,
+            )
+        self.file_scope = file_scope
+        self.names_seen: Set[str] = set()
+        self.trigram_index = trigram_index
+        self.workers = workers
+        self.stages = stages
+        self.selection = selection
+        self.journal: Optional[Journal] = None
+        self.changed_files: List[Path] = []
+        self.skipped_files: List[Tuple[Path, str]] = []
+        self.queued_steps: List[Step] = []
+        self.step_reports: List[ScheduleReport] = []
+        self.listeners: List[RunListener] = []
+        self._listener_lock = threading.Lock()
+        self._started_stages: Set[str] = set()
+
+    def merge(self, file_context: FileContext) -> None:
+        """Fold the results of a single file into the run.
+
+        Merging is order-independent so results come out the same no matter
+        which order (or which process) files were processed in.
+
+        """
+        self.names_seen.update(file_context.names_seen)
+
+    def add_step(self, step: Step) -> None:
+        """Queue up a step to run along with the updater's own steps."""
+        self.queued_steps.append(step)
+
+    def use_journal(self, journal: Journal) -> None:
+        """Record progress in a journal and skip work it says is done."""
+        self.journal = journal
+        self.names_seen.update(journal.names_seen)
+
+    def wants(self, stage: str) -> bool:
+        """Return if the named stage should run."""
+        if self.stages is not None and stage not in self.stages:
+            return False
+        if not self.selection.wants_stage(stage):
+            return False
+        return not (self.journal and self.journal.is_done(stage))
+
+    def add_listener(self, listener: "RunListener") -> None:
+        self.listeners.append(listener)
+
+    def start_stage(self, stage: str) -> None:
+        """Record that a stage has started. Repeated calls are ignored."""
+        with self._listener_lock:
+            if stage in self._started_stages:
+                return
+            self._started_stages.add(stage)
+            for listener in self.listeners:
+                listener.stage_started(stage)
+
+    def finish_stage(self, stage: str) -> None:
+        if self.journal:
+            self.journal.finish_stage(stage)
+        with self._listener_lock:
+            for listener in self.listeners:
+                listener.stage_done(stage)
+
+    def is_file_done(self, stage: str, path: Path) -> bool:
+        return bool(self.journal and self.journal.is_done(stage, path))
+
+    def finish_file(
+        self, stage: str, path: Path, names_seen: Iterable[str] = ()
+    ) -> None:
+        if self.journal:
+            self.journal.finish_file(stage, path, names_seen)
+        with self._listener_lock:
+            for listener in self.listeners:
+                listener.file_processed(stage, path)
+
+    def process_files(
+        self,
+        stage: str,
+        function: Callable[[Path], T],
+        paths: Sequence[Path],
+        skip_finished: bool = True,
+    ) -> List[T]:
+        """Call function on each file (see map_files()), then mark it processed.
+
+        Files that the run being resumed already finished are skipped, unless
+        skip_finished is false. Stages whose results per file aren't kept in
+        the journal need them for every file.
+
+        """
+
+        def process(path: Path) -> T:
+            result = function(path)
+            self.finish_file(stage, path)
+            return result
+
+        if skip_finished:
+            paths = [path for path in paths if not self.is_file_done(stage, path)]
+        self.start_stage(stage)
+        return map_files(process, paths)
+
+    def touch(self, path: Path) -> None:
+        """Record that a file is about to be written."""
+        if self.trigram_index:
+            self.trigram_index.invalidate(path)
+        if self.journal:
+            self.journal.touch(path)
+
+    def relative_path(self, path: Path) -> str:
+        return os.path.relpath(path, self.root)
+
+    def in_scope(self, path: Path) -> bool:
+        return self.inventory.in_scope(path)
+
+    def is_excluded(self, path: Path) -> bool:
+        """Check if the user asked for a path to be skipped with --exclude."""
+        return self.repo_inventory.excludes(path)
+
+    def find_files(self, *patterns: str) -> List[Path]:
+        """Find files in the repository whose names match any of the patterns.
+
+        The repository is only walked once per run and generated or vendored
+        code is skipped. Results are in a stable order.
+
+        """
+        return self.inventory.find(*patterns)
+
+    def find_repo_files(self, *patterns: str) -> List[Path]:
+        """Like find_files(), but for stages that look at the whole repository.
+
+        These stages aren't limited to a shard or to recently changed files.
+
+        """
+        return self.repo_inventory.find(*patterns)
+
+    def files_containing(self, needle: bytes, paths: List[Path]) -> List[Path]:
+        """Narrow paths down to the files that may contain needle.
+
+        Without a trigram index, this is all of them. Either way, stages must
+        still check the files they get back.
+
+        """
+        if self.trigram_index is None:
+            return paths
+        return self.trigram_index.candidates(needle, paths)
+
+    def record_change(self, path: Path, what: str) -> None:
+        """Record that a file needs changes."""
+        self.changed_files.append(path)
+        if self.check:
+            logger.warning("Would update %s in %s", what, path)
+            if self.fail_fast:
+                raise ChangeRequired(path, what)
+
+    def merge_changes(self, paths: List[Path], what: str) -> None:
+        """Record changes that were already reported by a worker process."""
+        self.changed_files.extend(paths)
+        if paths and self.check and self.fail_fast:
+            raise ChangeRequired(paths[0], what)
+
+    def record_skipped(self, path: Path, reason: str) -> None:
+        """Record that a file was given up on and must be upgraded by hand."""
+        self.skipped_files.append((path, reason))
+        logger.error("Skipped %s: it %s", path, reason)
+
+    def write_text(
+        self, path: Path, content: str, what: str, encoding: Optional[str] = None
+    ) -> None:
+        """Write new content to a file, unless this is a check-only run."""
+        self.record_change(path, what)
+        if self.check:
+            return
+
+        self.touch(path)
+        with path.open("w", encoding=encoding) as f:
+            f.write(content)
+        logger.info("Updated %s in %s", what, path)
@@ -0,0 +1,476 @@
+"""Run upgrades in a long-lived daemon so each one starts warm.
+
+Every run of the command line tool pays to import and compile the lib2to3
+grammar and fixers and to look packages up on PyPI before it gets to the
+service it's upgrading. The daemon pays that once: each of its worker
+processes imports every series' fixers and compiles their patterns when it
+starts, and keeps what it has looked up on PyPI for a while.
+
+Jobs are submitted over a Unix socket as a single line of JSON. The daemon
+streams back one line of JSON per event (see upgrade()'s callbacks), ending
+with a "result" or "error" event.
+
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+
+from .api import upgrade
+from .api import UpgradeError
+from .api import UpgradeOptions
+from .api import UpgradeResult
+from .api import UpgradeStart
+from .api import UpgradeWarning
+from .cache import install_grammar_cache
+from .colors import Color
+from .colors import print
+from .context import split_names
+from .package_repo import PackageRepo
+
+
+logger = logging.getLogger(__name__)
+
+
+Event = Dict[str, Any]
+
+
+# how long worker processes trust what they've looked up on PyPI
+PACKAGE_CACHE_TTL = 600.0
+
+# events that end a job's stream
+FINAL_EVENTS = ("result", "error")
+
+
+def default_socket_path() -> Path:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_dir) / f"baseplate.py-upgrader-{os.getuid()}.sock"
+
+
+class Job(NamedTuple):
+    """An upgrade to run. See UpgradeOptions for what these mean.
+
+    :param allow_prerelease: Upgrade even if the target is a pre-release.
+
+    """
+
+    root: str
+    check: bool = False
+    fail_fast: bool = False
+    diff: Optional[str] = None
+    since: Optional[str] = None
+    exclude: Sequence[str] = ()
+    resume: bool = False
+    trigram_index: bool = False
+    select: Sequence[str] = ()
+    ignore: Sequence[str] = ()
+    allow_prerelease: bool = False
+
+
+_package_repo: Optional[PackageRepo] = None
+_package_repo_created = 0.0
+
+
+def _get_package_repo() -> PackageRepo:
+    global _package_repo, _package_repo_created
+
+    now = time.monotonic()
+    if _package_repo is None or now - _package_repo_created > PACKAGE_CACHE_TTL:
+        _package_repo = PackageRepo.new()
+        _package_repo_created = now
+    return _package_repo
+
+
+def warm_up() -> None:
+    """Import every series' fixers and compile their patterns."""
+    # lib2to3 loads its grammar when it's first imported
+    install_grammar_cache()
+
+    # these are imported here because they pull in lib2to3
+    from lib2to3.refactor import get_fixers_from_package
+
+    from .cache import PATTERN_CACHE
+    from .context import RunContext
+    from .refactor import BaseplateRefactoringTool
+    from .updaters import get_updater
+    from .updaters import UPDATERS
+
+    for series, module_name in UPDATERS.items():
+        get_updater(series)
+        if module_name:
+            fixers = get_fixers_from_package(module_name)
+            BaseplateRefactoringTool(fixers, RunContext(Path.cwd()))
+    PATTERN_CACHE.save()
+
+
+def _result_event(result: UpgradeResult) -> Event:
+    return {
+        "event": "result",
+        "status": result.status,
+        "current_version": result.current_version,
+        "target_series": result.target_series,
+        "target_version": result.target_version,
+        "changed_files": [str(path) for path in result.changed_files],
+        "skipped_files": [[str(path), reason] for path, reason in result.skipped_files],
+        "requirement_changes": [list(change) for change in result.requirement_changes],
+        "change_required": (
+            str(result.change_required) if result.change_required else None
+        ),
+    }
+
+
+def run_job(job: Job, events: Any) -> None:
+    """Run a job, putting its events on the events queue."""
+
+    def on_start(start: UpgradeStart) -> None:
+        events.put(
+            {
+                "event": "start",
+                "current_version": start.current_version,
+                "target_series": start.target_series,
+                "target_version": start.target_version,
+                "resuming": start.resuming,
+            }
+        )
+
+    def on_file_processed(stage: str, path: Path) -> None:
+        events.put({"event": "file", "stage": stage, "path": str(path)})
+
+    def on_stage_done(stage: str) -> None:
+        events.put({"event": "stage", "stage": stage})
+
+    def on_warning(warning: UpgradeWarning) -> None:
+        events.put({"event": "warning", **warning._asdict()})
+
+    options = UpgradeOptions(
+        check=job.check,
+        fail_fast=job.fail_fast,
+        diff=job.diff,
+        since=job.since,
+        exclude=job.exclude,
+        resume=job.resume,
+        trigram_index=job.trigram_index,
+        select=job.select,
+        ignore=job.ignore,
+        package_repo=_get_package_repo(),
+        confirm_prerelease=lambda version: job.allow_prerelease,
+        on_start=on_start,
+        on_file_processed=on_file_processed,
+        on_stage_done=on_stage_done,
+        on_warning=on_warning,
+    )
+
+    try:
+        result = upgrade(Path(job.root), options)
+    except UpgradeError as exc:
+        events.put({"event": "error", "message": str(exc)})
+    except Exception as exc:
+        logger.exception("Upgrade of %s failed", job.root)
+        events.put({"event": "error", "message": f"{type(exc).__name__}: {exc}"})
+    else:
+        events.put(_result_event(result))
+
+
+class UpgradeDaemon:
+    """Run jobs in a pool of warm worker processes.
+
+    Python files are refactored in the job's worker process, so jobs always
+    run with the default WorkerSettings.
+
+    """
+
+    def __init__(self, processes: int = 1):
+        self.processes = processes
+        self.manager = multiprocessing.Manager()
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.processes, initializer=warm_up)
+
+    def submit(self, job: Job) -> Iterator[Event]:
+        """Run a job and yield its events as they happen."""
+        events = self.manager.Queue()
+
+        def on_done(future: "Future[None]") -> None:
+            exc = future.exception()
+            if exc:
+                events.put({"event": "error", "message": f"Worker failed: {exc}"})
+
+        with self._lock:
+            try:
+                future = self._pool.submit(run_job, job, events)
+            except BrokenProcessPool:
+                # a worker died (out of memory?) so start over
+                self._pool.shutdown(wait=False)
+                self._pool = self._new_pool()
+                future = self._pool.submit(run_job, job, events)
+        future.add_done_callback(on_done)
+
+        while True:
+            event = events.get()
+            yield event
+            if event["event"] in FINAL_EVENTS:
+                return
+
+    def close(self) -> None:
+        self._pool.shutdown()
+        self.manager.shutdown()
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    server: "DaemonServer"
+
+    def handle(self) -> None:
+        try:
+            job = Job(**json.loads(self.rfile.readline()))
+        except (TypeError, ValueError) as exc:
+            events: Iterator[Event] = iter(
+                [{"event": "error", "message": f"Invalid job: {exc}"}]
+            )
+        else:
+            logger.info("Upgrading %s", job.root)
+            events = self.server.daemon.submit(job)
+
+        for event in events:
+            self.wfile.write(json.dumps(event).encode() + b"\n")
+            self.wfile.flush()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, daemon: UpgradeDaemon):
+        self.daemon = daemon
+        if path.is_socket():
+            path.unlink()
+
+        # only the user running the daemon may submit jobs to it
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(str(path), _JobHandler)
+        finally:
+            os.umask(old_umask)
+
+
+def submit(job: Job, path: Path) -> Iterator[Event]:
+    """Send a job to a running daemon and yield its events as they happen."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(path))
+        with sock.makefile("rwb") as f:
+            f.write(json.dumps(job._asdict()).encode() + b"\n")
+            f.flush()
+            for line in f:
+                yield json.loads(line)
+
+
+def _serve(args: argparse.Namespace) -> int:
+    # shut down cleanly when a service manager stops us
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    daemon = UpgradeDaemon(processes=max(args.processes, 1))
+    try:
+        with DaemonServer(args.socket, daemon) as server:
+            logger.info("Listening on %s", args.socket)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    finally:
+        daemon.close()
+        if args.socket.is_socket():
+            args.socket.unlink()
+    return 0
+
+
+def _submit(args: argparse.Namespace) -> int:
+    job = Job(
+        root=str(args.source_dir.resolve()),
+        check=args.check,
+        fail_fast=args.fail_fast,
+        diff=args.diff.read() if args.diff else None,
+        since=args.since,
+        exclude=args.exclude,
+        resume=args.resume,
+        trigram_index=args.trigram_index,
+        select=split_names(args.select),
+        ignore=split_names(args.ignore),
+        allow_prerelease=args.allow_prerelease,
+    )
+
+    try:
+        for event in submit(job, args.socket):
+            kind = event["event"]
+            if args.json:
+                sys.stdout.write(json.dumps(event) + "\n")
+                sys.stdout.flush()
+            elif kind == "warning":
+                print(f" ▲ {event['message']}", color=Color.YELLOW)
+            elif kind == "file" and args.verbose:
+                print(f" • {event['stage']}: {event['path']}", color=Color.GRAY)
+
+            if kind == "error":
+                if not args.json:
+                    print(event["message"], color=Color.RED.BOLD)
+                return 1
+            elif kind == "result":
+                if not args.json:
+                    _print_result(event, args.check)
+                return int(event["status"])
+    except OSError as exc:
+        print(f"Can't reach the daemon at {args.socket}: {exc}", color=Color.RED.BOLD)
+        return 1
+
+    print("The daemon hung up before finishing the job.", color=Color.RED.BOLD)
+    return 1
+
+
+def _print_result(event: Event, check: bool) -> None:
+    print()
+    if event["change_required"]:
+        print(f"Upgrade would change {event['change_required']}.", color=Color.RED.BOLD)
+    elif event["changed_files"]:
+        verb = "would change" if check else "changed"
+        print(
+            f"The upgrade {verb} {len(event['changed_files'])} file(s):",
+            color=Color.WHITE.BOLD,
+        )
+        for path in event["changed_files"]:
+            print(f" • {path}")
+
+    for path, reason in event["skipped_files"]:
+        print(f"Skipped {path} ({reason})", color=Color.YELLOW.BOLD)
+
+    if check:
+        if event["status"] == 0:
+            print("Nothing to change!", color=Color.CYAN.BOLD)
+    elif event["status"] == 0:
+        version = event["target_version"] or event["target_series"]
+        print(f"Upgraded to v{version}.", color=Color.CYAN.BOLD)
+    else:
+        print("Upgrade failed. Please see above for details.", color=Color.RED.BOLD)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run upgrades in a daemon that stays warm between them."
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        type=Path,
+        default=default_socket_path(),
+        help="the Unix socket the daemon listens on",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="run the daemon")
+    serve_parser.add_argument(
+        "--processes",
+        "-p",
+        metavar="N",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="run up to N upgrades at once",
+    )
+
+    submit_parser = subparsers.add_parser(
+        "submit", help="upgrade a service using a running daemon"
+    )
+    submit_parser.add_argument(
+        "source_dir",
+        help="path to the source code of a service you want to upgrade",
+        type=Path,
+    )
+    submit_parser.add_argument(
+        "--check",
+        action="store_true",
+        help="don't change anything, just fail if the upgrade would change any files",
+    )
+    submit_parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="with --check, stop at the first change that would be needed",
+    )
+    submit_parser.add_argument(
+        "--diff",
+        metavar="PATCH",
+        type=argparse.FileType("r"),
+        help="only look at files touched by this unified diff ('-' for stdin)",
+    )
+    submit_parser.add_argument(
+        "--since",
+        metavar="REV",
+        help="only look at files changed since this Git revision",
+    )
+    submit_parser.add_argument(
+        "--exclude",
+        metavar="GLOB",
+        action="append",
+        default=[],
+        help="skip paths (relative to source_dir) matching this pattern",
+    )
+    submit_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue a run that was interrupted",
+    )
+    submit_parser.add_argument(
+        "--trigram-index",
+        action="store_true",
+        help="keep an index of the repository's contents in .git",
+    )
+    submit_parser.add_argument(
+        "--select",
+        metavar="NAME",
+        action="append",
+        help="only run these stages or fixers (comma-separated)",
+    )
+    submit_parser.add_argument(
+        "--ignore",
+        metavar="NAME",
+        action="append",
+        help="don't run these stages or fixers (comma-separated)",
+    )
+    submit_parser.add_argument(
+        "--allow-prerelease",
+        action="store_true",
+        help="upgrade even if the newest version is a pre-release",
+    )
+    submit_parser.add_argument(
+        "--json",
+        action="store_true",
+        help="print every event as a line of JSON",
+    )
+    submit_parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="show every file as it's finished",
+    )
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        sys.exit(_serve(args))
+    else:
+        sys.exit(_submit(args))
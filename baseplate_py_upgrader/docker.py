@@ -1,8 +1,18 @@
+import io
 import logging
 import re
 
 from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
 from typing import Match
+from typing import NamedTuple
+from typing import Tuple
+
+from .context import RunContext
+from .scan import file_contains
 
 
 logger = logging.getLogger(__name__)
@@ -13,48 +23,182 @@ IMAGE_RE = re.compile(
 )
 
 
-def replace_docker_image_references(target_series: str, content: str) -> str:
+# refers to a baseplate-py image
+IMAGE_MARKER = "baseplate-py:"
+
+# files that may refer to images: Dockerfiles, docker-compose files,
+# Kubernetes and Helm manifests, and CI configs
+IMAGE_FILES = (
+    "Dockerfile*",
+    "*.dockerfile",
+    "*.yml",
+    "*.yaml",
+    "*.tpl",
+    "Jenkinsfile",
+)
+
+
+class ImageReference(NamedTuple):
+    version: str
+    python: str
+    distro: str
+    repo: str
+    dev: str
+
+    @classmethod
+    def from_match(cls, m: Match[str]) -> "ImageReference":
+        return cls(
+            version=m["version"],
+            python=m["python"],
+            distro=m["distro"],
+            repo=m["repo"] or "",
+            dev=m["dev"] or "",
+        )
+
+
+FileVersion = Tuple[int, int]
+
+
+def _file_version(path: Path) -> FileVersion:
+    stat = path.stat()
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class ImageReferences:
+    """The image references in a repository's files.
+
+    Guessing the Python version and upgrading images both look at the
+    Dockerfile and .drone.yml, so one of these is shared by the whole run.
+    Each file is only read once no matter how many times it's asked about,
+    and the upgrade takes the lines that were already read unless something
+    else changed the file since.
+
+    """
+
+    def __init__(self) -> None:
+        self._by_path: Dict[Path, List[ImageReference]] = {}
+        self._lines: Dict[Path, Tuple[FileVersion, List[str]]] = {}
+
+    def in_file(self, path: Path) -> List[ImageReference]:
+        """Find the image references in a file.
+
+        Files that can't be read or aren't UTF-8 don't have any.
+
+        """
+        try:
+            return self._by_path[path]
+        except KeyError:
+            pass
+
+        references: List[ImageReference] = []
+        if file_contains(path, IMAGE_MARKER.encode()):
+            try:
+                version = _file_version(path)
+                with path.open(encoding="utf8", newline="") as f:
+                    lines = list(f)
+                self._lines[path] = (version, lines)
+            except (OSError, UnicodeDecodeError):
+                lines = []
+            for line in lines:
+                if IMAGE_MARKER in line:
+                    references.extend(
+                        ImageReference.from_match(m) for m in IMAGE_RE.finditer(line)
+                    )
+        self._by_path[path] = references
+        return references
+
+    def take_lines(self, path: Path) -> List[str]:
+        """Return a file's lines, reading it unless in_file() already has.
+
+        The lines aren't kept after this because the caller may change the
+        file.
+
+        """
+        version, lines = self._lines.pop(path, (None, None))
+        if lines is not None and version == _file_version(path):
+            return lines
+
+        with path.open(encoding="utf8", newline="") as f:
+            return list(f)
+
+
+def replace_image_reference(target_series: str, reference: ImageReference) -> str:
     major, minor = target_series.split(".")
     if major == "0":
         image_series = f"{major}.{minor}"
     else:
         image_series = f"{major}"
 
-    def replace_docker_image_reference(m: Match[str]) -> str:
-        if major == "2":
-            distro = "buster"
-            repo = ""
+    if major == "2":
+        distro = "buster"
+        repo = ""
 
-            if m["version"] == "2":
-                dev = m["dev"]
-            else:
-                dev = "-dev"
+        if reference.version == "2":
+            dev = reference.dev
         else:
-            distro = m["distro"]
-            repo = m["repo"]
-            dev = m["dev"]
+            dev = "-dev"
+    else:
+        distro = reference.distro
+        repo = reference.repo
+        dev = reference.dev
+
+    return f"/baseplate-py:{image_series}-py{reference.python}-{distro}{repo}{dev}"
 
-        return f"/baseplate-py:{image_series}-py{m['python']}-{distro}{repo or ''}{dev or ''}"
 
-    return IMAGE_RE.sub(replace_docker_image_reference, content, re.MULTILINE)
+def replace_image_references_in_line(target_series: str, line: str) -> str:
+    if IMAGE_MARKER not in line:
+        return line
 
+    def replace(m: Match[str]) -> str:
+        return replace_image_reference(target_series, ImageReference.from_match(m))
 
-def upgrade_docker_image_references_in_file(target_series: str, filepath: Path) -> None:
-    file_content = filepath.read_text()
-    changed = replace_docker_image_references(target_series, file_content)
+    return IMAGE_RE.sub(replace, line)
 
-    if file_content == changed:
+
+def replace_image_references_in_lines(
+    target_series: str, lines: Iterable[str]
+) -> Iterator[str]:
+    for line in lines:
+        yield replace_image_references_in_line(target_series, line)
+
+
+def replace_docker_image_references(target_series: str, content: str) -> str:
+    lines = io.StringIO(content, newline="")
+    return "".join(replace_image_references_in_lines(target_series, lines))
+
+
+def upgrade_docker_image_references_in_file(
+    target_series: str, filepath: Path, context: RunContext, images: ImageReferences
+) -> None:
+    try:
+        lines = images.take_lines(filepath)
+    except UnicodeDecodeError:
+        context.record_skipped(filepath, "isn't valid UTF-8")
+        return
+
+    upgraded = [replace_image_references_in_line(target_series, line) for line in lines]
+    if upgraded == lines:
         return
 
-    with filepath.open("w") as f:
-        logger.info("Updated Docker image references in %s", filepath)
-        f.write(changed)
+    context.write_text(
+        filepath, "".join(upgraded), "Docker image references", encoding="utf8"
+    )
 
 
-def upgrade_docker_image_references(target_series: str, root: Path) -> None:
-    for dockerfile in root.glob("**/Dockerfile*"):
-        upgrade_docker_image_references_in_file(target_series, dockerfile)
+def upgrade_docker_image_references(
+    target_series: str, context: RunContext, images: ImageReferences
+) -> None:
+    if not context.wants("docker"):
+        return
 
-    dronefile = root / ".drone.yml"
-    if dronefile.exists():
-        upgrade_docker_image_references_in_file(target_series, dronefile)
+    context.process_files(
+        "docker",
+        lambda path: upgrade_docker_image_references_in_file(
+            target_series, path, context, images
+        ),
+        context.files_containing(
+            IMAGE_MARKER.encode(), context.find_repo_files(*IMAGE_FILES)
+        ),
+    )
+
+    context.finish_stage("docker")
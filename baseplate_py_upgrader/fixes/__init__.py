@@ -11,9 +11,13 @@ from lib2to3.fixer_util import token
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Sequence
 from typing import Tuple
 from typing import Union
 
+from ..cache import PATTERN_CACHE
+from ..context import FileContext
+
 
 LN = Union[Node, Leaf]
 Capture = Dict[str, LN]
@@ -23,8 +27,37 @@ logger = logging.getLogger(__name__)
 
 
 class BaseplateBaseFix(BaseFix):
+    BM_compatible = True
+
+    # names a file must contain at least one of for this fixer to change it.
+    # files that contain none of them aren't parsed at all. empty means any
+    # file might need changing.
+    KEYWORDS: Sequence[str] = ()
+
+    context: FileContext
+
+    def compile_pattern(self) -> None:
+        if self.PATTERN is not None:
+            self.pattern, self.pattern_tree = PATTERN_CACHE.get(self.PATTERN)
+
+    @classmethod
+    def fixer_name(cls) -> str:
+        """Return the fixer's name as lib2to3 knows it, e.g. "rules"."""
+        return cls.__module__.rpartition(".fix_")[2]
+
+    def start_tree(self, tree: LN, filename: str) -> None:
+        super().start_tree(tree, filename)
+        self.context = FileContext(filename)
+
     def warn(self, node: LN, message: str) -> None:
-        logger.warning("Line %d of %s: %s", node.get_lineno(), self.filename, message)
+        lineno = node.get_lineno()
+        logger.warning(
+            "Line %d of %s: %s",
+            lineno,
+            self.filename,
+            message,
+            extra={"path": self.filename, "line": lineno, "fixer": self.fixer_name()},
+        )
 
 
 def split_package_and_name(dotted_name: str) -> Tuple[str, str]:
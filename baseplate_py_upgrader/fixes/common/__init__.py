@@ -3,9 +3,10 @@ import re
 from typing import Dict
 from typing import Match
 from typing import Optional
-from typing import Set
 from typing import Union
 
+from ...context import FileContext
+
 
 class NameRemovedError(Exception):
     def __init__(self, name: str):
@@ -14,32 +15,25 @@ class NameRemovedError(Exception):
         )
 
 
-BASEPLATE_NAME_RE = re.compile(r"(?P<name>baseplate\.(?:[A-Za-z_][A-Za-z0-9_]*\.?)+)")
+BASEPLATE_NAME_RE = re.compile(r"(?P<name>baseplate(?:\.[A-Za-z_][A-Za-z0-9_]*)+\.?)")
 
 
 class RenamedSymbols:
     def __init__(self, renames: Dict[str, Union[str, None]]):
         self.renames = renames
-        self.names_seen: Set[str] = set()
-
-    def _update_seen(self, full_name: str) -> None:
-        parent_name = ""
-        for name in full_name.split("."):
-            if parent_name:
-                parent_name = f"{parent_name}.{name}"
-            else:
-                parent_name = name
-
-            self.names_seen.add(parent_name)
 
-    def get_new_name(self, name: str) -> Optional[str]:
+    def get_new_name(
+        self, name: str, context: Optional[FileContext] = None
+    ) -> Optional[str]:
         """Find the most appropriate replacement for a name.
 
         This prefers longest (more-specific) matches over shorter ones. If the
-        symbol does not need to be renamed, None is returned.
+        symbol does not need to be renamed, None is returned. If a context is
+        passed, the name is recorded as seen in it.
 
         """
-        self._update_seen(name)
+        if context:
+            context.record_name(name)
 
         for old, new in sorted(
             self.renames.items(), key=lambda i: len(i[0]), reverse=True
@@ -54,15 +48,17 @@ class RenamedSymbols:
                     return None
         return None
 
-    def replace_module_references(self, corpus: str) -> str:
+    def replace_module_references(
+        self, corpus: str, context: Optional[FileContext] = None
+    ) -> str:
         """Replace references to modules in a body of text."""
 
         def replace_name(m: Match[str]) -> str:
             old_name = m["name"]
             try:
-                new_name = self.get_new_name(old_name)
+                new_name = self.get_new_name(old_name, context)
             except NameRemovedError:
                 new_name = None
             return new_name or old_name
 
-        return BASEPLATE_NAME_RE.sub(replace_name, corpus, re.MULTILINE)
+        return BASEPLATE_NAME_RE.sub(replace_name, corpus)
@@ -22,6 +22,7 @@ from .. import traverse_dotted_name
 
 
 class BaseFixImportFrom(BaseplateBaseFix):
+    KEYWORDS = ("baseplate",)
     PATTERN = """
     import_from<
         'from'
@@ -74,7 +75,9 @@ class BaseFixImportFrom(BaseplateBaseFix):
         for name, nick in imports:
             full_name = f"{module_name}.{name}"
             try:
-                new_full_name = self.renames.get_new_name(full_name) or full_name
+                new_full_name = (
+                    self.renames.get_new_name(full_name, self.context) or full_name
+                )
             except NameRemovedError as exc:
                 self.warn(node, str(exc))
                 continue
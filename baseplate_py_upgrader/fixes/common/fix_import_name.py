@@ -14,6 +14,7 @@ from .. import traverse_dotted_name
 
 
 class BaseFixImportName(BaseplateBaseFix):
+    KEYWORDS = ("baseplate",)
     PATTERN = """
     import_name< 'import'
         (
@@ -51,7 +52,7 @@ class BaseFixImportName(BaseplateBaseFix):
         indent = find_indentation(node)
         for name, nick in imports:
             try:
-                new_name = self.renames.get_new_name(name)
+                new_name = self.renames.get_new_name(name, self.context)
             except NameRemovedError as exc:
                 self.warn(node, str(exc))
                 continue
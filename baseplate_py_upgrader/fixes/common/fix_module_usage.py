@@ -1,7 +1,10 @@
 from lib2to3.fixer_util import Node
 from lib2to3.fixer_util import syms
 from lib2to3.fixer_util import token
+from lib2to3.fixer_util import touch_import
+from typing import Dict
 from typing import List
+from typing import Optional
 
 from . import NameRemovedError
 from . import RenamedSymbols
@@ -9,9 +12,20 @@ from .. import AttrChain
 from .. import BaseplateBaseFix
 from .. import Capture
 from .. import LN
+from ...symbols import ImportIndex
 
 
 class BaseFixModuleUsage(BaseplateBaseFix):
+    """Rename uses of Baseplate.py names, including through import aliases.
+
+    Uses are dotted names starting with baseplate, which the pattern finds,
+    or with a name that an import bound to a Baseplate.py module or object
+    (see the ImportIndex in the "import_index" option). Since those names
+    differ from file to file, uses of them are looked for by walking the
+    tree once matching is done, and only in files that have any.
+
+    """
+
     PATTERN = """
     module_name=power<
         [TOKEN]
@@ -19,33 +33,87 @@ class BaseFixModuleUsage(BaseplateBaseFix):
         module_access=trailer< any* >*
     >
     """
+    # aliases are only found through imports from baseplate in the same file
+    KEYWORDS = ("baseplate",)
+
+    aliases: Dict[str, str]
 
     @property
     def renames(self) -> RenamedSymbols:
         raise NotImplementedError
 
+    def start_tree(self, tree: LN, filename: str) -> None:
+        super().start_tree(tree, filename)
+        import_index: Optional[ImportIndex] = self.options.get("import_index")
+        self.aliases = import_index.aliases(filename) if import_index else {}
+
+    def finish_tree(self, tree: LN, filename: str) -> None:
+        super().finish_tree(tree, filename)
+        if not self.aliases:
+            return
+
+        uses = [
+            node
+            for node in tree.pre_order()
+            if node.type == syms.power and self._root(node) in self.aliases
+        ]
+        for node in uses:
+            self.transform(node, {})
+
+    @staticmethod
+    def _start(node: LN) -> int:
+        # skip a leading keyword, e.g. "await baseplate.foo()"
+        return 0 if node.children[0].type == token.NAME else 1
+
+    def _root(self, node: LN) -> Optional[str]:
+        start = self._start(node)
+        if len(node.children) <= start or node.children[start].type != token.NAME:
+            return None
+        name: str = node.children[start].value
+        return name
+
     def transform(self, node: LN, capture: Capture) -> None:
-        full_name = []
+        start = self._start(node)
+        full_name = [node.children[start].value]
         trailer: List[LN] = []
-        for i, n in enumerate(node.children):
-            if n.type == token.NAME:
-                full_name.append(n.value)
-            elif n.type == syms.trailer:
-                if n.children[0].type != token.DOT:
-                    trailer = node.children[i:]
-                    break
-                full_name.append(n.children[1].value)
-            else:
+        for i, n in enumerate(node.children[start + 1 :], start + 1):
+            if n.type != syms.trailer or n.children[0].type != token.DOT:
                 trailer = node.children[i:]
+                break
+            full_name.append(n.children[1].value)
+
+        alias = full_name[0] if full_name[0] != "baseplate" else None
+        if alias:
+            # a bare alias is renamed, if at all, by renaming its import
+            if len(full_name) < 2:
+                return
+            target = self.aliases[alias]
+            full_name[0:1] = target.split(".")
 
         try:
-            new_name = self.renames.get_new_name(".".join(full_name))
+            new_name = self.renames.get_new_name(".".join(full_name), self.context)
+            if alias:
+                new_target = self.renames.get_new_name(target) or target
         except NameRemovedError as exc:
             self.warn(node, str(exc))
             return
 
+        if new_name and alias:
+            # only keep using the alias if what follows it is the same shape,
+            # otherwise it may need submodules that nothing imported
+            rest = new_name[len(new_target) :]
+            depth = len(full_name) - len(target.split("."))
+            if new_name.startswith(new_target + ".") and rest.count(".") == depth:
+                new_name = alias + rest
+            else:
+                module = new_name.rpartition(".")[0] or new_name
+                touch_import(None, module, node)
+
         if new_name:
-            new_node = Node(syms.power, AttrChain(new_name), prefix=node.prefix)
+            chain = AttrChain(new_name)
+            chain[0].prefix = node.children[start].prefix
+            leading = [n.clone() for n in node.children[:start]]
+            new_node = Node(syms.power, leading + chain)
             for n in trailer:
                 new_node.append_child(n)
             node.replace(new_node)
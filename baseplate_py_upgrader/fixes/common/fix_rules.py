@@ -0,0 +1,109 @@
+from lib2to3.fixer_util import Name
+from lib2to3.fixer_util import syms
+from lib2to3.fixer_util import token
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .. import BaseplateBaseFix
+from .. import LN
+from .rules import AttributeRename
+from .rules import KeywordRename
+from .rules import RuleSet
+from .rules import WarnOnUse
+
+
+Hit = Tuple[LN, Union[AttributeRename, KeywordRename, WarnOnUse]]
+
+
+def _keyword_names(call: LN) -> List[LN]:
+    """Get the name of each keyword argument in a call trailer."""
+    if len(call.children) != 3:
+        return []
+
+    arguments = call.children[1]
+    if arguments.type == syms.arglist:
+        candidates = arguments.children
+    else:
+        candidates = [arguments]
+
+    names = []
+    for argument in candidates:
+        if (
+            argument.type == syms.argument
+            and len(argument.children) == 3
+            and argument.children[0].type == token.NAME
+            and argument.children[1].type == token.EQUAL
+        ):
+            names.append(argument.children[0])
+    return names
+
+
+class BaseFixRules(BaseplateBaseFix):
+    """Apply a series' whole RuleSet in a single pass over the tree.
+
+    Rather than a pattern per rule, every power node (a name followed by
+    attribute accesses and calls) is walked once and each name in it is
+    looked up in the rule set's indexes.
+
+    """
+
+    BM_compatible = False
+    PATTERN = None
+    _accept_type = syms.power
+
+    @property
+    def rules(self) -> RuleSet:
+        raise NotImplementedError
+
+    def match(self, node: LN) -> Union[bool, Dict[str, Any]]:
+        rules = self.rules
+        hits: List[Hit] = []
+        previous: Optional[str] = None
+        children = node.children
+        for i, child in enumerate(children):
+            if child.type == token.NAME:
+                leaf = child
+            elif child.type == syms.trailer and child.children[0].type == token.DOT:
+                leaf = child.children[1]
+            else:
+                previous = None
+                continue
+
+            name = leaf.value
+            for attribute_rule in rules.attribute_renames.get(name, ()):
+                if previous in attribute_rule.owners:
+                    hits.append((leaf, attribute_rule))
+
+            following = children[i + 1] if i + 1 < len(children) else None
+            if (
+                following is not None
+                and following.type == syms.trailer
+                and following.children[0].type == token.LPAR
+            ):
+                if previous is not None:
+                    for warning_rule in rules.warnings.get(name, ()):
+                        hits.append((leaf, warning_rule))
+
+                keyword_rules = rules.keyword_renames.get(name)
+                if keyword_rules:
+                    for keyword in _keyword_names(following):
+                        for keyword_rule in keyword_rules:
+                            if keyword.value == keyword_rule.old:
+                                hits.append((keyword, keyword_rule))
+
+            previous = name
+
+        if not hits:
+            return False
+        return {"hits": hits}
+
+    def transform(self, node: LN, capture: Dict[str, Any]) -> None:
+        for leaf, rule in capture["hits"]:
+            if isinstance(rule, WarnOnUse):
+                self.warn(node, rule.message)
+            else:
+                leaf.replace(Name(rule.new, prefix=leaf.prefix))
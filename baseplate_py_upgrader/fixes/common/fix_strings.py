@@ -5,6 +5,7 @@ from .. import LN
 
 
 class BaseFixStrings(BaseplateBaseFix):
+    KEYWORDS = ("baseplate",)
     PATTERN = "STRING"
 
     @property
@@ -12,7 +13,7 @@ class BaseFixStrings(BaseplateBaseFix):
         raise NotImplementedError
 
     def transform(self, node: LN, capture: Capture) -> None:
-        new_text = self.renames.replace_module_references(node.value)
+        new_text = self.renames.replace_module_references(node.value, self.context)
         if new_text != node.value:
             node.value = new_text
             node.changed()
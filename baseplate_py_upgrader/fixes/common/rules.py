@@ -0,0 +1,101 @@
+"""Declarative rules for simple, table-driven changes.
+
+Most changes between series are a matter of looking up a name in a table:
+a symbol moved, a keyword argument or attribute was renamed, or a method is
+gone and its callers need a human to look at them. Rather than a fixer class
+(and a tree traversal) for each table, a series lists its rules in a RuleSet.
+The rule set indexes them by name so that a single fixer can apply all of
+them in one pass over the tree.
+
+"""
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from . import RenamedSymbols
+
+
+class SymbolRename(NamedTuple):
+    """A module or name was moved (or removed, if new is None)."""
+
+    old: str
+    new: Optional[str]
+
+
+class AttributeRename(NamedTuple):
+    """An attribute of certain objects was renamed.
+
+    The object is recognized by the last name before the attribute, e.g.
+    owners=("request",) matches both request.trace and foo.request.trace.
+
+    """
+
+    owners: Tuple[str, ...]
+    old: str
+    new: str
+
+
+class KeywordRename(NamedTuple):
+    """A keyword argument to certain callables was renamed.
+
+    The callable is recognized by the last name before the call, e.g.
+    callees=("ThriftClient",) matches both ThriftClient(...) and
+    clients.ThriftClient(...).
+
+    """
+
+    callees: Tuple[str, ...]
+    old: str
+    new: str
+
+
+class WarnOnUse(NamedTuple):
+    """A method needs to be looked at by a human wherever it's called."""
+
+    method: str
+    message: str
+
+
+Rule = Union[SymbolRename, AttributeRename, KeywordRename, WarnOnUse]
+
+
+def symbol_renames(renames: Dict[str, Optional[str]]) -> List[SymbolRename]:
+    return [SymbolRename(old, new) for old, new in renames.items()]
+
+
+class RuleSet:
+    """All the rules for a series, indexed for lookup while traversing a tree.
+
+    Tree rules are keyed by the name they apply to so that each name in the
+    tree costs a single dictionary lookup, no matter how many rules there
+    are. Symbol renames are handled by the import and module usage fixers
+    through renamed_symbols.
+
+    """
+
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = rules
+        self.renamed_symbols = RenamedSymbols(
+            {rule.old: rule.new for rule in rules if isinstance(rule, SymbolRename)}
+        )
+        self.attribute_renames: Dict[str, List[AttributeRename]] = {}
+        self.keyword_renames: Dict[str, List[KeywordRename]] = {}
+        self.warnings: Dict[str, List[WarnOnUse]] = {}
+
+        for rule in rules:
+            if isinstance(rule, AttributeRename):
+                self.attribute_renames.setdefault(rule.old, []).append(rule)
+            elif isinstance(rule, KeywordRename):
+                for callee in rule.callees:
+                    self.keyword_renames.setdefault(callee, []).append(rule)
+            elif isinstance(rule, WarnOnUse):
+                self.warnings.setdefault(rule.method, []).append(rule)
+
+    @property
+    def names(self) -> Sequence[str]:
+        """Every name that a tree rule applies to."""
+        return [*self.attribute_renames, *self.keyword_renames, *self.warnings]
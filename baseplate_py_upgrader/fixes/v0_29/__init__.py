@@ -1,72 +1,84 @@
-import configparser
 import logging
 
 from pathlib import Path
-from typing import Dict
+from typing import List
 from typing import Optional
 
+from ...config_rules import AddOption
+from ...config_rules import ConfigRules
+from ...config_rules import update_config_files
+from ...config_rules import When
+from ...context import RunContext
 from ...package_repo import PackageRepo
 from ...python_version import PythonVersion
-from ...refactor import refactor_python_files
+from ...refactor import refactor_step
 from ...requirements import RequirementsFile
+from ...scan import file_contains
+from ...scheduler import run_steps
+from ...scheduler import Step
 from .thrift import find_invalid_thrift_idl
 
 
-def add_max_concurrency(root: Path) -> None:
-    servers: Dict[str, Optional[int]] = {}
-
-    for path in root.glob("**/*.ini"):
-        config_lines = path.read_text().splitlines()
-
-        current_server = None
-        for i, line in enumerate(config_lines):
-            m = configparser.RawConfigParser.SECTCRE.match(line)
-            if m:
-                name = m.group("header")
-                if name.startswith("server:"):
-                    current_server = name
-                else:
-                    current_server = None
-                continue
-
-            if current_server:
-                m = configparser.RawConfigParser.OPTCRE.match(line)
-                if m:
-                    name = m.group("option")
-                    if name == "max_concurrency":
-                        servers[current_server] = None
-                    elif name == "factory":
-                        servers[current_server] = i
-
-        insertion_points = list(filter(None, servers.values()))
-        if insertion_points:
-            for line_no in sorted(insertion_points, reverse=True):
-                config_lines.insert(line_no + 1, "max_concurrency = 100")
-
-            with path.open("w") as f:
-                f.write("\n".join(config_lines) + "\n")
-
-            logging.info("Updated %s to have max_concurrency setting", path)
-
-
-def fix_thrift_compiler_references(root: Path) -> None:
-    for path in root.glob("**/*"):
-        if not path.is_file():
-            continue
-
-        if path.stat().st_size > 1e6:
-            continue
-
-        try:
-            input = path.read_text(encoding="utf8")
-        except UnicodeError:
-            continue
-
-        if "thrift1" in input:
-            output = input.replace("thrift1", "thrift")
-            with path.open("w") as f:
-                f.write(output)
-            logging.info("Updated Thrift compiler references in %s", path)
+CONFIG_RULES = ConfigRules(
+    [
+        AddOption(
+            "server:", "max_concurrency", "100", after="factory", when=When("factory")
+        )
+    ]
+)
+
+
+def add_max_concurrency(context: RunContext) -> None:
+    update_config_files(context, CONFIG_RULES, "max_concurrency setting")
+
+
+# files that might invoke the Thrift compiler while building or testing
+THRIFT_COMPILER_FILES = (
+    "Makefile",
+    "makefile",
+    "GNUmakefile",
+    "*.mk",
+    "Dockerfile*",
+    "*.dockerfile",
+    "*.yml",
+    "*.yaml",
+    "Jenkinsfile",
+    "*.sh",
+    "*.bash",
+    "setup.py",
+    "setup.cfg",
+    "tox.ini",
+    "pyproject.toml",
+)
+
+# directories holding build output rather than build instructions
+BUILD_OUTPUT_DIRECTORIES = {"build", "dist"}
+
+
+def fix_thrift_compiler_references_in_file(path: Path, context: RunContext) -> None:
+    if BUILD_OUTPUT_DIRECTORIES.intersection(path.relative_to(context.root).parts):
+        return
+
+    if path.is_symlink() or not file_contains(path, b"thrift1"):
+        return
+
+    try:
+        input = path.read_text(encoding="utf8")
+    except UnicodeError:
+        return
+
+    output = input.replace("thrift1", "thrift")
+    context.write_text(path, output, "Thrift compiler references")
+
+
+def fix_thrift_compiler_references(context: RunContext) -> None:
+    context.process_files(
+        "text",
+        lambda path: fix_thrift_compiler_references_in_file(path, context),
+        context.files_containing(
+            b"thrift1", context.find_files(*THRIFT_COMPILER_FILES)
+        ),
+    )
 
 
 def update(
@@ -74,19 +86,40 @@ def update(
     python_version: Optional[PythonVersion],
     requirements_file: RequirementsFile,
     package_repo: PackageRepo,
+    context: RunContext,
 ) -> int:
-    result = 0
-
-    package_repo.ensure(requirements_file, "thrift>=0.12.0")
-
-    refactor_python_files(root, __name__)
-
-    add_max_concurrency(root)
-
-    if find_invalid_thrift_idl(root):
-        result = 1
-
-    fix_thrift_compiler_references(root)
+    def update_requirements() -> None:
+        package_repo.ensure(requirements_file, "thrift>=0.12.0")
+
+    def update_config() -> None:
+        add_max_concurrency(context)
+        context.finish_stage("config")
+
+    def check_thrift_idl() -> int:
+        return 1 if find_invalid_thrift_idl(context) else 0
+
+    def update_text() -> None:
+        fix_thrift_compiler_references(context)
+        context.finish_stage("text")
+
+    steps: List[Step] = [
+        Step("update requirements", update_requirements, writes=["requirements.txt"]),
+        refactor_step(root, __name__, context),
+    ]
+    if context.wants("config"):
+        steps.append(Step("update config", update_config, writes=["*.ini"]))
+    if context.wants("thrift"):
+        steps.append(Step("check Thrift IDL", check_thrift_idl, reads=["*.thrift"]))
+    if context.wants("text"):
+        steps.append(
+            Step(
+                "update Thrift compiler references",
+                update_text,
+                writes=THRIFT_COMPILER_FILES,
+            )
+        )
+
+    result = run_steps(context, steps)
 
     logging.warning(
         "Verify that Thrift method calls specify all params. See https://github.com/reddit/baseplate.py-upgrader/wiki/v0.29#thrift-rpc-parameters"
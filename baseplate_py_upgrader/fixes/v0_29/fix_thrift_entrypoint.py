@@ -62,6 +62,18 @@ class FixThriftEntrypoint(BaseplateBaseFix):
         ) any*>
     )
     """
+    KEYWORDS = (
+        "baseplate",
+        "ContextIface",
+        "ContextProcessor",
+        "BaseplateProcessorEventHandler",
+        "setEventHandler",
+    )
+
+    def start_tree(self, tree: LN, filename: str) -> None:
+        super().start_tree(tree, filename)
+        self.arguments: Optional[List[LN]] = None
+        self.remove_me: Optional[LN] = None
 
     def transform(self, node: LN, capture: Capture) -> None:
         if node.type == syms.import_from:
@@ -118,7 +130,7 @@ class FixThriftEntrypoint(BaseplateBaseFix):
                 processor_name = capture["processor_name"].clone()
                 processor_name.prefix = ""
                 arguments = [processor_name, Comma()]
-                original_arguments = getattr(self, "arguments", None)
+                original_arguments = self.arguments
                 if original_arguments:
                     original_arguments[0].prefix = " "
                     arguments.extend(original_arguments)
@@ -144,7 +156,7 @@ class FixThriftEntrypoint(BaseplateBaseFix):
                     ]
                 )
 
-                if hasattr(self, "remove_me"):
+                if self.remove_me:
                     self.remove_me.remove()
         else:
             raise Exception("unrecognized match")
@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import Iterator
 from typing import NamedTuple
 
+from ...context import RunContext
+
 
 RESERVED_KEYWORDS = {
     "abstract",
@@ -115,8 +117,11 @@ RESERVED_KEYWORDS = {
 
 class TokenKind(Enum):
     WHITESPACE = re.compile(r"\s+")
-    MULTILINE_COMMENT = re.compile(r"\/\*[^*]\/*([^*/]|[^*]\/|\*[^/])*\**\*\/")
-    DOC_COMMENT = re.compile(r"\/\*\*([^*/]|[^*]\/|\*[^/])*\**\*\/")
+    # comments end at the first "*/". these are written so that there's only
+    # one way to match any text, which keeps unterminated comments from
+    # taking quadratic time to reject.
+    MULTILINE_COMMENT = re.compile(r"\/\*(?!\*[^/])[^*]*\*+([^/*][^*]*\*+)*\/")
+    DOC_COMMENT = re.compile(r"\/\*\*[^*]*\*+([^/*][^*]*\*+)*\/")
     UNIX_COMMENT = re.compile(r"\#[^\n]*")
     COMMENT = re.compile(r"\/\/[^\n]*")
     BOOL_CONSTANT = re.compile(r"\btrue\b|\bfalse\b")
@@ -130,6 +135,13 @@ class TokenKind(Enum):
     IDENTIFIER = re.compile(r"[a-zA-Z_](\.[a-zA-Z_0-9]|[a-zA-Z_0-9])*")
 
 
+# every kind of token in one pattern. alternatives are tried in order, just as
+# if each kind were tried in turn.
+TOKEN_RE = re.compile(
+    "|".join(f"(?P<{kind.name}>{kind.value.pattern})" for kind in TokenKind)
+)
+
+
 class Token(NamedTuple):
     kind: TokenKind
     value: str
@@ -145,52 +157,63 @@ def read_tokens(text: str) -> Iterator[Token]:
     line_no = 1
 
     while pos < len(text):
-        for kind in TokenKind:
-            m = kind.value.match(text[pos:])
-            if m:
-                value = m.group(0)
-                line_no += value.count("\n")
-                pos += m.end()
-
-                if kind is not TokenKind.WHITESPACE:
-                    yield Token(kind=kind, value=value, line=line_no)
-
-                break
-        else:
+        # matching in place rather than on text[pos:] avoids copying the rest
+        # of the file for every token
+        m = TOKEN_RE.match(text, pos)
+        if not m:
             raise ThriftError(f"Invalid Thrift IDL syntax at line {line_no}!")
 
-
-def find_invalid_thrift_idl(root: Path) -> bool:
-    any_errors = False
-    for path in root.glob("**/*.thrift"):
-        error_seen = False
-        try:
-            text = path.read_text("utf8")
-            for token in read_tokens(text):
-                if token.kind != TokenKind.IDENTIFIER:
-                    continue
-
-                if token.value == "float":
-                    logging.error(
-                        "Line %d of %s: The 'float' type is not supported in Apache Thrift. "
-                        "See https://github.com/reddit/baseplate.py-upgrader/wiki/v0.29#float-in-thrift-idl",
-                        token.line,
-                        path,
-                    )
-                    error_seen = True
-                elif token.value in RESERVED_KEYWORDS:
-                    logging.error(
-                        "Line %d of %s: Reserved keyword %r cannot be used for identifiers. "
-                        "See https://github.com/reddit/baseplate.py-upgrader/wiki/v0.29#reserved-keywords-in-thrift-idl",
-                        token.line,
-                        path,
-                        token.value,
-                    )
-                    error_seen = True
-        except ThriftError as exc:
-            logging.warning("Error parsing %s: %s", path, exc)
-
-        if error_seen:
-            any_errors = True
-
-    return any_errors
+        assert m.lastgroup
+        kind = TokenKind[m.lastgroup]
+        value = m.group(0)
+        line_no += value.count("\n")
+        pos = m.end()
+
+        if kind is not TokenKind.WHITESPACE:
+            yield Token(kind=kind, value=value, line=line_no)
+
+
+def check_thrift_file(path: Path) -> bool:
+    """Log any problems in a Thrift IDL file and return if there were errors."""
+    error_seen = False
+    try:
+        text = path.read_text("utf8")
+        for token in read_tokens(text):
+            if token.kind != TokenKind.IDENTIFIER:
+                continue
+
+            if token.value == "float":
+                logging.error(
+                    "Line %d of %s: The 'float' type is not supported in Apache Thrift. "
+                    "See https://github.com/reddit/baseplate.py-upgrader/wiki/v0.29#float-in-thrift-idl",
+                    token.line,
+                    path,
+                    extra={"path": str(path), "line": token.line},
+                )
+                error_seen = True
+            elif token.value in RESERVED_KEYWORDS:
+                logging.error(
+                    "Line %d of %s: Reserved keyword %r cannot be used for identifiers. "
+                    "See https://github.com/reddit/baseplate.py-upgrader/wiki/v0.29#reserved-keywords-in-thrift-idl",
+                    token.line,
+                    path,
+                    token.value,
+                    extra={"path": str(path), "line": token.line},
+                )
+                error_seen = True
+    except ThriftError as exc:
+        logging.warning("Error parsing %s: %s", path, exc, extra={"path": str(path)})
+
+    return error_seen
+
+
+def find_invalid_thrift_idl(context: RunContext) -> bool:
+    # the journal doesn't keep which files had errors, so check them all again
+    return any(
+        context.process_files(
+            "thrift",
+            check_thrift_file,
+            context.find_files("*.thrift"),
+            skip_finished=False,
+        )
+    )
@@ -1,12 +1,16 @@
 import logging
 
 from pathlib import Path
+from typing import List
 from typing import Optional
 
+from ...context import RunContext
 from ...package_repo import PackageRepo
 from ...python_version import PythonVersion
-from ...refactor import refactor_python_files
+from ...refactor import refactor_step
 from ...requirements import RequirementsFile
+from ...scheduler import run_steps
+from ...scheduler import Step
 from ..common import RenamedSymbols
 
 
@@ -81,6 +85,7 @@ def update(
     python_version: Optional[PythonVersion],
     requirements_file: RequirementsFile,
     package_repo: PackageRepo,
+    context: RunContext,
 ) -> int:
     if python_version:
         if python_version < (3, 6):
@@ -93,33 +98,52 @@ def update(
             "Baseplate 1.0 requires Python 3.6+. Ensure Python is new enough."
         )
 
-    refactor_python_files(root, __name__)
+    def update_requirements() -> None:
+        package_repo.ensure(requirements_file, "cassandra-driver>=3.13.0")
+        package_repo.ensure(requirements_file, "cqlmapper>=0.2.0")
+        package_repo.ensure(requirements_file, "gevent>=1.3")
+        package_repo.ensure(requirements_file, "hvac>=0.2.17")
+        package_repo.ensure(requirements_file, "kazoo>=2.5.0")
+        package_repo.ensure(requirements_file, "kombu>=4.0.0")
+        package_repo.ensure(requirements_file, "posix_ipc>=1.0.0")
+        package_repo.ensure(requirements_file, "pyjwt>=1.6.0")
+        package_repo.ensure(requirements_file, "pymemcache>=1.3.0,<=2.0.0")
+        package_repo.ensure(requirements_file, "pyramid>=1.9.0")
+        package_repo.ensure(requirements_file, "redis>=2.10.0,<=3.0.0")
+        package_repo.ensure(requirements_file, "requests>=2.21.0")
+        package_repo.ensure(requirements_file, "sqlalchemy>=1.1.0")
+        package_repo.ensure(requirements_file, "thrift>=0.12.0")
 
-    package_repo.ensure(requirements_file, "cassandra-driver>=3.13.0")
-    package_repo.ensure(requirements_file, "cqlmapper>=0.2.0")
-    package_repo.ensure(requirements_file, "gevent>=1.3")
-    package_repo.ensure(requirements_file, "hvac>=0.2.17")
-    package_repo.ensure(requirements_file, "kazoo>=2.5.0")
-    package_repo.ensure(requirements_file, "kombu>=4.0.0")
-    package_repo.ensure(requirements_file, "posix_ipc>=1.0.0")
-    package_repo.ensure(requirements_file, "pyjwt>=1.6.0")
-    package_repo.ensure(requirements_file, "pymemcache>=1.3.0,<=2.0.0")
-    package_repo.ensure(requirements_file, "pyramid>=1.9.0")
-    package_repo.ensure(requirements_file, "redis>=2.10.0,<=3.0.0")
-    package_repo.ensure(requirements_file, "requests>=2.21.0")
-    package_repo.ensure(requirements_file, "sqlalchemy>=1.1.0")
-    package_repo.ensure(requirements_file, "thrift>=0.12.0")
+    def update_text_file(path: Path) -> None:
+        try:
+            old = path.read_text("utf8")
+            new = RENAMES.replace_module_references(old)
+            if new != old:
+                context.write_text(path, new, "references", encoding="utf8")
+        except OSError as exc:
+            logging.warning("Can't fix references in %s: %s", path, exc)
 
-    for path in root.glob("**/*"):
-        if path.suffix in (".ini", ".txt", ".md", ".rst"):
-            try:
-                old = path.read_text("utf8")
-                new = RENAMES.replace_module_references(old)
-                if new != old:
-                    logging.info("Updated references in %s", path)
-                    with path.open("w", encoding="utf8") as f:
-                        f.write(new)
-            except OSError as exc:
-                logging.warning("Can't fix references in %s: %s", path, exc)
+    def update_text() -> None:
+        context.process_files(
+            "text",
+            update_text_file,
+            context.files_containing(
+                b"baseplate.", context.find_files("*.ini", "*.txt", "*.md", "*.rst")
+            ),
+        )
+        context.finish_stage("text")
+
+    steps: List[Step] = [
+        refactor_step(root, __name__, context),
+        Step("update requirements", update_requirements, writes=["requirements.txt"]),
+    ]
+    if context.wants("text"):
+        steps.append(
+            Step(
+                "update references",
+                update_text,
+                writes=["*.ini", "*.txt", "*.md", "*.rst"],
+            )
+        )
 
-    return 0
+    return run_steps(context, steps)
@@ -5,6 +5,7 @@ from .. import LN
 
 class FixCassExecutionProfiles(BaseplateBaseFix):
     PATTERN = "power< 'CQLMapperContextFactory' any* >"
+    KEYWORDS = ("CQLMapperContextFactory",)
 
     def transform(self, node: LN, capture: Capture) -> None:
         self.warn(
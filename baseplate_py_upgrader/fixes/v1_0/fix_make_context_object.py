@@ -5,6 +5,7 @@ from .. import LN
 
 class FixMakeContextObject(BaseplateBaseFix):
     PATTERN = "trailer< '.' 'make_server_span' >"
+    KEYWORDS = ("make_server_span",)
 
     def transform(self, node: LN, capture: Capture) -> None:
         self.warn(
@@ -1,10 +1,12 @@
 from pathlib import Path
 from typing import Optional
 
+from ...context import RunContext
 from ...package_repo import PackageRepo
 from ...python_version import PythonVersion
-from ...refactor import refactor_python_files
+from ...refactor import refactor_step
 from ...requirements import RequirementsFile
+from ...scheduler import run_steps
 
 
 def update(
@@ -12,6 +14,6 @@ def update(
     python_version: Optional[PythonVersion],
     requirements_file: RequirementsFile,
     package_repo: PackageRepo,
+    context: RunContext,
 ) -> int:
-    refactor_python_files(root, __name__)
-    return 0
+    return run_steps(context, [refactor_step(root, __name__, context)])
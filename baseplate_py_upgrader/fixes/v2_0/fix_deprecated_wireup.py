@@ -17,6 +17,7 @@ class FixDeprecatedWireup(BaseplateBaseFix):
           >
         )
     """
+    KEYWORDS = ("Baseplate", "configure_observers", "configure_context")
 
     def transform(self, node: LN, capture: Capture) -> None:
         args = capture["args"]
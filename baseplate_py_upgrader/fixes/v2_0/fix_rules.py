@@ -0,0 +1,7 @@
+from . import RULES
+from ..common.fix_rules import BaseFixRules
+
+
+class FixRules(BaseFixRules):
+    rules = RULES
+    KEYWORDS = RULES.names
@@ -23,16 +23,7 @@ ARG_RENAMES = {
 
 
 class FixSentry(BaseplateBaseFix):
-    PATTERN = f"""
-      (
-       power<
-        NAME
-        trailer< '.' 'sentry'>
-        trailer< '.' method_name=NAME >
-        arglist=trailer< '(' args=any* ')' >
-        any*
-       >
-       |
+    PATTERN = """
        power<
         NAME
         trailer< '.' NAME>*
@@ -41,8 +32,8 @@ class FixSentry(BaseplateBaseFix):
         arglist=trailer< '(' args=any* ')' >
         any*
        >
-      )
     """
+    KEYWORDS = ("sentry",)
 
     def transform(self, node: LN, capture: Capture) -> None:
         method_name = capture["method_name"].value
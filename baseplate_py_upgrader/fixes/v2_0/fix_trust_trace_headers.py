@@ -7,7 +7,6 @@ from lib2to3.fixer_util import Name
 from lib2to3.fixer_util import syms
 from lib2to3.fixer_util import token
 from lib2to3.fixer_util import touch_import
-from typing import Any
 from typing import Iterable
 from typing import Tuple
 from typing import TypeVar
@@ -45,9 +44,10 @@ class FixTrustTraceHeaders(BaseplateBaseFix):
             any*
         >
     """
+    KEYWORDS = ("BaseplateConfigurator",)
 
-    def __init__(self, *args: Any, **kwargs: Any):
-        super().__init__(*args, **kwargs)
+    def start_tree(self, tree: LN, filename: str) -> None:
+        super().start_tree(tree, filename)
         self.added_static_trust_handler = False
 
     def transform(self, node: LN, capture: Capture) -> None:
@@ -0,0 +1,62 @@
+import re
+import subprocess
+
+from pathlib import Path
+from typing import Set
+
+
+DIFF_TARGET_RE = re.compile(r"^\+\+\+ (?:b/)?(?P<path>[^\t\n]+)", re.MULTILINE)
+
+
+def paths_in_diff(diff: str) -> Set[str]:
+    """Find the paths of files that a unified diff adds or modifies.
+
+    Deleted files are skipped since there's nothing left to upgrade in them.
+
+    """
+    return {
+        m["path"] for m in DIFF_TARGET_RE.finditer(diff) if m["path"] != "/dev/null"
+    }
+
+
+def _git(root: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=root, capture_output=True, check=True, text=True
+    ).stdout
+
+
+def get_diff(root: Path) -> str:
+    """Get the uncommitted changes to tracked files as a patch."""
+    return _git(root, "diff", "--no-color", "--no-ext-diff", "--binary")
+
+
+def apply_patch(root: Path, patch: str) -> None:
+    if not patch:
+        return
+    subprocess.run(
+        ["git", "apply", "--whitespace=nowarn", "-"],
+        cwd=root,
+        input=patch,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+
+def get_head(root: Path) -> str:
+    return _git(root, "rev-parse", "HEAD").strip()
+
+
+def get_git_path(root: Path, name: str) -> Path:
+    """Get the path of a file inside the repository's Git directory."""
+    return root / _git(root, "rev-parse", "--git-path", name).strip()
+
+
+def get_changed_paths(root: Path, revision: str = "HEAD") -> Set[str]:
+    """Get the paths (relative to root) of files changed since a revision.
+
+    This includes uncommitted changes to tracked files.
+
+    """
+    output = _git(root, "diff", "--name-only", "--relative", "-z", revision)
+    return {path for path in output.split("\0") if path}
@@ -0,0 +1,324 @@
+"""A model of INI files that keeps everything configparser throws away.
+
+Config files are parsed once into a document that can be queried like a
+RawConfigParser and edited in place. Every line is kept as it was read,
+including comments, blank lines, indentation and line endings, so a document
+that isn't edited serializes back to exactly the text it was parsed from and
+edits only touch the lines they're about.
+
+"""
+import configparser
+import io
+
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Match
+from typing import Optional
+from typing import Union
+
+
+SECTCRE = configparser.RawConfigParser.SECTCRE
+OPTCRE = configparser.RawConfigParser.OPTCRE
+COMMENT_PREFIXES = ("#", ";")
+DEFAULT_SECTION = "DEFAULT"
+
+
+def _line_ending(line: str) -> str:
+    return line[len(line.rstrip("\r\n")) :]
+
+
+def _match_option(line: str, indent: int = 0) -> Optional[Match[str]]:
+    # keep the line ending out of the value's whitespace
+    return OPTCRE.match(line.rstrip("\r\n"), indent)
+
+
+def _is_comment(line: str) -> bool:
+    return line.strip().startswith(COMMENT_PREFIXES)
+
+
+class IniOption:
+    """An option along with any continuation lines of its value.
+
+    Comments between continuation lines are kept with the option, but aren't
+    part of its value.
+
+    """
+
+    def __init__(self, lines: List[str], match: Match[str]):
+        self.lines = lines
+        self._name_start, self._name_end = match.span("option")
+        self._value_start = match.start("value")
+
+    @property
+    def raw_name(self) -> str:
+        return self.lines[0][self._name_start : self._name_end]
+
+    @property
+    def name(self) -> str:
+        # configparser's default optionxform
+        return self.raw_name.lower()
+
+    @property
+    def value(self) -> str:
+        first = self.lines[0][self._value_start :].strip()
+        rest = [line.strip() for line in self.lines[1:] if not _is_comment(line)]
+        return "\n".join([first, *rest]).strip()
+
+    def rename(self, new_name: str) -> None:
+        line = self.lines[0]
+        self.lines[0] = line[: self._name_start] + new_name + line[self._name_end :]
+        offset = len(new_name) - (self._name_end - self._name_start)
+        self._name_end += offset
+        self._value_start += offset
+
+    def set_value(self, value: str) -> None:
+        line = self.lines[0]
+        before_value = line[: self._value_start]
+        empty = not line[self._value_start :].strip()
+        if empty and not before_value.endswith((" ", "\t")):
+            before_value += " "
+        self.lines[:] = [before_value + value + _line_ending(line)]
+
+
+Entry = Union[str, IniOption]
+
+
+class IniSection:
+    """A section header and every line up to the next one."""
+
+    def __init__(self, name: str, header: str, newline: str):
+        self.name = name
+        self.header = header
+        self.entries: List[Entry] = []
+        self._newline = newline
+        self._index: Dict[str, IniOption] = {}
+
+    def _append(self, entry: Entry) -> None:
+        self.entries.append(entry)
+        if isinstance(entry, IniOption):
+            self._index.setdefault(entry.name, entry)
+
+    def _reindex(self) -> None:
+        self._index = {}
+        for entry in reversed(self.entries):
+            if isinstance(entry, IniOption):
+                self._index[entry.name] = entry
+
+    @property
+    def options(self) -> List[IniOption]:
+        return [entry for entry in self.entries if isinstance(entry, IniOption)]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._index
+
+    def option(self, name: str) -> Optional[IniOption]:
+        return self._index.get(name.lower())
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        option = self.option(name)
+        return option.value if option else default
+
+    def remove(self, name: str) -> bool:
+        """Remove an option, returning whether it was there to remove."""
+        name = name.lower()
+        if name not in self._index:
+            return False
+        self.entries = [
+            entry
+            for entry in self.entries
+            if not (isinstance(entry, IniOption) and entry.name == name)
+        ]
+        self._reindex()
+        return True
+
+    def rename(self, name: str, new_name: str) -> bool:
+        """Rename an option, returning whether it was there to rename."""
+        option = self.option(name)
+        if not option:
+            return False
+        option.rename(new_name)
+        self._reindex()
+        return True
+
+    def set(self, name: str, value: str, after: Optional[str] = None) -> None:
+        """Change an option's value, adding the option if it isn't there.
+
+        New options go right after the option named by after if there is one,
+        otherwise after the section's last option.
+
+        """
+        option = self.option(name)
+        if option:
+            option.set_value(value)
+            return
+
+        anchor = self.option(after) if after else None
+        position = 0
+        for i, entry in enumerate(self.entries):
+            if isinstance(entry, IniOption):
+                position = i + 1
+                if entry is anchor:
+                    break
+
+        previous: Optional[IniOption] = None
+        if position:
+            entry = self.entries[position - 1]
+            assert isinstance(entry, IniOption)
+            previous = entry
+            previous_line = previous.lines[-1]
+        else:
+            previous_line = self.header
+
+        # match the line endings around the new line
+        newline = _line_ending(previous_line)
+        if not newline:
+            newline = self._newline
+            if previous:
+                previous.lines[-1] += newline
+            else:
+                self.header += newline
+
+        line = f"{name} = {value}{newline}"
+        match = _match_option(line)
+        assert match
+        self.entries.insert(position, IniOption([line], match))
+        self._reindex()
+
+    def lines(self) -> Iterator[str]:
+        yield self.header
+        for entry in self.entries:
+            if isinstance(entry, IniOption):
+                yield from entry.lines
+            else:
+                yield entry
+
+
+class IniDocument:
+    """A parsed INI file.
+
+    Lookups follow RawConfigParser's rules: section names are case sensitive,
+    option names aren't, and options in the DEFAULT section are visible from
+    every other section. Unlike RawConfigParser, lines that can't be parsed
+    are kept as they are rather than being an error.
+
+    """
+
+    def __init__(self, preamble: List[str], sections: List[IniSection]):
+        self.preamble = preamble
+        self.sections = sections
+
+    @classmethod
+    def parse(cls, text: str) -> "IniDocument":
+        lines = io.StringIO(text, newline="").readlines()
+        newline = (_line_ending(lines[0]) if lines else "") or "\n"
+
+        preamble: List[str] = []
+        sections: List[IniSection] = []
+        section: Optional[IniSection] = None
+        option: Optional[IniOption] = None
+        option_indent = 0
+        held_lines: List[str] = []
+
+        def append(entry: Entry) -> None:
+            for held in [*held_lines, entry]:
+                if section:
+                    section._append(held)
+                else:
+                    assert isinstance(held, str)
+                    preamble.append(held)
+            held_lines.clear()
+
+        for line in lines:
+            if not line.strip() or _is_comment(line):
+                # like configparser, neither of these ends a multiline value,
+                # so they could still turn out to be part of one
+                held_lines.append(line)
+                continue
+
+            # continuation lines are indented deeper than their option
+            indent = len(line) - len(line.lstrip())
+            if option and indent > option_indent:
+                option.lines.extend(held_lines)
+                option.lines.append(line)
+                held_lines.clear()
+                continue
+
+            match = SECTCRE.match(line, indent)
+            if match:
+                if held_lines:
+                    append(held_lines.pop())
+                section = IniSection(match["header"], line, newline)
+                sections.append(section)
+                option = None
+                continue
+
+            match = _match_option(line, indent)
+            if section and match and match["option"]:
+                option = IniOption([line], match)
+                option_indent = indent
+                append(option)
+            else:
+                append(line)
+                option = None
+
+        if held_lines:
+            append(held_lines.pop())
+
+        return cls(preamble, sections)
+
+    @classmethod
+    def read(cls, path: Path) -> "IniDocument":
+        with path.open(newline="") as f:
+            return cls.parse(f.read())
+
+    def __str__(self) -> str:
+        return "".join(self.lines())
+
+    def lines(self) -> Iterator[str]:
+        yield from self.preamble
+        for section in self.sections:
+            yield from section.lines()
+
+    def __contains__(self, name: str) -> bool:
+        return self.section(name) is not None
+
+    def section(self, name: str) -> Optional[IniSection]:
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    @property
+    def defaults(self) -> Optional[IniSection]:
+        return self.section(DEFAULT_SECTION)
+
+    def options(self, section: IniSection) -> List[str]:
+        """List the names of options visible from a section."""
+        names = list(section)
+        defaults = self.defaults
+        if defaults and defaults is not section:
+            names.extend(name for name in defaults if name not in section)
+        return names
+
+    def has_option(self, section: IniSection, name: str) -> bool:
+        return self.get(section, name) is not None
+
+    def get(
+        self, section: IniSection, name: str, default: Optional[str] = None
+    ) -> Optional[str]:
+        value = section.get(name)
+        if value is None and self.defaults:
+            value = self.defaults.get(name)
+        return default if value is None else value
+
+    def remove_section(self, name: str) -> bool:
+        """Remove a section, returning whether it was there to remove."""
+        remaining = [section for section in self.sections if section.name != name]
+        removed = len(remaining) != len(self.sections)
+        self.sections = remaining
+        return removed
@@ -0,0 +1,206 @@
+"""Find the files in a repository that the upgrader should look at.
+
+Services often check in code that must never be rewritten: Thrift-generated
+gen-py packages, vendored third-party libraries, virtualenvs and so on. These
+can be much larger than the service itself, so they're pruned while walking
+the tree, before any stage gets a chance to read or parse them.
+
+"""
+import fnmatch
+import hashlib
+import logging
+import os
+
+from pathlib import Path
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# version control metadata. not counted when reporting what was skipped.
+VCS_DIRECTORIES = {".git", ".hg", ".svn"}
+
+# directories that hold generated, vendored, or installed code
+SKIPPED_DIRECTORIES = {
+    "__pycache__",
+    ".eggs",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".tox",
+    ".venv",
+    "gen-py",
+    "node_modules",
+    "site-packages",
+    "third_party",
+    "vendor",
+    "vendored",
+    "venv",
+}
+
+# files whose presence marks the directory they're in as not ours
+MARKER_FILES = {
+    # the root of a virtualenv
+    "pyvenv.cfg",
+    # an explicit opt-out from upgrades
+    ".baseplate-upgrader-skip",
+}
+
+# packages generated by the Thrift compiler always contain this module
+THRIFT_MARKER_FILE = "ttypes.py"
+
+# how far into a file to look for a generated-code header
+HEADER_SIZE = 1024
+
+GENERATED_HEADERS = (
+    b"Autogenerated by Thrift Compiler",
+    b"Generated by the protocol buffer compiler",
+    b"@generated",
+)
+
+# only these kinds of files are checked for generated-code headers
+HEADER_CHECKED_SUFFIXES = {".py", ".pyi"}
+
+
+def has_generated_header(path: Path) -> bool:
+    try:
+        with path.open("rb") as f:
+            header = f.read(HEADER_SIZE)
+    except OSError:
+        return False
+    return any(marker in header for marker in GENERATED_HEADERS)
+
+
+def shard_of(relative_path: str, count: int) -> int:
+    """Pick which of count shards a file belongs to.
+
+    This is based on a hash of the path so that every machine agrees on it
+    no matter how the tree was walked.
+
+    """
+    digest = hashlib.sha1(relative_path.encode("utf8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def _is_skipped_directory(dirpath: str, filenames: Iterable[str]) -> bool:
+    names = set(filenames)
+    if names & MARKER_FILES:
+        return True
+    if THRIFT_MARKER_FILE in names:
+        return has_generated_header(Path(dirpath, THRIFT_MARKER_FILE))
+    return False
+
+
+class FileInventory:
+    """All the files in a repository that stages may look at.
+
+    :param root: The root of the repository.
+    :param scope: If given, only these files (relative to root) are included.
+    :param exclude: Glob patterns for paths (relative to root) to skip.
+    :param shard: If given, a (index, count) pair. Only files that belong to
+        that shard are included.
+
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        scope: Optional[Set[str]] = None,
+        exclude: Sequence[str] = (),
+        shard: Optional[Tuple[int, int]] = None,
+    ):
+        self.root = root
+        self.scope = scope
+        self.exclude = exclude
+        self.shard = shard
+        self.skipped_files = 0
+        self.skipped_bytes = 0
+        self.skipped_directories = 0
+        self._files: Optional[List[Path]] = None
+
+    def _relative(self, path: str) -> str:
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def is_excluded(self, relative_path: str) -> bool:
+        return any(fnmatch.fnmatch(relative_path, pattern) for pattern in self.exclude)
+
+    def _wants(self, relative_path: str) -> bool:
+        if self.scope is not None and relative_path not in self.scope:
+            return False
+        if self.shard is not None:
+            index, count = self.shard
+            return shard_of(relative_path, count) == index
+        return True
+
+    def in_scope(self, path: Path) -> bool:
+        return self._wants(self._relative(str(path)))
+
+    def excludes(self, path: Path) -> bool:
+        return self.is_excluded(self._relative(str(path)))
+
+    def _walk(self) -> List[Path]:
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath != str(self.root) and (
+                self.is_excluded(self._relative(dirpath))
+                or _is_skipped_directory(dirpath, filenames)
+            ):
+                self.skipped_directories += 1
+                dirnames.clear()
+                continue
+
+            for dirname in sorted(dirnames):
+                if dirname in VCS_DIRECTORIES:
+                    dirnames.remove(dirname)
+                elif dirname in SKIPPED_DIRECTORIES:
+                    dirnames.remove(dirname)
+                    self.skipped_directories += 1
+            dirnames.sort()
+
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                relative_path = self._relative(path)
+                if not self._wants(relative_path):
+                    continue
+
+                if self.is_excluded(relative_path) or (
+                    os.path.splitext(filename)[1] in HEADER_CHECKED_SUFFIXES
+                    and has_generated_header(Path(path))
+                ):
+                    self.skipped_files += 1
+                    try:
+                        self.skipped_bytes += os.path.getsize(path)
+                    except OSError:
+                        pass
+                    continue
+
+                files.append(Path(path))
+
+        if self.skipped_files or self.skipped_directories:
+            # pruned trees aren't walked, so they're counted as a whole and
+            # only the files skipped one by one have their sizes added up
+            logger.info(
+                "Skipped %d generated, vendored, or excluded directories and %d files (%d bytes)",
+                self.skipped_directories,
+                self.skipped_files,
+                self.skipped_bytes,
+            )
+        return files
+
+    def files(self) -> List[Path]:
+        if self._files is None:
+            self._files = self._walk()
+        return self._files
+
+    def find(self, *patterns: str) -> List[Path]:
+        """Find files whose names match any of the patterns."""
+        return [
+            path
+            for path in self.files()
+            if any(fnmatch.fnmatch(path.name, pattern) for pattern in patterns)
+        ]
@@ -0,0 +1,172 @@
+"""Keep track of a run's progress so an interrupted run can be resumed.
+
+The journal lives in the repository's Git directory so it never shows up as
+a change to the service itself. It's a file of JSON lines, appended to (and
+flushed) as work is done, so whatever was written before the process was
+killed can be read back. The journal is removed once a run finishes.
+
+Every file is recorded *before* it's written, so that on resume any change in
+the tree can be checked against what the interrupted run might have done.
+
+"""
+import json
+import os
+import threading
+
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Set
+from typing import TextIO
+
+
+JOURNAL_NAME = "baseplate-py-upgrader.journal"
+
+
+class JournalError(Exception):
+    pass
+
+
+class Journal:
+    """The progress of a single upgrade run.
+
+    :param path: Where the journal is stored.
+    :param root: The root of the repository being upgraded.
+    :param head: The Git commit that was checked out when the run started.
+    :param target_version: The version of Baseplate.py being upgraded to, if
+        known.
+
+    """
+
+    def __init__(
+        self, path: Path, root: Path, head: str, target_version: Optional[str]
+    ):
+        self.path = path
+        self.root = root
+        self.head = head
+        self.target_version = target_version
+        self.done_stages: Set[str] = set()
+        self.done_files: Dict[str, Dict[str, Set[str]]] = {}
+        self.touched_files: Set[str] = set()
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(
+        cls, path: Path, root: Path, head: str, target_version: Optional[str]
+    ) -> "Journal":
+        journal = cls(path, root, head, target_version)
+        journal._file = path.open("w", encoding="utf8")
+        journal._append(
+            {"event": "start", "head": head, "target_version": target_version}
+        )
+        return journal
+
+    @classmethod
+    def resume(cls, path: Path, root: Path) -> "Journal":
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            raise JournalError("There's no interrupted run to resume.")
+
+        journal: Optional[Journal] = None
+        valid_length = 0
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete entry")
+                entry = json.loads(line)
+            except ValueError:
+                # the run was killed halfway through writing this entry
+                break
+
+            if journal is None:
+                if entry.get("event") != "start":
+                    raise JournalError(f"{path} is not a valid journal.")
+                journal = cls(path, root, entry["head"], entry["target_version"])
+            else:
+                journal._replay(entry)
+            valid_length += len(line)
+
+        if journal is None:
+            raise JournalError(f"{path} is empty.")
+
+        if valid_length < len(data):
+            with path.open("r+b") as f:
+                f.truncate(valid_length)
+        journal._file = path.open("a", encoding="utf8")
+        return journal
+
+    def _replay(self, entry: Dict[str, Any]) -> None:
+        event = entry["event"]
+        if event == "touch":
+            self.touched_files.add(entry["path"])
+        elif event == "file":
+            stage_files = self.done_files.setdefault(entry["stage"], {})
+            stage_files[entry["path"]] = set(entry["names_seen"])
+        elif event == "stage":
+            self.done_stages.add(entry["stage"])
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        # steps of an upgrade may run concurrently
+        with self._lock:
+            assert self._file, "journal is closed"
+            self._file.write(json.dumps(entry, sort_keys=True) + "\n")
+            self._file.flush()
+
+    def _relative(self, path: Path) -> str:
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    @property
+    def names_seen(self) -> Set[str]:
+        """All the names seen in files that are already done."""
+        names_seen: Set[str] = set()
+        for files in self.done_files.values():
+            for names in files.values():
+                names_seen.update(names)
+        return names_seen
+
+    def is_done(self, stage: str, path: Optional[Path] = None) -> bool:
+        if stage in self.done_stages:
+            return True
+        if path is None:
+            return False
+        return self._relative(path) in self.done_files.get(stage, {})
+
+    def touch(self, path: Path) -> None:
+        """Record that a file is about to be written."""
+        relative_path = self._relative(path)
+        if relative_path not in self.touched_files:
+            self.touched_files.add(relative_path)
+            self._append({"event": "touch", "path": relative_path})
+
+    def finish_file(self, stage: str, path: Path, names_seen: Iterable[str]) -> None:
+        relative_path = self._relative(path)
+        names = set(names_seen)
+        self.done_files.setdefault(stage, {})[relative_path] = names
+        self._append(
+            {
+                "event": "file",
+                "stage": stage,
+                "path": relative_path,
+                "names_seen": sorted(names),
+            }
+        )
+
+    def finish_stage(self, stage: str) -> None:
+        self.done_stages.add(stage)
+        self._append({"event": "stage", "stage": stage})
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def remove(self) -> None:
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
@@ -4,8 +4,6 @@ import json
 import logging
 import operator
 import re
-import urllib.error
-import urllib.request
 
 from typing import Callable
 from typing import Dict
@@ -15,6 +13,7 @@ from typing import Optional
 from typing import Sequence
 from typing import Tuple
 
+from .context import RunContext
 from .requirements import RequirementsFile
 
 
@@ -77,6 +76,11 @@ class PackageRepo:
 
     def get_available_versions(self, distribution_name: str) -> List[str]:
         if distribution_name not in self._cache:
+            # this is slow to import and most runs only need it after they
+            # have already told the user what's going on.
+            import urllib.error
+            import urllib.request
+
             versions = []
 
             try:
@@ -118,12 +122,12 @@ class PackageRepo:
         else:
             return str(max(versions, key=Version.from_str))
 
-    def ensure(
+    def _parse_unsatisfied(
         self,
         requirements_file: RequirementsFile,
         requirement: str,
-        required: bool = False,
-    ) -> None:
+        required: bool,
+    ) -> Optional[Tuple[str, SpecifierSet]]:
         m = REQUIREMENT_RE.match(requirement)
         if not m:
             raise ValueError(f"invalid requirement: {repr(requirement)}")
@@ -136,11 +140,24 @@ class PackageRepo:
             current_version = Version.from_str(requirements_file[distribution_name])
         except KeyError:
             if not required:
-                return
+                return None
 
         if current_version and specifiers.satisfied_by(current_version):
+            return None
+
+        return distribution_name, specifiers
+
+    def ensure(
+        self,
+        requirements_file: RequirementsFile,
+        requirement: str,
+        required: bool = False,
+    ) -> None:
+        unsatisfied = self._parse_unsatisfied(requirements_file, requirement, required)
+        if not unsatisfied:
             return
 
+        distribution_name, specifiers = unsatisfied
         versions = self.get_available_versions(distribution_name)
         for version_str in sorted(versions, key=Version.from_str, reverse=True):
             version = Version.from_str(version_str)
@@ -152,3 +169,45 @@ class PackageRepo:
                 )
                 requirements_file[distribution_name] = version_str
                 break
+
+
+class CheckingPackageRepo(PackageRepo):
+    """A package repo that reports unmet requirements instead of fixing them.
+
+    This avoids looking up versions on PyPI for requirements that would be
+    changed, which is all a check-only run needs to know.
+
+    """
+
+    def __init__(self, context: RunContext) -> None:
+        super().__init__()
+        self.context = context
+
+    def ensure(
+        self,
+        requirements_file: RequirementsFile,
+        requirement: str,
+        required: bool = False,
+    ) -> None:
+        if self._parse_unsatisfied(requirements_file, requirement, required):
+            self.context.record_change(
+                requirements_file.path, f"requirement {requirement}"
+            )
+
+
+class DeferredPackageRepo(PackageRepo):
+    """A package repo that leaves requirements alone.
+
+    Shards of a run only look at their slice of the repository. Requirements
+    depend on what all the shards found, so they're decided once the shards
+    are merged.
+
+    """
+
+    def ensure(
+        self,
+        requirements_file: RequirementsFile,
+        requirement: str,
+        required: bool = False,
+    ) -> None:
+        pass
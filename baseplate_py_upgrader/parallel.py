@@ -0,0 +1,136 @@
+"""Run per-file work on a pool of threads without scrambling the output.
+
+Most of what a stage does to a file is reading and writing it, so a small
+pool of threads is enough to keep the disk busy. Log records from work done
+in the pool are held back and replayed in a fixed order once the work is
+done, so the output is the same no matter how the threads were scheduled.
+
+"""
+import contextlib
+import logging
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import TypeVar
+
+
+T = TypeVar("T")
+
+
+# how many files may be worked on at once. the work is mostly waiting on the
+# disk, so there's no point in more threads than this.
+MAX_FILE_THREADS = 8
+
+
+_current = threading.local()
+_install_lock = threading.Lock()
+_install_count = 0
+
+
+class _BufferingFilter(logging.Filter):
+    """Hold back records logged by threads that are capturing logs."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        buffer: Optional[List[logging.LogRecord]] = getattr(_current, "buffer", None)
+        if buffer is None:
+            return True
+        # every handler asks about the same record in turn
+        if not buffer or buffer[-1] is not record:
+            buffer.append(record)
+        return False
+
+
+_buffering_filter = _BufferingFilter()
+
+
+@contextlib.contextmanager
+def buffering_logs() -> Iterator[None]:
+    """Allow threads to capture logs while this is active.
+
+    This may be nested, including from different threads.
+
+    """
+    global _install_count
+
+    with _install_lock:
+        if not _install_count:
+            for handler in logging.getLogger().handlers:
+                handler.addFilter(_buffering_filter)
+        _install_count += 1
+
+    try:
+        yield
+    finally:
+        with _install_lock:
+            _install_count -= 1
+            if not _install_count:
+                for handler in logging.getLogger().handlers:
+                    handler.removeFilter(_buffering_filter)
+
+
+@contextlib.contextmanager
+def capturing_logs(buffer: List[logging.LogRecord]) -> Iterator[None]:
+    """Capture records logged by the current thread into buffer."""
+    previous = getattr(_current, "buffer", None)
+    _current.buffer = buffer
+    try:
+        yield
+    finally:
+        _current.buffer = previous
+
+
+def replay_logs(records: Sequence[logging.LogRecord]) -> None:
+    """Log captured records, as if they were logged now."""
+    for record in records:
+        logging.getLogger(record.name).handle(record)
+
+
+def default_thread_count() -> int:
+    return min(MAX_FILE_THREADS, os.cpu_count() or 1)
+
+
+def map_files(
+    function: Callable[[Path], T],
+    paths: Sequence[Path],
+    max_threads: Optional[int] = None,
+) -> List[T]:
+    """Call function on each path, on a pool of threads.
+
+    Results come back and logs come out in the order of paths. If a call
+    raises, files that haven't been started yet are skipped and the exception
+    is raised once the rest have finished.
+
+    """
+    threads = min(max_threads or default_thread_count(), len(paths))
+    if threads <= 1:
+        return [function(path) for path in paths]
+
+    buffers: List[List[logging.LogRecord]] = [[] for _ in paths]
+
+    def run(index: int) -> T:
+        with capturing_logs(buffers[index]):
+            return function(paths[index])
+
+    results = []
+    with buffering_logs(), ThreadPoolExecutor(
+        max_workers=threads, thread_name_prefix="upgrade-file"
+    ) as executor:
+        futures = [executor.submit(run, i) for i in range(len(paths))]
+        try:
+            for future, buffer in zip(futures, buffers):
+                try:
+                    results.append(future.result())
+                finally:
+                    replay_logs(buffer)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return results
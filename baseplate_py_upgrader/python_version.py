@@ -4,7 +4,7 @@ from pathlib import Path
 from typing import Optional
 from typing import Tuple
 
-from .docker import IMAGE_RE
+from .docker import ImageReferences
 
 
 PYTHON_REQUIRES_RE = re.compile(
@@ -21,7 +21,9 @@ def _make_version_tuple(version_str: str) -> PythonVersion:
     return (int(major), int(minor))
 
 
-def guess_python_version(root: Path) -> Optional[PythonVersion]:
+def guess_python_version(
+    root: Path, images: ImageReferences
+) -> Optional[PythonVersion]:
     try:
         setup_py_text = (root / "setup.py").read_text()
         for op, version in PYTHON_REQUIRES_RE.findall(setup_py_text):
@@ -29,18 +31,8 @@ def guess_python_version(root: Path) -> Optional[PythonVersion]:
     except OSError:
         pass
 
-    try:
-        dockerfile_text = (root / "Dockerfile").read_text()
-        for match in IMAGE_RE.findall(dockerfile_text):
-            return _make_version_tuple(match[2])
-    except OSError:
-        pass
-
-    try:
-        dockerfile_text = (root / ".drone.yml").read_text()
-        for match in IMAGE_RE.findall(dockerfile_text):
-            return _make_version_tuple(match[2])
-    except OSError:
-        pass
+    for name in ("Dockerfile", ".drone.yml"):
+        for reference in images.in_file(root / name):
+            return _make_version_tuple(reference.python)
 
     return None
@@ -1,12 +1,187 @@
+import ast
+import importlib
+import itertools
+
 from lib2to3.main import StdoutRefactoringTool
+from lib2to3.pytree import Node
 from lib2to3.refactor import get_fixers_from_package
 from pathlib import Path
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+
+from .context import FileContext
+from .context import RunContext
+from .scan import file_contains_any
+from .scheduler import Step
+from .symbols import find_references
+from .symbols import ImportIndex
+from .workers import refactor_in_workers
+
+
+class BaseplateRefactoringTool(StdoutRefactoringTool):
+    def __init__(
+        self,
+        fixers: List[str],
+        context: RunContext,
+        import_index: Optional[ImportIndex] = None,
+    ):
+        options = {"print_function": True, "import_index": import_index}
+        super().__init__(
+            fixers=fixers,
+            options=options,
+            explicit=[],
+            nobackups=True,
+            show_diffs=False,
+        )
+        self.context = context
+        self.file_names_seen: Set[str] = set()
+
+    def refactor_tree(self, tree: Node, name: str) -> bool:
+        changed = bool(super().refactor_tree(tree, name))
+        for fixer in itertools.chain(self.pre_order, self.post_order):
+            self.context.merge(fixer.context)
+            self.file_names_seen.update(fixer.context.names_seen)
+        return changed
+
+    def refactor_file(self, filename: str, *args: Any, **kwargs: Any) -> None:
+        self.file_names_seen = set()
+        super().refactor_file(filename, *args, **kwargs)
+        self.context.finish_file("python", Path(filename), self.file_names_seen)
+
+    def write_file(
+        self, new_text: str, filename: str, old_text: str, encoding: Optional[str]
+    ) -> None:
+        self.context.touch(Path(filename))
+        super().write_file(new_text, filename, old_text, encoding)
+
+    def print_output(self, old: str, new: str, filename: str, equal: bool) -> None:
+        if not equal:
+            self.context.record_change(Path(filename), "Python code")
+        if not self.context.check:
+            super().print_output(old, new, filename, equal)
+
+
+def _is_hidden(context: RunContext, path: Path) -> bool:
+    # lib2to3 skips hidden files and directories when it walks a tree itself
+    return any(part.startswith(".") for part in Path(context.relative_path(path)).parts)
+
+
+def find_python_files(context: RunContext) -> List[Path]:
+    return [
+        path for path in context.find_files("*.py") if not _is_hidden(context, path)
+    ]
+
+
+def collect_names_seen(context: RunContext, paths: List[Path]) -> None:
+    """Record the Baseplate.py names files refer to without refactoring them.
+
+    This only parses the files with the ast module, which is much cheaper
+    than refactoring them.
+
+    """
+    for path in context.files_containing(b"baseplate", paths):
+        try:
+            tree = ast.parse(path.read_bytes())
+        except (OSError, SyntaxError, ValueError):
+            continue
+
+        file_context = FileContext(str(path))
+        for reference in find_references(tree):
+            file_context.record_name(reference.name)
+        context.merge(file_context)
+
+
+def get_fixer_keywords(fixers: Sequence[str]) -> Optional[List[bytes]]:
+    """Get the names a file must contain for any of these fixers to change it.
+
+    None is returned if some fixer doesn't say (see BaseplateBaseFix.KEYWORDS),
+    since then any file might need changing.
+
+    """
+    keywords: Set[bytes] = set()
+    for fixer in fixers:
+        # the same convention lib2to3 uses to find the fixer class
+        fix_name = fixer.rpartition(".fix_")[2]
+        class_name = "Fix" + "".join(part.title() for part in fix_name.split("_"))
+        fixer_class = getattr(importlib.import_module(fixer), class_name)
+        fixer_keywords = getattr(fixer_class, "KEYWORDS", ())
+        if not fixer_keywords:
+            return None
+        keywords.update(keyword.encode("utf8") for keyword in fixer_keywords)
+    return sorted(keywords)
+
+
+def filter_by_keywords(
+    context: RunContext, paths: List[Path], keywords: Sequence[bytes]
+) -> List[Path]:
+    """Narrow paths down to the files that contain any of the keywords."""
+    candidates: Set[Path] = set()
+    for keyword in keywords:
+        candidates.update(context.files_containing(keyword, paths))
+    return [
+        path
+        for path in paths
+        if path in candidates and file_contains_any(path, keywords)
+    ]
+
+
+def refactor_python_files(root: Path, fix_package: str, context: RunContext) -> None:
+    if not context.wants("python"):
+        return
+
+    fixers = [
+        fixer
+        for fixer in get_fixers_from_package(fix_package)
+        if context.selection.wants_fixer(fixer.rpartition(".fix_")[2])
+    ]
+    if not fixers:
+        return
+
+    context.start_stage("python")
+    if context.file_scope is not None:
+        # only files in scope are refactored, but what requirements the
+        # service needs depends on the names used anywhere in it
+        collect_names_seen(
+            context,
+            [
+                path
+                for path in context.find_repo_files("*.py")
+                if not context.in_scope(path) and not _is_hidden(context, path)
+            ],
+        )
+
+    python_files = [
+        path
+        for path in find_python_files(context)
+        if not context.is_file_done("python", path)
+    ]
+    keywords = get_fixer_keywords(fixers)
+    if keywords is not None:
+        python_files = filter_by_keywords(context, python_files, keywords)
+    paths = [str(path) for path in python_files]
+
+    # fixers that rename things need to know what each file calls them
+    import_index = None
+    if any(fixer.endswith(".fix_module_usage") for fixer in fixers):
+        import_index = ImportIndex.build(
+            context.files_containing(b"baseplate", [Path(path) for path in paths])
+        )
+
+    if context.workers.supervised:
+        refactor_in_workers(context, fixers, paths, import_index)
+    else:
+        refactoring_tool = BaseplateRefactoringTool(fixers, context, import_index)
+        refactoring_tool.refactor(paths, write=not context.check)
+    context.finish_stage("python")
 
 
-def refactor_python_files(root: Path, fix_package: str) -> None:
-    fixers = get_fixers_from_package(fix_package)
-    options = {"print_function": True}
-    refactoring_tool = StdoutRefactoringTool(
-        fixers=fixers, options=options, explicit=[], nobackups=True, show_diffs=False
+def refactor_step(root: Path, fix_package: str, context: RunContext) -> Step:
+    return Step(
+        "refactor Python",
+        lambda: refactor_python_files(root, fix_package, context),
+        reads=["*.py"],
+        writes=["*.py", "names_seen"],
     )
-    refactoring_tool.refactor([root], write=True)
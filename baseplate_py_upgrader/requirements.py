@@ -1,7 +1,12 @@
 import re
 
 from pathlib import Path
+from typing import Callable
+from typing import Dict
 from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
 
 
 class RequirementsError(Exception):
@@ -18,6 +23,21 @@ REQUIREMENT_RE = re.compile(
 )
 
 
+class RequirementChange(NamedTuple):
+    distribution: str
+    old_version: Optional[str]
+    new_version: Optional[str]
+
+
+def _pinned_versions(lines: List[str]) -> Dict[str, Tuple[str, str]]:
+    versions = {}
+    for line in lines:
+        m = REQUIREMENT_RE.match(line)
+        if m:
+            versions[m["distribution"].lower()] = (m["distribution"], m["version"])
+    return versions
+
+
 class RequirementsFile:
     @classmethod
     def from_root(cls, root: Path) -> "RequirementsFile":
@@ -29,9 +49,39 @@ class RequirementsFile:
         except OSError as exc:
             raise RequirementsNotFoundError(root) from exc
 
-    def __init__(self, path: Path, lines: List[str]):
+    def __init__(
+        self,
+        path: Path,
+        lines: List[str],
+        on_change: Optional[Callable[[RequirementChange], None]] = None,
+    ):
         self.path = path
         self.lines = lines
+        self.original_lines = list(lines)
+        self.on_change = on_change
+
+    def _changed(
+        self, distribution_name: str, old: Optional[str], new: Optional[str]
+    ) -> None:
+        if self.on_change and old != new:
+            self.on_change(RequirementChange(distribution_name, old, new))
+
+    @property
+    def changed(self) -> bool:
+        return self.lines != self.original_lines
+
+    def changes(self) -> List[RequirementChange]:
+        """List the pinned versions that were added, changed, or removed."""
+        old = _pinned_versions(self.original_lines)
+        new = _pinned_versions(self.lines)
+        changes = []
+        for key in sorted(old.keys() | new.keys()):
+            old_version = old[key][1] if key in old else None
+            new_version = new[key][1] if key in new else None
+            if old_version != new_version:
+                name = new[key][0] if key in new else old[key][0]
+                changes.append(RequirementChange(name, old_version, new_version))
+        return changes
 
     def __getitem__(self, distribution_name: str) -> str:
         for line in self.lines:
@@ -47,8 +97,10 @@ class RequirementsFile:
             if m:
                 if m["distribution"].lower() == distribution_name.lower():
                     self.lines[i] = f"{distribution_name}=={version}"
+                    self._changed(distribution_name, m["version"], version)
                     return
         self.lines.append(f"{distribution_name}=={version}")
+        self._changed(distribution_name, None, version)
 
     def __delitem__(self, distribution_name: str) -> None:
         for i, line in enumerate(self.lines):
@@ -60,6 +112,7 @@ class RequirementsFile:
             return
 
         del self.lines[i]
+        self._changed(m["distribution"], m["version"], None)
 
     def __contains__(self, distribution_name: str) -> bool:
         try:
@@ -0,0 +1,116 @@
+"""Log a run as lines of JSON for machines to read.
+
+Every event is a JSON object on its own line with an "event" field saying
+what happened and a "time" field saying when (seconds since the epoch).
+Events are written as they happen, so a log can be followed while the run
+is going and nothing about the run is kept in memory:
+
+* start: what's being upgraded to what.
+* stage_start: a stage (see context.FILE_STAGES and GLOBAL_STAGES) started.
+* file: a stage finished with a file.
+* warning: something needs a human's attention. Has the path, line, and
+  fixer it's about, where known.
+* stage: a stage finished. Has how long it took and how many files it
+  looked at.
+* requirement: a pinned requirement was (or would be) changed. A requirement
+  may change more than once in a run.
+* finish: the run is over. Has its status and totals.
+* error: the run couldn't be started.
+
+"""
+import json
+import threading
+import time
+
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import TextIO
+
+from .api import UpgradeResult
+from .api import UpgradeStart
+from .api import UpgradeWarning
+from .requirements import RequirementChange
+
+
+class RunLog:
+    """Write events about a run to a stream as they happen.
+
+    The methods are shaped to be passed to UpgradeOptions as callbacks.
+
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._stage_started: Dict[str, float] = {}
+        self._stage_files: Dict[str, int] = {}
+        self._warnings = 0
+
+    def write(self, event: str, **fields: Any) -> None:
+        line = json.dumps({"event": event, "time": time.time(), **fields})
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def start(self, start: UpgradeStart) -> None:
+        self.write(
+            "start",
+            root=str(start.root),
+            current_version=start.current_version,
+            target_series=start.target_series,
+            target_version=start.target_version,
+            python_version=(
+                ".".join(str(v) for v in start.python_version)
+                if start.python_version
+                else None
+            ),
+            resuming=start.resuming,
+        )
+
+    def stage_started(self, stage: str) -> None:
+        self._stage_started[stage] = time.monotonic()
+        self.write("stage_start", stage=stage)
+
+    def file_processed(self, stage: str, path: Path) -> None:
+        self._stage_files[stage] = self._stage_files.get(stage, 0) + 1
+        self.write("file", stage=stage, path=str(path))
+
+    def stage_done(self, stage: str) -> None:
+        started = self._stage_started.pop(stage, self._started)
+        self.write(
+            "stage",
+            stage=stage,
+            duration=time.monotonic() - started,
+            files=self._stage_files.get(stage, 0),
+        )
+
+    def warning(self, warning: UpgradeWarning) -> None:
+        with self._lock:
+            self._warnings += 1
+        self.write("warning", **warning._asdict())
+
+    def requirement_changed(self, change: RequirementChange) -> None:
+        self.write("requirement", **change._asdict())
+
+    def finish(self, result: UpgradeResult) -> None:
+        # some stages (like checking Thrift IDL) are never marked done so
+        # that resuming a run repeats them
+        for stage in list(self._stage_started):
+            self.stage_done(stage)
+
+        self.write(
+            "finish",
+            status=result.status,
+            duration=time.monotonic() - self._started,
+            target_version=result.target_version,
+            files=sum(self._stage_files.values()),
+            changed_files=len(result.changed_files),
+            skipped_files=len(result.skipped_files),
+            warnings=self._warnings,
+            requirement_changes=len(result.requirement_changes),
+        )
+
+    def error(self, message: str) -> None:
+        self.write("error", message=message)
@@ -0,0 +1,73 @@
+"""Cheaply find out whether a file is worth reading as text.
+
+Stages that only change files containing some marker shouldn't decode every
+file in the repository to find out. These helpers look at the raw bytes
+instead: a small leading sample to rule out binary files, then a search of
+the whole file through a memory map, which costs a few system calls no
+matter how big the file is.
+
+"""
+import mmap
+import re
+
+from pathlib import Path
+from typing import cast
+from typing import Collection
+
+
+# how much of a file to look at when deciding if it's binary
+SAMPLE_SIZE = 8192
+
+
+def is_binary(sample: bytes) -> bool:
+    """Guess if a file is binary from a sample of its first bytes."""
+    return b"\0" in sample
+
+
+def file_contains(path: Path, needle: bytes) -> bool:
+    """Return if a text file contains needle. Binary files never do.
+
+    Unreadable files are treated as not containing needle.
+
+    """
+    try:
+        with path.open("rb") as f:
+            sample = f.read(SAMPLE_SIZE)
+            if is_binary(sample):
+                return False
+
+            if needle in sample:
+                return True
+
+            if len(sample) < SAMPLE_SIZE:
+                return False
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped.find(needle) != -1
+    except (OSError, ValueError):
+        return False
+
+
+def file_contains_any(path: Path, needles: Collection[bytes]) -> bool:
+    """Like file_contains(), but for any of several needles at once."""
+    if len(needles) == 1:
+        return file_contains(path, next(iter(needles)))
+
+    pattern = re.compile(b"|".join(re.escape(needle) for needle in needles))
+    try:
+        with path.open("rb") as f:
+            sample = f.read(SAMPLE_SIZE)
+            if is_binary(sample):
+                return False
+
+            if pattern.search(sample):
+                return True
+
+            if len(sample) < SAMPLE_SIZE:
+                return False
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # re searches any buffer, but the stubs only accept bytes
+                return pattern.search(cast(bytes, mapped)) is not None
+    except (OSError, ValueError):
+        return False
@@ -0,0 +1,207 @@
+"""Run the steps of an upgrade concurrently where that's safe.
+
+Updaters declare their steps along with what each step reads and writes.
+Resources are named by glob patterns for the files involved ("*.py",
+"requirements.txt", or "*" for any file) or by name for shared state, like
+"names_seen". A step has to wait for every earlier step it conflicts with (one
+writes what the other reads or writes) and for any steps it explicitly runs
+after. Everything else runs concurrently.
+
+Steps log through a buffer that's flushed in declaration order, so output
+looks the same as if the steps had run one after the other.
+
+"""
+import fnmatch
+import logging
+import time
+
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Callable
+from typing import Collection
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import TYPE_CHECKING
+
+from .parallel import buffering_logs
+from .parallel import capturing_logs
+from .parallel import replay_logs
+
+
+if TYPE_CHECKING:
+    from .context import RunContext
+
+
+# how many steps may run at once. steps are mostly waiting on disk or the
+# network, or hand their heavy lifting off to worker processes.
+MAX_CONCURRENT_STEPS = 4
+
+
+class Step(NamedTuple):
+    """A single step of an upgrade.
+
+    :param name: A name for the step, unique within an upgrade.
+    :param run: Does the work. May return a non-zero result to fail the
+        upgrade.
+    :param reads: Resources this step reads.
+    :param writes: Resources this step changes.
+    :param after: Names of steps that must finish before this one starts, in
+        addition to the ones it conflicts with.
+
+    """
+
+    name: str
+    run: Callable[[], Optional[int]]
+    reads: Collection[str] = ()
+    writes: Collection[str] = ()
+    after: Collection[str] = ()
+
+
+class StepTiming(NamedTuple):
+    name: str
+    started: float
+    finished: float
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+class ScheduleReport(NamedTuple):
+    timings: List[StepTiming]
+    critical_path: List[StepTiming]
+
+    @property
+    def duration(self) -> float:
+        if not self.timings:
+            return 0.0
+        return max(t.finished for t in self.timings) - min(
+            t.started for t in self.timings
+        )
+
+
+def _overlaps(a: Collection[str], b: Collection[str]) -> bool:
+    return any(
+        fnmatch.fnmatchcase(x, y) or fnmatch.fnmatchcase(y, x) for x in a for y in b
+    )
+
+
+def plan(steps: Sequence[Step]) -> Dict[str, Set[str]]:
+    """Work out which steps each step has to wait for."""
+    names = [step.name for step in steps]
+    if len(set(names)) != len(names):
+        raise ValueError(f"step names must be unique: {names}")
+
+    dependencies: Dict[str, Set[str]] = {}
+    for i, step in enumerate(steps):
+        unknown = set(step.after) - set(names[:i])
+        if unknown:
+            raise ValueError(
+                f"step {step.name} runs after unknown or later steps: {sorted(unknown)}"
+            )
+
+        dependencies[step.name] = set(step.after)
+        touches = [*step.reads, *step.writes]
+        for earlier in steps[:i]:
+            if _overlaps(step.writes, earlier.reads) or _overlaps(
+                touches, earlier.writes
+            ):
+                dependencies[step.name].add(earlier.name)
+    return dependencies
+
+
+def critical_path(
+    timings: Sequence[StepTiming], dependencies: Dict[str, Set[str]]
+) -> List[StepTiming]:
+    """Find the chain of dependent steps that took the longest."""
+    by_name = {timing.name: timing for timing in timings}
+    longest: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for timing in sorted(timings, key=lambda t: t.finished):
+        best: Optional[str] = None
+        for dependency in dependencies.get(timing.name, ()):
+            if dependency in longest and (
+                best is None or longest[dependency] > longest[best]
+            ):
+                best = dependency
+        longest[timing.name] = timing.duration + (longest[best] if best else 0.0)
+        previous[timing.name] = best
+
+    if not longest:
+        return []
+
+    path = []
+    name: Optional[str] = max(longest, key=lambda n: longest[n])
+    while name:
+        path.append(by_name[name])
+        name = previous[name]
+    return list(reversed(path))
+
+
+def run_steps(context: "RunContext", steps: Sequence[Step]) -> int:
+    """Run steps, concurrently where they don't conflict.
+
+    Any steps queued up on the run context (see RunContext.add_step) are
+    run along with them. Returns the highest result of any step.
+
+    """
+    steps = [*steps, *context.queued_steps]
+    context.queued_steps.clear()
+
+    dependencies = plan(steps)
+    buffers: Dict[str, List[logging.LogRecord]] = {step.name: [] for step in steps}
+    timings: Dict[str, StepTiming] = {}
+    results: Dict[str, int] = {}
+    flushed = 0
+
+    def run(step: Step) -> int:
+        started = time.perf_counter()
+        try:
+            with capturing_logs(buffers[step.name]):
+                return step.run() or 0
+        finally:
+            timings[step.name] = StepTiming(step.name, started, time.perf_counter())
+
+    def flush(everything: bool = False) -> None:
+        nonlocal flushed
+        while flushed < len(steps):
+            name = steps[flushed].name
+            if name not in results and not everything:
+                break
+            replay_logs(buffers[name])
+            flushed += 1
+
+    pending = list(steps)
+    running: Dict["Future[int]", str] = {}
+    with buffering_logs(), ThreadPoolExecutor(
+        max_workers=MAX_CONCURRENT_STEPS, thread_name_prefix="upgrade-step"
+    ) as executor:
+        while pending or running:
+            for step in list(pending):
+                if dependencies[step.name] <= set(results):
+                    pending.remove(step)
+                    running[executor.submit(run, step)] = step.name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except BaseException:
+                    pending.clear()
+                    wait(running)
+                    flush(everything=True)
+                    raise
+            flush()
+
+    report_timings = [timings[step.name] for step in steps]
+    context.step_reports.append(
+        ScheduleReport(report_timings, critical_path(report_timings, dependencies))
+    )
+    return max([0, *results.values()])
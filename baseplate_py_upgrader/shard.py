@@ -0,0 +1,137 @@
+"""Split an upgrade across machines and merge the results.
+
+Each shard runs the file stages (Python, config, Thrift, text) on a slice of
+the repository picked by a hash of each file's path, then saves what it did
+to a JSON file: a patch of its changes, the warnings it logged, and the
+Baseplate names it saw. Merging applies all the patches and then runs the
+global stages (requirements, Docker) once, with everything the shards saw.
+
+"""
+import argparse
+import json
+import logging
+import subprocess
+
+from pathlib import Path
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Sequence
+from typing import Set
+from typing import TextIO
+from typing import Tuple
+
+from .context import RunContext
+from .git import apply_patch
+from .workers import LogEntry
+from .workers import replay_logs
+
+
+class ShardError(Exception):
+    pass
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse a 1-based "i/N" shard specifier into a 0-based (index, count)."""
+    try:
+        index_str, count_str = value.split("/")
+        index, count = int(index_str), int(count_str)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} is not between 1 and {count}")
+    return index - 1, count
+
+
+class ShardResult(NamedTuple):
+    shard_index: int
+    shard_count: int
+    target_series: str
+    result: int
+    names_seen: List[str]
+    warnings: List[LogEntry]
+    patch: str
+
+    def dump(self, f: TextIO) -> None:
+        json.dump(self._asdict(), f, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, f: TextIO) -> "ShardResult":
+        try:
+            data = json.load(f)
+            return cls(
+                shard_index=data["shard_index"],
+                shard_count=data["shard_count"],
+                target_series=data["target_series"],
+                result=data["result"],
+                names_seen=data["names_seen"],
+                warnings=[
+                    (name, level, message, location)
+                    for name, level, message, location in data["warnings"]
+                ],
+                patch=data["patch"],
+            )
+        except (ValueError, KeyError, TypeError) as exc:
+            raise ShardError(f"{f.name} is not a shard result: {exc}")
+
+
+class RepeatFilter(logging.Filter):
+    """Drop log records that are identical to ones already logged.
+
+    Every shard logs the same general advice, so only pass it on once.
+
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.seen: Set[Tuple[int, str]] = set()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.levelno, record.getMessage())
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        return True
+
+
+def _validate(shards: Iterable[ShardResult]) -> str:
+    shards = list(shards)
+    target_series = {shard.target_series for shard in shards}
+    if len(target_series) != 1:
+        raise ShardError(
+            f"Shards upgraded to different series: {', '.join(sorted(target_series))}"
+        )
+
+    count = shards[0].shard_count
+    indexes = sorted(shard.shard_index for shard in shards)
+    if any(shard.shard_count != count for shard in shards) or indexes != list(
+        range(count)
+    ):
+        found = ", ".join(
+            f"{shard.shard_index + 1}/{shard.shard_count}" for shard in shards
+        )
+        raise ShardError(f"Expected each of {count} shards exactly once, got {found}")
+
+    return target_series.pop()
+
+
+def merge_shards(root: Path, shards: Sequence[ShardResult], context: RunContext) -> str:
+    """Apply the changes each shard made and collect what they found.
+
+    Returns the target series all the shards agreed on.
+
+    """
+    target_series = _validate(shards)
+
+    for shard in sorted(shards, key=lambda shard: shard.shard_index):
+        try:
+            apply_patch(root, shard.patch)
+        except subprocess.CalledProcessError as exc:
+            raise ShardError(
+                f"Could not apply changes from shard {shard.shard_index + 1}/{shard.shard_count}: {exc.stderr.strip()}"
+            )
+        replay_logs(shard.warnings)
+        context.names_seen.update(shard.names_seen)
+
+    return target_series
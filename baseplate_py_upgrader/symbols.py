@@ -0,0 +1,249 @@
+"""Find which Baseplate.py names a Python module refers to.
+
+References are found with the standard library's ast module rather than
+lib2to3. It's several times faster and this only reads code, it never has
+to write it back out.
+
+Names are resolved through the module's imports, so with
+
+    import baseplate.lib.metrics as metrics
+    from baseplate import lib
+
+both metrics.Timer and lib.metrics.Timer are references to
+baseplate.lib.metrics.Timer. Imports are resolved for the module as a
+whole, wherever they are in it, so names that are also bound some other
+way, like a function parameter called metrics, aren't followed at all.
+
+"""
+import ast
+import sys
+
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+
+from .scan import file_contains
+
+
+class SymbolReference(NamedTuple):
+    """A fully qualified name was referred to on a line."""
+
+    name: str
+    line: int
+
+
+class AttributeUse(NamedTuple):
+    """An attribute was used on a line.
+
+    The owner is the last name before the attribute, e.g. request for both
+    request.trace and foo.request.trace, if there is one.
+
+    """
+
+    attribute: str
+    line: int
+    owner: Optional[str] = None
+
+
+class KeywordUse(NamedTuple):
+    """A keyword argument was passed on a line to a callable with this name.
+
+    The callee is the last name before the call, e.g. ThriftClient for both
+    ThriftClient(...) and clients.ThriftClient(...).
+
+    """
+
+    keyword: str
+    line: int
+    callee: str
+
+
+def _is_baseplate(name: str) -> bool:
+    return name == "baseplate" or name.startswith("baseplate.")
+
+
+def _dotted_name(node: ast.expr) -> Optional[List[str]]:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return list(reversed(parts))
+
+
+def _bound_names(node: ast.AST) -> List[str]:
+    """List the names a node binds other than by importing them."""
+    if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+        return [node.id]
+    if isinstance(node, ast.arg):
+        return [node.arg]
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, ast.ExceptHandler) and node.name:
+        return [node.name]
+    if isinstance(node, (ast.Global, ast.Nonlocal)):
+        return node.names
+    if sys.version_info >= (3, 10):
+        if isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            return [node.name]
+        if isinstance(node, ast.MatchMapping) and node.rest:
+            return [node.rest]
+    return []
+
+
+def find_aliases(tree: ast.AST) -> Dict[str, str]:
+    """Map names bound by imports of Baseplate.py to what they refer to.
+
+    Only names that are bound to the same thing everywhere they're bound are
+    included. A name that's also a parameter, an assignment target, or an
+    import of something else somewhere in the module can't be told apart from
+    the alias without following scopes, so it's left out.
+
+    """
+    aliases: Dict[str, str] = {}
+    rebound: Set[str] = set()
+
+    def bind(name: str, target: Optional[str]) -> None:
+        if target is None or aliases.setdefault(name, target) != target:
+            rebound.add(name)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                target = alias.name if _is_baseplate(alias.name) else None
+                if alias.asname:
+                    bind(alias.asname, target)
+                else:
+                    # "import baseplate.lib" binds baseplate, not lib
+                    root = alias.name.partition(".")[0]
+                    bind(root, root if target else None)
+        elif isinstance(node, ast.ImportFrom):
+            from_baseplate = (
+                not node.level and node.module and _is_baseplate(node.module)
+            )
+            for alias in node.names:
+                if alias.name != "*":
+                    target = f"{node.module}.{alias.name}" if from_baseplate else None
+                    bind(alias.asname or alias.name, target)
+        else:
+            rebound.update(_bound_names(node))
+    return {name: target for name, target in aliases.items() if name not in rebound}
+
+
+class _ReferenceVisitor(ast.NodeVisitor):
+    def __init__(self, aliases: Dict[str, str]):
+        self.aliases = aliases
+        self.references: List[SymbolReference] = []
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            if _is_baseplate(alias.name):
+                self.references.append(SymbolReference(alias.name, node.lineno))
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.level or not node.module or not _is_baseplate(node.module):
+            return
+        for alias in node.names:
+            if alias.name == "*":
+                self.references.append(SymbolReference(node.module, node.lineno))
+            else:
+                self.references.append(
+                    SymbolReference(f"{node.module}.{alias.name}", node.lineno)
+                )
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        parts = _dotted_name(node)
+        if parts and parts[0] in self.aliases:
+            # the rest of the chain is part of this reference
+            name = ".".join([self.aliases[parts[0]], *parts[1:]])
+            self.references.append(SymbolReference(name, node.lineno))
+        else:
+            self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if node.id in self.aliases:
+            name = self.aliases[node.id]
+            self.references.append(SymbolReference(name, node.lineno))
+
+
+def find_references(tree: ast.AST) -> List[SymbolReference]:
+    """Find every reference to a Baseplate.py name in a module."""
+    visitor = _ReferenceVisitor(find_aliases(tree))
+    visitor.visit(tree)
+    return visitor.references
+
+
+def _last_name(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def find_attribute_uses(tree: ast.AST) -> Iterator[AttributeUse]:
+    """Find every attribute used in a module."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            yield AttributeUse(node.attr, node.lineno, _last_name(node.value))
+
+
+def find_keyword_uses(tree: ast.AST) -> Iterator[KeywordUse]:
+    """Find every keyword argument passed to a named callable in a module."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            callee = _last_name(node.func)
+            if not callee:
+                continue
+            for keyword in node.keywords:
+                if keyword.arg:
+                    yield KeywordUse(keyword.arg, keyword.value.lineno, callee)
+
+
+class ImportIndex:
+    """The names each file in a project binds to Baseplate.py names.
+
+    This is built in one pass over the project before refactoring so that
+    fixers can follow aliases (like "import baseplate.lib.metrics as
+    metrics") without each of them working out imports for themselves.
+    Files that only "import baseplate" plainly aren't included.
+
+    :param aliases: The aliases in each file, by path.
+
+    """
+
+    def __init__(self, aliases: Optional[Dict[str, Dict[str, str]]] = None):
+        self._aliases = aliases or {}
+
+    @classmethod
+    def build(cls, paths: Iterable[Path]) -> "ImportIndex":
+        aliases = {}
+        for path in paths:
+            if not file_contains(path, b"baseplate"):
+                continue
+
+            try:
+                tree = ast.parse(path.read_bytes())
+            except (OSError, SyntaxError, ValueError):
+                continue
+
+            file_aliases = find_aliases(tree)
+            if file_aliases.get("baseplate") == "baseplate":
+                del file_aliases["baseplate"]
+            if file_aliases:
+                aliases[str(path)] = file_aliases
+        return cls(aliases)
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def aliases(self, path: str) -> Dict[str, str]:
+        """Map names in a file to the Baseplate.py names they're bound to."""
+        return self._aliases.get(path, {})
@@ -0,0 +1,220 @@
+"""Find which files might contain a string without reading them.
+
+Several stages only change files containing some marker, like "thrift1" or
+"baseplate-py:". file_contains() makes checking a file cheap, but a huge
+monorepo still has a lot of files to check on every run. A trigram index
+records which three-byte sequences occur in each file, so the files that
+could contain a string are found with a few database lookups. A file can
+only contain a string if it contains every one of the string's trigrams.
+
+The index is kept in the repository's Git directory (or, outside of Git, in
+our cache directory) and is brought up to date as it's used: files are only
+read again if their size or modification time changed, and only reindexed if
+their content did.
+
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import subprocess
+import threading
+
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+
+from .cache import get_cache_dir
+from .git import get_git_path
+from .scan import is_binary
+from .scan import SAMPLE_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+TRIGRAMS_NAME = "baseplate-upgrader-trigrams.sqlite3"
+
+# bigger files aren't indexed. they're always candidates.
+MAX_INDEXED_SIZE = 4 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    indexed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram BLOB NOT NULL,
+    file INTEGER NOT NULL,
+    PRIMARY KEY (trigram, file)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_file ON postings (file);
+"""
+
+
+def get_trigrams(data: bytes) -> Set[bytes]:
+    return {data[i : i + 3] for i in range(len(data) - 2)}
+
+
+def default_index_path(root: Path) -> Path:
+    try:
+        return get_git_path(root, TRIGRAMS_NAME)
+    except (OSError, subprocess.CalledProcessError):
+        digest = hashlib.sha1(str(root.resolve()).encode("utf8")).hexdigest()
+        return get_cache_dir() / "trigrams" / f"{digest}.sqlite3"
+
+
+class TrigramIndex:
+    """An index of the trigrams in each file of a repository.
+
+    Stages may use this from several threads at once.
+
+    :param path: Where to keep the index.
+    :param root: The root of the repository.
+
+    """
+
+    def __init__(self, path: Path, root: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.root = root
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        # paths known to be up to date in this run
+        self._fresh: Set[str] = set()
+        self._pruned = False
+
+    @classmethod
+    def open(cls, root: Path) -> "TrigramIndex":
+        return cls(default_index_path(root), root)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _relative(self, path: Path) -> str:
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def _read(self, path: Path) -> Tuple[os.stat_result, bytes]:
+        stat = path.stat()
+        if stat.st_size > MAX_INDEXED_SIZE:
+            return stat, b""
+        return stat, path.read_bytes()
+
+    def _refresh(self, paths: Iterable[Path]) -> int:
+        known: Dict[str, Tuple[int, int, int, str]] = {
+            path: (file_id, size, mtime_ns, digest)
+            for file_id, path, size, mtime_ns, digest in self.connection.execute(
+                "SELECT id, path, size, mtime_ns, digest FROM files"
+            )
+        }
+
+        reindexed = 0
+        with self.connection:
+            if not self._pruned:
+                # forget files that were deleted since the last run
+                for relative_path, (file_id, *_) in known.items():
+                    if not (self.root / relative_path).exists():
+                        self._forget(file_id)
+                self._pruned = True
+
+            for path in paths:
+                relative_path = self._relative(path)
+                if relative_path in self._fresh:
+                    continue
+                self._fresh.add(relative_path)
+
+                previous = known.get(relative_path)
+                try:
+                    stat = path.stat()
+                    if previous and previous[1:3] == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    stat, data = self._read(path)
+                except OSError:
+                    if previous:
+                        self._forget(previous[0])
+                    continue
+
+                indexed = stat.st_size <= MAX_INDEXED_SIZE
+                digest = hashlib.sha1(data).hexdigest() if indexed else ""
+                if previous and indexed and previous[3] == digest:
+                    self.connection.execute(
+                        "UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?",
+                        (stat.st_size, stat.st_mtime_ns, previous[0]),
+                    )
+                    continue
+
+                if previous:
+                    self._forget(previous[0])
+                cursor = self.connection.execute(
+                    "INSERT INTO files (path, size, mtime_ns, digest, indexed)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (relative_path, stat.st_size, stat.st_mtime_ns, digest, indexed),
+                )
+                # always set after a successful INSERT
+                assert cursor.lastrowid is not None
+                file_id = cursor.lastrowid
+                # binary files never contain anything, see file_contains()
+                if indexed and not is_binary(data[:SAMPLE_SIZE]):
+                    self.connection.executemany(
+                        "INSERT INTO postings (trigram, file) VALUES (?, ?)",
+                        ((trigram, file_id) for trigram in get_trigrams(data)),
+                    )
+                reindexed += 1
+
+        if reindexed:
+            logger.debug("Indexed %d file(s) for substring searches", reindexed)
+        return reindexed
+
+    def _forget(self, file_id: int) -> None:
+        self.connection.execute("DELETE FROM postings WHERE file = ?", (file_id,))
+        self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def invalidate(self, path: Path) -> None:
+        """Record that a file is about to change, so must be checked again."""
+        with self._lock:
+            self._fresh.discard(self._relative(path))
+
+    def refresh(self, paths: Iterable[Path]) -> int:
+        """Bring the index up to date for these files.
+
+        Each file is only checked once, unless invalidate() is called for it.
+        Returns how many files were (re)indexed.
+
+        """
+        with self._lock:
+            return self._refresh(paths)
+
+    def candidates(self, needle: bytes, paths: Sequence[Path]) -> List[Path]:
+        """Narrow paths down to the files that may contain needle.
+
+        The files returned still need to be checked: they contain all of the
+        needle's trigrams, but not necessarily the needle itself.
+
+        """
+        trigrams = sorted(get_trigrams(needle))
+        if not trigrams:
+            return list(paths)
+
+        with self._lock:
+            self._refresh(paths)
+            query = " INTERSECT ".join(
+                ["SELECT file FROM postings WHERE trigram = ?"] * len(trigrams)
+            )
+            matches = {row[0] for row in self.connection.execute(query, trigrams)}
+            wanted = {
+                path
+                for file_id, path, indexed in self.connection.execute(
+                    "SELECT id, path, indexed FROM files"
+                )
+                if file_id in matches or not indexed
+            }
+
+        return [path for path in paths if self._relative(path) in wanted]
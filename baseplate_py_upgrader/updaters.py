@@ -0,0 +1,125 @@
+import importlib
+import logging
+
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from .cache import install_grammar_cache
+from .context import RunContext
+from .package_repo import PackageRepo
+from .python_version import PythonVersion
+from .requirements import RequirementsFile
+
+
+logger = logging.getLogger(__name__)
+
+
+Updater = Callable[
+    [Path, Optional[PythonVersion], RequirementsFile, PackageRepo, RunContext], int
+]
+
+
+# third-party packages can add updaters for series we don't know about by
+# registering an entry point in this group, named after the series and
+# pointing at its update function.
+ENTRY_POINT_GROUP = "baseplate_py_upgrader.updaters"
+
+
+def no_op_upgrade(
+    root: Path,
+    python_version: Optional[PythonVersion],
+    requirements_file: RequirementsFile,
+    package_repo: PackageRepo,
+    context: RunContext,
+) -> int:
+    # nothing to do here!
+    return 0
+
+
+# modules whose update() function upgrades to a series. these are only
+# imported once we know which series we're targeting since each pulls in its
+# lib2to3 fixers. None means there's nothing to do beyond bumping versions.
+UPDATERS: Dict[str, Optional[str]] = {
+    "0.27": None,
+    "0.28": None,
+    "0.29": "baseplate_py_upgrader.fixes.v0_29",
+    "0.30": None,
+    "1.0": "baseplate_py_upgrader.fixes.v1_0",
+    "1.1": None,
+    "1.2": None,
+    "1.3": "baseplate_py_upgrader.fixes.v1_3",
+    "1.4": None,
+    "1.5": None,
+    "2.0": "baseplate_py_upgrader.fixes.v2_0",
+    "2.1": None,
+    "2.2": None,
+    "2.3": None,
+    "2.4": None,
+    "2.5": None,
+    "2.6": None,
+}
+
+
+def _entry_points() -> List[Any]:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # python 3.7
+        return []
+
+    # python 3.10 added select(). before that this is a dict keyed by group.
+    all_entry_points: Any = entry_points()
+    if hasattr(all_entry_points, "select"):
+        return list(all_entry_points.select(group=ENTRY_POINT_GROUP))
+    return list(all_entry_points.get(ENTRY_POINT_GROUP, []))
+
+
+def get_plugin_series() -> List[str]:
+    """Get the series that other packages registered updaters for."""
+    return [entry_point.name for entry_point in _entry_points()]
+
+
+def _load_entry_point_updater(series: str) -> Updater:
+    for entry_point in _entry_points():
+        if entry_point.name == series:
+            logger.debug("Using updater for %s from %s", series, entry_point.value)
+            updater: Updater = entry_point.load()
+            return updater
+    raise KeyError(f"No updater registered for the {series} series")
+
+
+def get_updater(series: str) -> Updater:
+    """Import and return the update function for a series."""
+    try:
+        module_name = UPDATERS[series]
+    except KeyError:
+        return _load_entry_point_updater(series)
+
+    if module_name is None:
+        return no_op_upgrade
+
+    # lib2to3 loads its grammar as soon as the fixers are imported so the
+    # cache has to be in place first
+    install_grammar_cache()
+    module = importlib.import_module(module_name)
+    updater: Updater = getattr(module, "update")
+    return updater
+
+
+def get_fixer_names() -> Set[str]:
+    """Get the name of every fixer a known series runs, e.g. "sentry"."""
+    install_grammar_cache()
+
+    # this is imported here because lib2to3 isn't needed until we've picked
+    # an updater
+    from lib2to3.refactor import get_all_fix_names
+
+    names: Set[str] = set()
+    for module_name in UPDATERS.values():
+        if module_name is not None:
+            names.update(get_all_fix_names(module_name))
+    return names
@@ -0,0 +1,461 @@
+"""Index which services use which Baseplate.py names.
+
+Scanning a repository records every reference to a Baseplate.py name (see
+symbols.py) in a SQLite database, along with the series that renames or
+removes it, if any. Uses of attributes, keyword arguments, and methods that
+a series' rules rename or warn about are recorded too. Files that can't be
+parsed are recorded so they can be looked at by hand. Nothing in the
+repository is changed.
+
+Rescanning only reads files whose size or modification time changed since
+the last scan, and only looks for references in those whose content did.
+If this tool's rules change, everything is scanned again.
+
+"""
+import argparse
+import ast
+import hashlib
+import importlib
+import sqlite3
+import sys
+
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from .cache import get_cache_dir
+from .colors import Color
+from .colors import print
+from .fixes.common import NameRemovedError
+from .fixes.common import RenamedSymbols
+from .fixes.common.rules import RuleSet
+from .inventory import FileInventory
+from .symbols import find_attribute_uses
+from .symbols import find_keyword_uses
+from .symbols import find_references
+from .updaters import get_updater
+from .updaters import UPDATERS
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    repo TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (repo, path)
+);
+CREATE TABLE IF NOT EXISTS hits (
+    repo TEXT NOT NULL,
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    series TEXT,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS hits_by_symbol ON hits (symbol);
+CREATE INDEX IF NOT EXISTS hits_by_file ON hits (repo, path);
+CREATE TABLE IF NOT EXISTS unparseable (
+    repo TEXT NOT NULL,
+    path TEXT NOT NULL,
+    error TEXT NOT NULL,
+    PRIMARY KEY (repo, path)
+);
+"""
+
+
+def default_database_path() -> Path:
+    return get_cache_dir() / "usage.sqlite3"
+
+
+class Deprecation(NamedTuple):
+    series: str
+    note: str
+
+
+class Hit(NamedTuple):
+    repo: str
+    path: str
+    line: int
+    symbol: str
+    series: Optional[str]
+    note: Optional[str]
+
+
+class ScanStats(NamedTuple):
+    files: int
+    scanned: int
+    removed: int
+    unparseable: List[Tuple[str, str]]
+
+
+class UsageRules:
+    """Every series' rename tables and rules, oldest series first.
+
+    :param renames: (series, renames) pairs.
+    :param rule_sets: (series, rules) pairs. Symbol renames in these are
+        expected to be in renames too.
+
+    """
+
+    def __init__(
+        self,
+        renames: Sequence[Tuple[str, RenamedSymbols]],
+        rule_sets: Sequence[Tuple[str, RuleSet]] = (),
+    ):
+        self.renames = renames
+        # what to look for, by attribute (owner, attribute), keyword
+        # (callee, keyword), and method
+        self.attributes: Dict[Tuple[str, str], List[Deprecation]] = {}
+        self.keywords: Dict[Tuple[str, str], List[Deprecation]] = {}
+        self.warnings: Dict[str, List[Deprecation]] = {}
+        for series, rules in rule_sets:
+            for attribute, attribute_rules in rules.attribute_renames.items():
+                for attribute_rule in attribute_rules:
+                    for owner in attribute_rule.owners:
+                        self.attributes.setdefault((owner, attribute), []).append(
+                            Deprecation(series, f"renamed to {attribute_rule.new}")
+                        )
+            for callee, keyword_rules in rules.keyword_renames.items():
+                for keyword_rule in keyword_rules:
+                    self.keywords.setdefault((callee, keyword_rule.old), []).append(
+                        Deprecation(series, f"keyword renamed to {keyword_rule.new}")
+                    )
+            for method, warnings in rules.warnings.items():
+                self.warnings.setdefault(method, []).extend(
+                    Deprecation(series, warning.message) for warning in warnings
+                )
+        self._deprecations: Dict[str, Optional[Deprecation]] = {}
+
+    @classmethod
+    def load(cls) -> "UsageRules":
+        """Load the rules of every series this tool knows about."""
+        renames = []
+        rule_sets = []
+        for series, module_name in UPDATERS.items():
+            if not module_name:
+                continue
+            get_updater(series)
+            module = importlib.import_module(module_name)
+            module_renames = getattr(module, "RENAMES", None)
+            if isinstance(module_renames, RenamedSymbols):
+                renames.append((series, module_renames))
+            module_rules = getattr(module, "RULES", None)
+            if isinstance(module_rules, RuleSet):
+                rule_sets.append((series, module_rules))
+        return cls(renames, rule_sets)
+
+    @property
+    def fingerprint(self) -> str:
+        """A digest that changes whenever the rules do."""
+        tables = [(series, sorted(r.renames.items())) for series, r in self.renames]
+        rules = [
+            sorted(self.attributes.items()),
+            sorted(self.keywords.items()),
+            sorted(self.warnings.items()),
+        ]
+        return hashlib.sha1(repr((tables, rules)).encode()).hexdigest()
+
+    def deprecation(self, name: str) -> Optional[Deprecation]:
+        """Find the first series that renames or removes a name."""
+        if name not in self._deprecations:
+            deprecation = None
+            for series, renames in self.renames:
+                try:
+                    new_name = renames.get_new_name(name)
+                except NameRemovedError:
+                    deprecation = Deprecation(series, "removed")
+                    break
+                if new_name:
+                    deprecation = Deprecation(series, f"renamed to {new_name}")
+                    break
+            self._deprecations[name] = deprecation
+        return self._deprecations[name]
+
+    def find_hits(self, source: bytes) -> List[Tuple[int, str, Optional[Deprecation]]]:
+        """Find (line, symbol, deprecation) for everything of note in a file.
+
+        Attributes are recorded as owner.attribute and keyword arguments as
+        callee.keyword. Raises SyntaxError (or ValueError, for source with
+        null bytes in it) if the file can't be parsed.
+
+        """
+        tree = ast.parse(source)
+
+        hits = []
+        for reference in find_references(tree):
+            deprecation = self.deprecation(reference.name)
+            hits.append((reference.line, reference.name, deprecation))
+
+        if self.attributes or self.warnings:
+            for use in find_attribute_uses(tree):
+                for deprecation in self.warnings.get(use.attribute, ()):
+                    hits.append((use.line, use.attribute, deprecation))
+                if use.owner:
+                    for deprecation in self.attributes.get(
+                        (use.owner, use.attribute), ()
+                    ):
+                        hits.append(
+                            (use.line, f"{use.owner}.{use.attribute}", deprecation)
+                        )
+
+        if self.keywords:
+            for keyword_use in find_keyword_uses(tree):
+                key = (keyword_use.callee, keyword_use.keyword)
+                for deprecation in self.keywords.get(key, ()):
+                    hits.append((keyword_use.line, ".".join(key), deprecation))
+        return hits
+
+
+def _prefix_range(symbol: str) -> Tuple[str, str]:
+    # every name below symbol sorts between these. "/" follows "."
+    return (symbol + ".", symbol + "/")
+
+
+class UsageIndex:
+    """A database of which repositories use which names, and where."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path))
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _check_rules(self, rules: UsageRules) -> None:
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'rules'"
+        ).fetchone()
+        if row and row[0] == rules.fingerprint:
+            return
+
+        # the rules changed, so what we found before may be wrong now
+        with self.connection:
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("DELETE FROM hits")
+            self.connection.execute("DELETE FROM unparseable")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('rules', ?)",
+                (rules.fingerprint,),
+            )
+
+    def scan(self, root: Path, rules: UsageRules) -> ScanStats:
+        """Bring what's recorded for a repository up to date."""
+        self._check_rules(rules)
+
+        repo = str(root.resolve())
+        known = {
+            path: (size, mtime_ns, digest)
+            for path, size, mtime_ns, digest in self.connection.execute(
+                "SELECT path, size, mtime_ns, digest FROM files WHERE repo = ?",
+                (repo,),
+            )
+        }
+
+        seen = set()
+        scanned = 0
+        with self.connection:
+            for path in FileInventory(root).find("*.py"):
+                relative_path = path.relative_to(root).as_posix()
+                seen.add(relative_path)
+                try:
+                    stat = path.stat()
+                    previous = known.get(relative_path)
+                    if previous and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    source = path.read_bytes()
+                except OSError:
+                    continue
+
+                digest = hashlib.sha1(source).hexdigest()
+                if not previous or previous[2] != digest:
+                    scanned += 1
+                    try:
+                        hits = rules.find_hits(source)
+                    except (SyntaxError, ValueError) as exc:
+                        self._record_hits(repo, relative_path, [], str(exc))
+                    else:
+                        self._record_hits(repo, relative_path, hits)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO files (repo, path, size, mtime_ns, digest)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (repo, relative_path, stat.st_size, stat.st_mtime_ns, digest),
+                )
+
+            removed = set(known) - seen
+            for relative_path in removed:
+                self._record_hits(repo, relative_path, [])
+                self.connection.execute(
+                    "DELETE FROM files WHERE repo = ? AND path = ?",
+                    (repo, relative_path),
+                )
+
+        return ScanStats(
+            files=len(seen),
+            scanned=scanned,
+            removed=len(removed),
+            unparseable=self.unparseable(root),
+        )
+
+    def _record_hits(
+        self,
+        repo: str,
+        path: str,
+        hits: Iterable[Tuple[int, str, Optional[Deprecation]]],
+        error: Optional[str] = None,
+    ) -> None:
+        self.connection.execute(
+            "DELETE FROM hits WHERE repo = ? AND path = ?", (repo, path)
+        )
+        self.connection.execute(
+            "DELETE FROM unparseable WHERE repo = ? AND path = ?", (repo, path)
+        )
+        if error:
+            self.connection.execute(
+                "INSERT INTO unparseable (repo, path, error) VALUES (?, ?, ?)",
+                (repo, path, error),
+            )
+        self.connection.executemany(
+            "INSERT INTO hits (repo, path, line, symbol, series, note)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    repo,
+                    path,
+                    line,
+                    symbol,
+                    deprecation.series if deprecation else None,
+                    deprecation.note if deprecation else None,
+                )
+                for line, symbol, deprecation in hits
+            ],
+        )
+
+    def unparseable(self, root: Path) -> List[Tuple[str, str]]:
+        """List the (path, error) of files in a repository that can't be parsed.
+
+        Nothing in these files is in the index.
+
+        """
+        return list(
+            self.connection.execute(
+                "SELECT path, error FROM unparseable WHERE repo = ? ORDER BY path",
+                (str(root.resolve()),),
+            )
+        )
+
+    def _where(self, symbol: str, deprecated: bool) -> Tuple[str, Tuple[str, ...]]:
+        low, high = _prefix_range(symbol)
+        where = "(symbol = ? OR (symbol > ? AND symbol < ?))"
+        if deprecated:
+            where += " AND series IS NOT NULL"
+        return where, (symbol, low, high)
+
+    def query(self, symbol: str, deprecated: bool = False) -> List[Hit]:
+        """Find uses of a name, or of anything within it."""
+        where, params = self._where(symbol, deprecated)
+        return [
+            Hit(*row)
+            for row in self.connection.execute(
+                f"SELECT repo, path, line, symbol, series, note FROM hits WHERE {where}"
+                " ORDER BY repo, path, line",
+                params,
+            )
+        ]
+
+    def repos(self, symbol: str, deprecated: bool = False) -> List[Tuple[str, int]]:
+        """Find which repositories use a name, and how many times."""
+        where, params = self._where(symbol, deprecated)
+        return list(
+            self.connection.execute(
+                f"SELECT repo, COUNT(*) FROM hits WHERE {where}"
+                " GROUP BY repo ORDER BY repo",
+                params,
+            )
+        )
+
+
+def _scan(index: UsageIndex, args: argparse.Namespace) -> int:
+    rules = UsageRules.load()
+    for root in args.repos:
+        if not root.is_dir():
+            print(f"{root} is not a directory!", color=Color.RED.BOLD)
+            return 1
+        stats = index.scan(root, rules)
+        print(
+            f"{root}: {stats.files} file(s), {stats.scanned} scanned, "
+            f"{stats.removed} removed"
+        )
+        for path, error in stats.unparseable:
+            print(f"Couldn't parse {root / path}: {error}", color=Color.YELLOW)
+    return 0
+
+
+def _query(index: UsageIndex, args: argparse.Namespace) -> int:
+    if args.repos:
+        for repo, count in index.repos(args.symbol, args.deprecated):
+            print(f"{repo} ({count})")
+        return 0
+
+    for hit in index.query(args.symbol, args.deprecated):
+        location = f"{hit.repo}/{hit.path}:{hit.line}"
+        if hit.series:
+            print(f"{location}: {hit.symbol} ({hit.series}: {hit.note})")
+        else:
+            print(f"{location}: {hit.symbol}")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Index which services use which Baseplate.py names."
+    )
+    parser.add_argument(
+        "--database",
+        metavar="PATH",
+        type=Path,
+        default=default_database_path(),
+        help="where to keep the index",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser(
+        "scan", help="add repositories to the index, or bring them up to date"
+    )
+    scan_parser.add_argument("repos", metavar="REPO", nargs="+", type=Path)
+
+    query_parser = subparsers.add_parser(
+        "query", help="find uses of a name, or of anything within it"
+    )
+    query_parser.add_argument("symbol", help="e.g. baseplate.lib.experiments")
+    query_parser.add_argument(
+        "--deprecated",
+        action="store_true",
+        help="only show uses that an upgrade will change or warn about",
+    )
+    query_parser.add_argument(
+        "--repos",
+        action="store_true",
+        help="only show which repositories use it, and how many times",
+    )
+    args = parser.parse_args()
+
+    index = UsageIndex(args.database)
+    try:
+        if args.command == "scan":
+            sys.exit(_scan(index, args))
+        else:
+            sys.exit(_query(index, args))
+    finally:
+        index.close()
@@ -0,0 +1,329 @@
+"""Refactor Python files in supervised worker processes.
+
+lib2to3 can take minutes or gigabytes of memory on pathological input, like
+huge literal tables or deeply nested expressions. Running each file in a
+worker process lets us put a time and memory budget on it: a worker that
+blows its budget is killed (or gives up) and the file is reported as skipped
+instead of hanging the whole run. Any other exception is a bug in a fixer and
+fails the run, just like it would without workers. Workers are also recycled
+after a number of files to bound memory growth.
+
+"""
+import logging
+import multiprocessing
+import time
+import traceback
+
+from multiprocessing.connection import Connection
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from .context import RunContext
+    from .symbols import ImportIndex
+
+
+DEFAULT_MAX_FILES_PER_WORKER = 100
+
+
+class WorkerSettings(NamedTuple):
+    """How to run workers.
+
+    :param jobs: How many worker processes to run at once.
+    :param file_timeout: Seconds a single file may take, or None for no limit.
+    :param file_memory_limit: Bytes of address space each worker process may
+        use, or None for no limit. The limit covers the whole process, not
+        just the file being refactored, so it should leave room for the
+        fixers and for what max_files_per_worker files leave behind. Only
+        enforced on platforms that support RLIMIT_AS.
+    :param max_files_per_worker: Replace each worker after it has processed
+        this many files.
+
+    """
+
+    jobs: int = 1
+    file_timeout: Optional[float] = None
+    file_memory_limit: Optional[int] = None
+    max_files_per_worker: int = DEFAULT_MAX_FILES_PER_WORKER
+
+    @property
+    def supervised(self) -> bool:
+        return (
+            self.jobs > 1
+            or self.file_timeout is not None
+            or self.file_memory_limit is not None
+        )
+
+
+# logger name, level, message, and the LOCATION_FIELDS that were given
+LogEntry = Tuple[str, int, str, Dict[str, Any]]
+
+# extra fields on log records that say what a message is about
+LOCATION_FIELDS = ("path", "line", "fixer")
+
+
+class WorkerError(Exception):
+    """A fixer raised an exception while refactoring a file in a worker."""
+
+
+class FileResult(NamedTuple):
+    path: str
+    changed_files: List[Path]
+    names_seen: Set[str]
+    log_entries: List[LogEntry]
+    # why the file was skipped
+    error: Optional[str] = None
+    # the traceback of an unexpected exception
+    failure: Optional[str] = None
+
+
+class CapturingHandler(logging.Handler):
+    """Keep log records as plain data so they can be replayed elsewhere."""
+
+    def __init__(self, level: int = logging.NOTSET) -> None:
+        super().__init__(level)
+        self.entries: List[LogEntry] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.entries.append(
+            (
+                record.name,
+                record.levelno,
+                record.getMessage(),
+                {
+                    field: getattr(record, field)
+                    for field in LOCATION_FIELDS
+                    if getattr(record, field, None) is not None
+                },
+            )
+        )
+
+
+def _limit_memory(limit: int) -> None:
+    try:
+        import resource
+    except ImportError:  # windows
+        return
+
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(
+    conn: Connection,
+    root: Path,
+    fixers: List[str],
+    import_index: Optional["ImportIndex"],
+    check: bool,
+    memory_limit: Optional[int],
+) -> None:
+    # imported here so that the fixers are loaded in the worker, not shipped
+    from .context import RunContext
+    from .refactor import BaseplateRefactoringTool
+
+    if memory_limit:
+        _limit_memory(memory_limit)
+
+    handler = CapturingHandler()
+    root_logger = logging.getLogger()
+    root_logger.handlers = [handler]
+    root_logger.setLevel(logging.INFO)
+
+    tool = BaseplateRefactoringTool(
+        fixers, RunContext(root, check=check), import_index=import_index
+    )
+
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            return
+        if path is None:
+            return
+
+        context = RunContext(root, check=check)
+        tool.context = context
+        handler.entries = []
+        error = None
+        failure = None
+        try:
+            tool.refactor_file(path, write=not check)
+        except MemoryError:
+            error = "exceeded its memory budget"
+        except Exception:
+            failure = traceback.format_exc()
+
+        conn.send(
+            FileResult(
+                path=path,
+                changed_files=context.changed_files,
+                names_seen=context.names_seen,
+                log_entries=handler.entries,
+                error=error,
+                failure=failure,
+            )
+        )
+
+        if error or failure:
+            # whatever went wrong may have left this process in a bad state
+            return
+
+
+class _Worker:
+    def __init__(
+        self,
+        context: "RunContext",
+        fixers: List[str],
+        import_index: Optional["ImportIndex"],
+        settings: WorkerSettings,
+    ):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                context.root,
+                fixers,
+                import_index,
+                context.check,
+                settings.file_memory_limit,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.files_processed = 0
+        self.current: Optional[str] = None
+        self.started_at = 0.0
+
+    def submit(self, path: str) -> None:
+        self.current = path
+        self.started_at = time.monotonic()
+        self.conn.send(path)
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def replay_logs(entries: List[LogEntry]) -> None:
+    for name, level, message, location in entries:
+        logging.getLogger(name).log(level, "%s", message, extra=location)
+
+
+def refactor_in_workers(
+    context: "RunContext",
+    fixers: List[str],
+    paths: List[str],
+    import_index: Optional["ImportIndex"] = None,
+) -> None:
+    """Refactor files in supervised worker processes.
+
+    Results are merged into the run context in path order so the output
+    doesn't depend on which worker finished first.
+
+    """
+    settings = context.workers
+    pending = list(reversed(paths))
+    results: Dict[str, FileResult] = {}
+    workers: List[_Worker] = []
+    stopping = False
+
+    def finish(worker: _Worker, result: FileResult) -> None:
+        nonlocal stopping
+        if result.failure:
+            raise WorkerError(f"Failed to refactor {result.path}:\n{result.failure}")
+        results[result.path] = result
+        if not result.error:
+            context.finish_file("python", Path(result.path), result.names_seen)
+        worker.current = None
+        worker.files_processed += 1
+        if result.changed_files and context.check and context.fail_fast:
+            stopping = True
+
+    try:
+        while (pending and not stopping) or any(w.current for w in workers):
+            while pending and not stopping and len(workers) < settings.jobs:
+                workers.append(_Worker(context, fixers, import_index, settings))
+
+            for worker in workers:
+                if worker.current is None and pending and not stopping:
+                    path = pending.pop()
+                    # the worker may write the file before we hear back
+                    context.touch(Path(path))
+                    worker.submit(path)
+
+            busy = [w for w in workers if w.current]
+            timeout = None
+            if settings.file_timeout is not None:
+                now = time.monotonic()
+                timeout = max(
+                    0.0,
+                    min(w.started_at + settings.file_timeout - now for w in busy),
+                )
+            ready = wait([w.conn for w in busy], timeout=timeout)
+
+            for worker in busy:
+                assert worker.current
+                path = worker.current
+                replace = False
+                if worker.conn in ready:
+                    try:
+                        result: FileResult = worker.conn.recv()
+                    except EOFError:
+                        result = FileResult(path, [], set(), [], "crashed the worker")
+                    finish(worker, result)
+                    replace = (
+                        result.error is not None
+                        or worker.files_processed >= settings.max_files_per_worker
+                    )
+                    if replace:
+                        worker.stop()
+                elif (
+                    settings.file_timeout is not None
+                    and time.monotonic() - worker.started_at >= settings.file_timeout
+                ):
+                    worker.kill()
+                    finish(
+                        worker,
+                        FileResult(
+                            path,
+                            [],
+                            set(),
+                            [],
+                            f"took longer than {settings.file_timeout:g} seconds",
+                        ),
+                    )
+                    replace = True
+
+                if replace:
+                    workers.remove(worker)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    for path in sorted(results):
+        result = results[path]
+        replay_logs(result.log_entries)
+        context.names_seen.update(result.names_seen)
+        if result.error:
+            context.record_skipped(Path(path), result.error)
+        context.merge_changes(result.changed_files, "Python code")
@@ -0,0 +1,129 @@
+"""Measure the worst-case throughput of every regex-driven parser.
+
+Each parser is run on inputs built to make backtracking regexes slow (a unit
+repeated between a prefix and a suffix) as well as on an ordinary input, and
+the slowest throughput is reported along with the input that caused it. A
+parser that's linear in the size of its input has about the same throughput
+at every size, so the report is given for two sizes.
+
+    python benchmarks/bench_regexes.py [--repeat N] [--size N]
+
+"""
+import argparse
+import time
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from baseplate_py_upgrader import docker
+from baseplate_py_upgrader import package_repo
+from baseplate_py_upgrader import python_version
+from baseplate_py_upgrader import requirements
+from baseplate_py_upgrader.fixes.common import BASEPLATE_NAME_RE
+from baseplate_py_upgrader.fixes.v0_29.thrift import read_tokens
+from baseplate_py_upgrader.fixes.v0_29.thrift import ThriftError
+from baseplate_py_upgrader.fixes.v0_29.thrift import TokenKind
+
+
+Family = Tuple[str, str, str]
+
+
+def tokenize(text: str) -> None:
+    try:
+        for _ in read_tokens(text):
+            pass
+    except ThriftError:
+        pass
+
+
+THRIFT_FAMILIES: List[Family] = [
+    ("", "struct Foo { 1: i32 bar } // x\n", ""),
+    ("/* ", "*", ""),
+    ("/* ", "/", ""),
+    ("/** ", "*", ""),
+    ('"', "\\\\", ""),
+    ("", "1", "x"),
+    ("a", ".a", "."),
+]
+
+PARSERS: Dict[str, Tuple[Callable[[str], object], List[Family]]] = {
+    "BASEPLATE_NAME_RE": (
+        lambda text: BASEPLATE_NAME_RE.sub("x", text),
+        [("", "see baseplate.lib.config ", ""), ("baseplate.", "a.", "!")],
+    ),
+    "package_repo.VERSION_RE": (
+        package_repo.VERSION_RE.match,
+        [("", "1.", "x"), ("1.dev1+", "x", "")],
+    ),
+    "package_repo.REQUIREMENT_RE": (
+        package_repo.REQUIREMENT_RE.match,
+        [("a", "==1,", "x"), ("", "a", "=="), ("a", " ", "x")],
+    ),
+    "package_repo.SPECIFIER_RE": (package_repo.SPECIFIER_RE.match, [(">=", "1.", "x")]),
+    "package_repo.PRE_RELEASE_VERSION": (
+        package_repo.PRE_RELEASE_VERSION.match,
+        [("", "a1", "x"), ("a", "1", "x")],
+    ),
+    "requirements.REQUIREMENT_RE": (
+        requirements.REQUIREMENT_RE.match,
+        [("", " a", "x"), ("a", " ", "==")],
+    ),
+    "docker.IMAGE_RE": (
+        docker.IMAGE_RE.findall,
+        [
+            ("", "FROM x/baseplate-py:1-py3.8-bionic\n", ""),
+            ("/baseplate-py:", "1.", ""),
+        ],
+    ),
+    "python_version.PYTHON_REQUIRES_RE": (
+        python_version.PYTHON_REQUIRES_RE.findall,
+        [("", "python_requires='>=", ""), ("", "python_requires='>=3.7',\n", "")],
+    ),
+    "read_tokens": (tokenize, THRIFT_FAMILIES),
+    **{
+        f"TokenKind.{kind.name}": (kind.value.match, THRIFT_FAMILIES)
+        for kind in TokenKind
+    },
+}
+
+
+def throughput(
+    function: Callable[[str], object], family: Family, size: int, repeat: int
+) -> float:
+    prefix, unit, suffix = family
+    text = prefix + unit * max(size // len(unit), 1) + suffix
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return len(text) / max(best, 1e-9) / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size", type=int, default=10000, help="characters")
+    args = parser.parse_args()
+
+    sizes = (args.size, args.size * 10)
+    print(f"worst-case throughput in MB/s, best of {args.repeat}")
+    print(f"{'parser':36} {sizes[0]:>10} {sizes[1]:>10}  worst input")
+    for name, (function, families) in PARSERS.items():
+        worst = [
+            min(
+                (throughput(function, family, size, args.repeat), family)
+                for family in families
+            )
+            for size in sizes
+        ]
+        prefix, unit, suffix = worst[-1][1]
+        print(
+            f"{name:36} {worst[0][0]:10.1f} {worst[1][0]:10.1f}  {prefix!r} + {unit!r} * n + {suffix!r}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Measure how long the upgrader takes to start up.
+
+Each measurement runs in a fresh interpreter so that nothing is shared
+through module state. The "cold" run starts from an empty cache directory
+and the "warm" runs reuse what it left behind. The "first output" timing is
+how long the CLI takes to report on a directory that isn't a Git
+repository, compared to an interpreter that does nothing at all.
+
+    python benchmarks/bench_startup.py [--repeat N]
+
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Dict
+from typing import List
+
+
+SERIES = ("v0_29", "v1_0", "v1_3", "v2_0")
+
+STARTUP_SCRIPT = f"""
+import time
+start = time.perf_counter()
+
+from lib2to3.refactor import get_fixers_from_package
+from pathlib import Path
+
+from baseplate_py_upgrader.cache import PATTERN_CACHE
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.refactor import BaseplateRefactoringTool
+
+imported = time.perf_counter()
+for series in {SERIES!r}:
+    fixers = get_fixers_from_package(f"baseplate_py_upgrader.fixes.{{series}}")
+    BaseplateRefactoringTool(fixers, RunContext(Path(".")))
+ready = time.perf_counter()
+PATTERN_CACHE.save()
+
+print(imported - start, ready - imported)
+"""
+
+
+def run_once(env: Dict[str, str]) -> List[float]:
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", STARTUP_SCRIPT],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return [float(v) for v in output.split()]
+
+
+FIRST_OUTPUT_SCRIPT = """
+import sys
+from baseplate_py_upgrader import main
+sys.argv = ["baseplate.py-upgrader", sys.argv[1]]
+main()
+"""
+
+
+def time_process(args: List[str], env: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(args, env=env, capture_output=True)
+    return time.perf_counter() - start
+
+
+def report(label: str, timings: List[List[float]]) -> None:
+    imported = min(t[0] for t in timings)
+    ready = min(t[1] for t in timings)
+    print(
+        f"{label:6} import {imported * 1000:7.1f}ms  fixers {ready * 1000:7.1f}ms  total {(imported + ready) * 1000:7.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, BASEPLATE_PY_UPGRADER_CACHE_DIR=cache_dir)
+        report("cold", [run_once(env)])
+        report("warm", [run_once(env) for _ in range(args.repeat)])
+
+        interpreter = min(
+            time_process([sys.executable, "-c", "pass"], env)
+            for _ in range(args.repeat)
+        )
+        first_output = min(
+            time_process(
+                [sys.executable, "-W", "ignore", "-c", FIRST_OUTPUT_SCRIPT, cache_dir],
+                env,
+            )
+            for _ in range(args.repeat)
+        )
+        print(
+            f"first output {first_output * 1000:7.1f}ms  (bare interpreter {interpreter * 1000:.1f}ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
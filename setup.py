@@ -5,6 +5,10 @@ setup(
     packages=find_packages(),
     python_requires=">=3.7.0",
     entry_points={
-        "console_scripts": ["baseplate.py-upgrader=baseplate_py_upgrader:main"]
+        "console_scripts": [
+            "baseplate.py-upgrader=baseplate_py_upgrader:main",
+            "baseplate.py-upgrader-daemon=baseplate_py_upgrader.daemon:main",
+            "baseplate.py-upgrader-index=baseplate_py_upgrader.usage:main",
+        ]
     },
 )
@@ -1,3 +1,6 @@
+import os
+import subprocess
+import sys
 import textwrap
 
 from lib2to3.fixer_util import Leaf
@@ -6,7 +9,24 @@ from lib2to3.refactor import RefactoringTool
 
 import pytest
 
+from baseplate_py_upgrader import _main
+from baseplate_py_upgrader import cache
 from baseplate_py_upgrader.fixes import LN
+from baseplate_py_upgrader.package_repo import PackageRepo
+
+
+@pytest.fixture(autouse=True, scope="session")
+def cache_dir(tmp_path_factory):
+    """Keep the tests (and anything they start) out of the real cache."""
+    path = tmp_path_factory.mktemp("cache")
+    previous = os.environ.get("BASEPLATE_PY_UPGRADER_CACHE_DIR")
+    os.environ["BASEPLATE_PY_UPGRADER_CACHE_DIR"] = str(path)
+    cache.PATTERN_CACHE.path = cache.get_cache_dir() / "patterns.pickle"
+    yield path
+    if previous is None:
+        del os.environ["BASEPLATE_PY_UPGRADER_CACHE_DIR"]
+    else:
+        os.environ["BASEPLATE_PY_UPGRADER_CACHE_DIR"] = previous
 
 
 def reformat(text):
@@ -32,8 +52,8 @@ def print_node_tree(node: LN, indent=0) -> None:
 
 
 class TestRefactoringTool:
-    def __init__(self, fixer):
-        self.refactoring_tool = RefactoringTool([fixer], {}, explicit=True)
+    def __init__(self, fixer, options=None):
+        self.refactoring_tool = RefactoringTool([fixer], options or {}, explicit=True)
 
     def refactor(self, before):
         print("INPUT: ", before)
@@ -53,3 +73,73 @@ class TestRefactoringTool:
 @pytest.fixture
 def make_refactorer():
     return TestRefactoringTool
+
+
+@pytest.fixture
+def service_files():
+    """The files in the service fixture. Test modules override this."""
+    return {
+        "requirements.txt": "baseplate==1.5.0\npython-json-logger==2.0.1\n",
+        "setup.py": "setup(python_requires='>=3.8')\n",
+        "app.py": (
+            "from baseplate.lib.experiments import experiments_client_from_config\n"
+        ),
+        "example.ini": "[app:main]\nmetrics.namespace = foo\n",
+    }
+
+
+@pytest.fixture
+def service(tmp_path, service_files):
+    """A service to upgrade, committed to a fresh Git repository."""
+    root = tmp_path / "service"
+    root.mkdir()
+    for name, content in service_files.items():
+        (root / name).write_text(content)
+
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["git", "add", "."], cwd=root, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        + ["commit", "-q", "-m", "initial"],
+        cwd=root,
+        check=True,
+    )
+    return root
+
+
+@pytest.fixture
+def pypi(monkeypatch):
+    """Look packages up in a fixed index instead of PyPI."""
+    versions = {
+        "baseplate": ["1.5.0", "2.0.0", "2.0.5"],
+        "reddit-experiments": ["1.0.0", "1.0.3"],
+    }
+    monkeypatch.setattr(
+        PackageRepo, "get_available_versions", lambda self, name: versions[name]
+    )
+    return versions
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """Run the command line tool with some arguments."""
+
+    def run(*args):
+        monkeypatch.setattr(sys, "argv", ["baseplate.py-upgrader", *map(str, args)])
+        return _main()
+
+    return run
+
+
+def _snapshot(root):
+    return {
+        path.relative_to(root): path.read_bytes()
+        for path in root.rglob("*")
+        if path.is_file() and ".git" not in path.parts
+    }
+
+
+@pytest.fixture
+def snapshot():
+    """Read every file in a tree, except for Git's."""
+    return _snapshot
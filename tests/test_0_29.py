@@ -1,5 +1,12 @@
 import pytest
 
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.fixes.v0_29 import add_max_concurrency
+from baseplate_py_upgrader.fixes.v0_29 import fix_thrift_compiler_references
+from baseplate_py_upgrader.fixes.v0_29.thrift import read_tokens
+from baseplate_py_upgrader.fixes.v0_29.thrift import ThriftError
+from baseplate_py_upgrader.fixes.v0_29.thrift import TokenKind
+
 
 @pytest.mark.parametrize(
     "before,expected",
@@ -51,3 +58,60 @@ def test_thrift_entrypoint(make_refactorer, before, expected):
         "baseplate_py_upgrader.fixes.v0_29.fix_thrift_entrypoint"
     )
     refactorer.refactor_and_check(before, expected)
+
+
+def test_add_max_concurrency(tmp_path):
+    (tmp_path / "a.ini").write_text(
+        "[server:main]\nfactory = baseplate.server.thrift\n\n[server:other]\nfactory = baseplate.server.wsgi\nmax_concurrency = 5\n"
+    )
+    # no servers of its own: nothing from a.ini should be applied here
+    (tmp_path / "b.ini").write_text("# comment\n[app:main]\nfactory = foo\nbar = baz\n")
+
+    add_max_concurrency(RunContext(tmp_path))
+
+    assert (tmp_path / "a.ini").read_text() == (
+        "[server:main]\nfactory = baseplate.server.thrift\nmax_concurrency = 100\n\n[server:other]\nfactory = baseplate.server.wsgi\nmax_concurrency = 5\n"
+    )
+    assert (
+        tmp_path / "b.ini"
+    ).read_text() == "# comment\n[app:main]\nfactory = foo\nbar = baz\n"
+
+
+def test_fix_thrift_compiler_references(tmp_path):
+    (tmp_path / "Makefile").write_text("thrift:\n\tthrift1 --gen py foo.thrift\n")
+    (tmp_path / "notes.txt").write_text("thrift1 is gone\n")
+    (tmp_path / "image.yml").write_bytes(b"\0thrift1")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "Makefile").write_text("thrift1\n")
+
+    fix_thrift_compiler_references(RunContext(tmp_path))
+
+    makefile = (tmp_path / "Makefile").read_text()
+    assert makefile == "thrift:\n\tthrift --gen py foo.thrift\n"
+    assert (tmp_path / "notes.txt").read_text() == "thrift1 is gone\n"
+    assert (tmp_path / "image.yml").read_bytes() == b"\0thrift1"
+    assert (tmp_path / "build" / "Makefile").read_text() == "thrift1\n"
+
+
+def test_read_tokens():
+    text = (
+        "/** docs */\n"
+        "/* a comment\n   over two lines **/\n"
+        "struct Foo { 1: float bar = 1.5, 2: string s = 'x' } // done\n"
+    )
+
+    tokens = [(t.kind, t.value, t.line) for t in read_tokens(text)]
+
+    assert tokens[:3] == [
+        (TokenKind.DOC_COMMENT, "/** docs */", 1),
+        (TokenKind.MULTILINE_COMMENT, "/* a comment\n   over two lines **/", 3),
+        (TokenKind.IDENTIFIER, "struct", 4),
+    ]
+    assert (TokenKind.FLOAT_CONSTANT, "1.5", 4) in tokens
+    assert (TokenKind.STRING_LITERAL, "'x'", 4) in tokens
+    assert tokens[-1] == (TokenKind.COMMENT, "// done", 4)
+
+
+def test_read_tokens_unterminated_comment():
+    with pytest.raises(ThriftError):
+        list(read_tokens("struct Foo {}\n/* oops **\n"))
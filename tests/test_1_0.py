@@ -1,5 +1,7 @@
 import pytest
 
+from baseplate_py_upgrader.symbols import ImportIndex
+
 
 @pytest.mark.parametrize(
     "before,expected",
@@ -128,6 +130,54 @@ def test_fix_module_usage(make_refactorer, before, expected):
     refactorer.refactor_and_check(before, expected)
 
 
+@pytest.mark.parametrize(
+    "aliases,before,expected",
+    (
+        ({"cfg": "baseplate.config"}, "cfg.String()", "cfg.String()"),
+        ({"cfg": "baseplate.config"}, "cfg", "cfg"),
+        ({"core": "baseplate.core"}, "core.Baseplate()", "core.Baseplate()"),
+        (
+            {"lib": "baseplate.context"},
+            "lib.memcache.MonitoredMemcacheConnection",
+            "lib.memcache.MonitoredMemcacheConnection",
+        ),
+        (
+            {"core": "baseplate.core"},
+            "core.AuthenticationToken(token)",
+            "import baseplate.lib.edge_context\n"
+            "baseplate.lib.edge_context.AuthenticationToken(token)",
+        ),
+        (
+            {"crypto": "baseplate.crypto"},
+            "crypto.constant_time_compare(a, b)",
+            "import hmac\nhmac.compare_digest(a, b)",
+        ),
+        (
+            {"metrics": "baseplate.metrics"},
+            "other.metrics.Timer",
+            "other.metrics.Timer",
+        ),
+    ),
+)
+def test_fix_module_usage_aliases(make_refactorer, aliases, before, expected):
+    import_index = ImportIndex({"<string>": aliases})
+    refactorer = make_refactorer(
+        "baseplate_py_upgrader.fixes.v1_0.fix_module_usage",
+        {"import_index": import_index},
+    )
+    refactorer.refactor_and_check(before, expected)
+
+
+def test_fix_module_usage_removed_alias(caplog, make_refactorer):
+    import_index = ImportIndex({"<string>": {"queue": "baseplate.events.queue"}})
+    refactorer = make_refactorer(
+        "baseplate_py_upgrader.fixes.v1_0.fix_module_usage",
+        {"import_index": import_index},
+    )
+    refactorer.refactor_and_check("queue.Event()", "queue.Event()")
+    assert "baseplate.events.queue.Event" in caplog.text
+
+
 @pytest.mark.parametrize(
     "before,expected",
     (
@@ -164,6 +214,14 @@ def test_fix_strings(make_refactorer, before, expected):
     refactorer.refactor_and_check(before, expected)
 
 
+def test_fix_strings_many_references(make_refactorer):
+    refactorer = make_refactorer("baseplate_py_upgrader.fixes.v1_0.fix_strings")
+    refactorer.refactor_and_check(
+        repr("\n".join(["baseplate.config.String"] * 10)),
+        repr("\n".join(["baseplate.lib.config.String"] * 10)),
+    )
+
+
 @pytest.mark.parametrize(
     "input",
     (
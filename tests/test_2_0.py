@@ -1,5 +1,9 @@
 import pytest
 
+from baseplate_py_upgrader.config_rules import update_config_files
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.fixes.v2_0 import CONFIG_RULES
+
 
 @pytest.mark.parametrize(
     "before,expected",
@@ -16,9 +20,7 @@ import pytest
     ),
 )
 def test_fix_context_attributes(make_refactorer, before, expected):
-    refactorer = make_refactorer(
-        "baseplate_py_upgrader.fixes.v2_0.fix_context_attributes"
-    )
+    refactorer = make_refactorer("baseplate_py_upgrader.fixes.v2_0.fix_rules")
     refactorer.refactor_and_check(before, expected)
 
 
@@ -68,10 +70,13 @@ def test_fix_deprecated_wireup(caplog, make_refactorer, input, expected_logs):
         ("baseplate.configure_metrics(client)", ["WARNING"]),
         ("baseplate.configure_tracing(client)", ["WARNING"]),
         ("baseplate.configure_error_reporting(error_reporter)", ["WARNING"]),
+        ("self.baseplate.configure_metrics(client)", ["WARNING"]),
+        ("configure_metrics(client)", []),
+        ("baseplate.configure_metrics", []),
     ),
 )
 def test_fix_observer_wireup(caplog, make_refactorer, input, expected_logs):
-    refactorer = make_refactorer("baseplate_py_upgrader.fixes.v2_0.fix_observer_wireup")
+    refactorer = make_refactorer("baseplate_py_upgrader.fixes.v2_0.fix_rules")
     result = refactorer.refactor(input)
     assert result, "parse failed"
 
@@ -176,10 +181,20 @@ def test_fix_trust_trace_headers(make_refactorer, before, expected):
             "thrift_pool_from_config(app_config, prefix='foo.', max_retries=3)",
             "thrift_pool_from_config(app_config, prefix='foo.', max_connection_attempts=3)",
         ),
+        ("ThriftClient(max_retries=3)", "ThriftClient(max_connection_attempts=3)"),
+        (
+            "clients.ThriftClient(MyService.Client, max_retries=3)",
+            "clients.ThriftClient(MyService.Client, max_connection_attempts=3)",
+        ),
+        ("Other('a', max_retries=3)", "Other('a', max_retries=3)"),
+        (
+            "context.trace.child(ThriftClient(max_retries=3))",
+            "context.span.child(ThriftClient(max_connection_attempts=3))",
+        ),
     ),
 )
 def test_fix_thrift_pool(make_refactorer, before, expected):
-    refactorer = make_refactorer("baseplate_py_upgrader.fixes.v2_0.fix_thrift_pool")
+    refactorer = make_refactorer("baseplate_py_upgrader.fixes.v2_0.fix_rules")
     refactorer.refactor_and_check(before, expected)
 
 
@@ -273,3 +288,52 @@ def test_fix_sentry(caplog, make_refactorer, before, expected, expected_logs):
             ), "no warning emitted"
     else:
         assert not caplog.records, "unexpected warning emitted"
+
+
+def test_update_config_file(tmp_path):
+    path = tmp_path / "example.ini"
+    path.write_text(
+        """\
+; keep me
+[DEFAULT]
+use = egg:baseplate
+
+[app:main]
+# and me
+server_timeout.default = 1 second
+sentry.site = foo
+sentry.ignore_exceptions =
+    a.B
+    c.D
+foo.max_retries = 3
+foo.endpoint = localhost:9090
+
+[pshell]
+setup = foo
+
+[server:main]
+factory = baseplate.server.thrift
+max_concurrency = 100
+"""
+    )
+
+    update_config_files(RunContext(tmp_path), CONFIG_RULES, "configuration")
+
+    assert path.read_text() == (
+        """\
+; keep me
+[DEFAULT]
+
+[app:main]
+# and me
+server_timeout.default = 1 second
+sentry.ignore_errors =
+    a.B
+    c.D
+foo.max_connection_attempts = 3
+foo.endpoint = localhost:9090
+
+[server:main]
+factory = baseplate.server.thrift
+"""
+    )
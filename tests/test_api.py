@@ -0,0 +1,170 @@
+import logging
+import sys
+
+import pytest
+
+from baseplate_py_upgrader import upgrade
+from baseplate_py_upgrader import UpgradeCancelled
+from baseplate_py_upgrader import UpgradeError
+from baseplate_py_upgrader import UpgradeOptions
+from baseplate_py_upgrader.package_repo import PackageRepo
+from baseplate_py_upgrader.requirements import RequirementChange
+
+
+VERSIONS = {
+    "baseplate": ["1.5.0", "2.0.0", "2.0.5"],
+    "reddit-experiments": ["1.0.0", "1.0.3"],
+}
+
+
+class FakePackageRepo(PackageRepo):
+    def __init__(self, versions=VERSIONS):
+        super().__init__()
+        self.versions = versions
+
+    def get_available_versions(self, name):
+        return self.versions[name]
+
+
+def test_upgrade_reports_progress_and_results(service):
+    starts = []
+    files = []
+    stages = []
+    warnings = []
+    requirement_changes = []
+
+    result = upgrade(
+        service,
+        UpgradeOptions(
+            package_repo=FakePackageRepo(),
+            on_start=starts.append,
+            on_file_processed=lambda stage, path: files.append((stage, path.name)),
+            on_stage_done=stages.append,
+            on_warning=warnings.append,
+            on_requirement_change=requirement_changes.append,
+        ),
+    )
+
+    assert result.status == 0
+    assert result.current_version == "1.5.0"
+    assert result.target_version == "2.0.5"
+    assert [start.target_version for start in starts] == ["2.0.5"]
+    assert not starts[0].resuming
+
+    assert ("config", "example.ini") in files
+    assert "config" in stages
+    assert any(
+        warning.path and warning.path.endswith("example.ini") for warning in warnings
+    )
+    # warnings that went to on_warning aren't kept too
+    assert result.warnings == []
+
+    assert RequirementChange("baseplate", "1.5.0", "2.0.5") in (
+        result.requirement_changes
+    )
+    assert RequirementChange("reddit-experiments", None, "1.0.3") in (
+        result.requirement_changes
+    )
+    assert set(result.requirement_changes) <= set(requirement_changes)
+    assert "baseplate==2.0.5" in (service / "requirements.txt").read_text()
+
+
+def test_upgrade_check_mode(service):
+    before = (service / "app.py").read_text()
+
+    result = upgrade(service, UpgradeOptions(check=True))
+
+    assert result.status == 1
+    assert [path.name for path in result.changed_files] == [
+        "app.py",
+        "requirements.txt",
+    ]
+    assert (service / "app.py").read_text() == before
+
+
+def test_upgrade_check_fail_fast(service):
+    result = upgrade(service, UpgradeOptions(check=True, fail_fast=True))
+
+    assert result.status == 1
+    assert result.change_required is not None
+
+
+def test_upgrade_errors_are_raised(tmp_path):
+    (tmp_path / "requirements.txt").write_text("requests==2.0.0\n")
+
+    with pytest.raises(UpgradeError):
+        upgrade(tmp_path, UpgradeOptions(check=True))
+
+
+def test_prerelease_needs_confirmation(service):
+    package_repo = FakePackageRepo({**VERSIONS, "baseplate": ["1.5.0", "2.0.6rc1"]})
+
+    with pytest.raises(UpgradeCancelled):
+        upgrade(service, UpgradeOptions(package_repo=package_repo))
+
+    asked = []
+    result = upgrade(
+        service,
+        UpgradeOptions(
+            package_repo=package_repo,
+            confirm_prerelease=lambda version: asked.append(version) or True,
+        ),
+    )
+    assert asked == ["2.0.6rc1"]
+    assert result.target_version == "2.0.6rc1"
+
+
+def test_upgrade_cleans_up_logging(service):
+    handlers = list(logging.getLogger().handlers)
+
+    upgrade(service, UpgradeOptions(check=True))
+
+    assert logging.getLogger().handlers == handlers
+
+
+def test_upgrade_select_fixers_and_stages(service):
+    (service / "app.py").write_text(
+        "from baseplate.lib.experiments import experiments_client_from_config\n"
+        "baseplate.configure_observers(metrics_client, 'foo')\n"
+    )
+
+    result = upgrade(service, UpgradeOptions(check=True, select=["deprecated_wireup"]))
+
+    # the wireup fixer only warns, and nothing else ran
+    assert result.status == 0
+    assert not result.changed_files
+    assert result.requirement_changes == []
+    assert [w.fixer for w in result.warnings if w.fixer] == ["deprecated_wireup"]
+
+
+def test_upgrade_ignore_requirements(service):
+    result = upgrade(
+        service,
+        UpgradeOptions(package_repo=FakePackageRepo(), ignore=["requirements"]),
+    )
+
+    assert result.status == 0
+    assert result.target_version is None
+    assert result.requirement_changes == []
+    assert "reddit_experiments" in (service / "app.py").read_text()
+    assert (service / "requirements.txt").read_text() == (
+        "baseplate==1.5.0\npython-json-logger==2.0.1\n"
+    )
+
+
+def test_upgrade_only_imports_its_series(monkeypatch, service):
+    other_series = tuple(
+        f"baseplate_py_upgrader.fixes.{series}" for series in ("v0_29", "v1_0", "v1_3")
+    )
+    for name in list(sys.modules):
+        if name.startswith(other_series):
+            monkeypatch.delitem(sys.modules, name)
+
+    upgrade(service, UpgradeOptions(check=True, package_repo=FakePackageRepo()))
+
+    assert not [name for name in sys.modules if name.startswith(other_series)]
+
+
+def test_upgrade_unknown_selection(service):
+    with pytest.raises(UpgradeError, match="Unknown stage or fixer: sentri"):
+        upgrade(service, UpgradeOptions(check=True, select=["sentri"]))
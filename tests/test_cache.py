@@ -0,0 +1,80 @@
+from lib2to3.pgen2 import driver
+from lib2to3.pgen2 import pgen
+from pathlib import Path
+
+from baseplate_py_upgrader import cache
+from baseplate_py_upgrader import fixes
+from baseplate_py_upgrader.cache import PatternCache
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.fixes.v1_0.fix_import_from import FixImportFrom as FixV1
+from baseplate_py_upgrader.fixes.v2_0.fix_import_from import FixImportFrom as FixV2
+from baseplate_py_upgrader.refactor import BaseplateRefactoringTool
+
+
+def test_identical_patterns_are_shared():
+    v1 = FixV1({}, [])
+    v2 = FixV2({}, [])
+
+    assert v1.pattern is v2.pattern
+
+
+def test_pattern_cache_round_trip(tmp_path):
+    path = tmp_path / "patterns.pickle"
+    pattern = "power< 'CQLMapperContextFactory' any* >"
+
+    cache = PatternCache(path)
+    compiled, tree = cache.get(pattern)
+    cache.save()
+    assert path.exists()
+
+    reloaded = PatternCache(path)
+    reloaded_compiled, reloaded_tree = reloaded.get(pattern)
+    assert str(reloaded_tree) == str(tree)
+    assert reloaded_compiled.type == compiled.type
+
+
+def test_unreadable_pattern_cache_is_ignored(tmp_path):
+    path = tmp_path / "patterns.pickle"
+    path.write_bytes(b"garbage")
+
+    cache = PatternCache(path)
+    assert cache.get("STRING")
+
+
+def test_refactoring_tool_does_not_save(monkeypatch, tmp_path):
+    path = tmp_path / "patterns.pickle"
+    monkeypatch.setattr(cache, "PATTERN_CACHE", PatternCache(path))
+    monkeypatch.setattr(fixes, "PATTERN_CACHE", cache.PATTERN_CACHE)
+
+    BaseplateRefactoringTool(
+        ["baseplate_py_upgrader.fixes.v1_0.fix_cass_execution_profiles"],
+        RunContext(tmp_path),
+    )
+    assert not path.exists()
+
+    cache.PATTERN_CACHE.save()
+    assert path.exists()
+
+
+def test_grammar_cache_for_unwritable_lib2to3(monkeypatch, tmp_path):
+    lib_dir = tmp_path / "lib2to3"
+    lib_dir.mkdir()
+    grammar_path = lib_dir / "Grammar.txt"
+    grammar_path.write_text(
+        (Path(driver.__file__).parent.parent / "Grammar.txt").read_text()
+    )
+    lib_dir.chmod(0o555)
+    monkeypatch.setenv("BASEPLATE_PY_UPGRADER_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(driver, "load_grammar", driver.load_grammar)
+
+    cache.install_grammar_cache()
+    grammar = driver.load_grammar(str(grammar_path))
+    lib_dir.chmod(0o755)
+
+    assert [path.name for path in lib_dir.iterdir()] == ["Grammar.txt"]
+    assert len(list((tmp_path / "cache").glob("Grammar*.pickle"))) == 1
+
+    # the next start loads the tables from the cache instead of generating them
+    monkeypatch.setattr(pgen, "generate_grammar", None)
+    reloaded = driver.load_grammar(str(grammar_path))
+    assert reloaded.symbol2number == grammar.symbol2number
@@ -0,0 +1,95 @@
+import subprocess
+import textwrap
+
+import pytest
+
+
+@pytest.fixture
+def service_files(service_files):
+    return {
+        **service_files,
+        "clean.py": "import io\n",
+        "example.ini": textwrap.dedent(
+            """\
+            [app:main]
+            server_timeout.default = 1 second
+            """
+        ),
+    }
+
+
+def would_update(caplog):
+    return [
+        record.args[1].name
+        for record in caplog.records
+        if record.msg.startswith("Would update")
+    ]
+
+
+def test_check_reports_without_writing(caplog, service, run, snapshot):
+    before = snapshot(service)
+
+    assert run(service, "--check") == 1
+
+    assert snapshot(service) == before
+    assert would_update(caplog) == ["app.py", "requirements.txt"]
+
+
+def test_check_fail_fast(caplog, service, run):
+    assert run(service, "--check", "--fail-fast") == 1
+    assert would_update(caplog) == ["app.py"]
+
+
+def test_check_only_files_in_diff(caplog, tmp_path, service, run):
+    diff = tmp_path / "pr.diff"
+    diff.write_text(
+        textwrap.dedent(
+            """\
+            diff --git a/clean.py b/clean.py
+            --- a/clean.py
+            +++ b/clean.py
+            @@ -0,0 +1 @@
+            +import io
+            """
+        )
+    )
+
+    assert run(service, "--check", "--diff", diff) == 0
+    assert would_update(caplog) == []
+
+
+def commit(root, message):
+    subprocess.run(["git", "add", "."], cwd=root, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        + ["commit", "-q", "-m", message],
+        cwd=root,
+        check=True,
+    )
+
+
+def test_check_only_files_changed_since(caplog, service, run):
+    (service / "app.py").write_text("import io\n")
+    (service / "Dockerfile").write_text("FROM x/baseplate-py:1-py3.8-bionic\n")
+    commit(service, "initial")
+    (service / "clean.py").write_text(
+        "from baseplate.lib.experiments import experiments_client_from_config\n"
+    )
+    commit(service, "use experiments")
+
+    assert run(service, "--check", "--since", "HEAD~1") == 1
+    assert would_update(caplog) == ["clean.py", "requirements.txt", "Dockerfile"]
+
+    # requirements and docker images are checked even if nothing changed
+    caplog.clear()
+    assert run(service, "--check", "--since", "HEAD") == 1
+    assert would_update(caplog) == ["requirements.txt", "Dockerfile"]
+
+
+def test_names_outside_changed_files_count_for_requirements(caplog, service, run):
+    (service / "clean.py").write_text("import io\nimport os\n")
+    commit(service, "unrelated change")
+
+    assert run(service, "--check", "--since", "HEAD~1") == 1
+    # app.py isn't refactored, but it still needs reddit-experiments
+    assert would_update(caplog) == ["requirements.txt"]
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+from baseplate_py_upgrader.config_rules import ConfigRules
+from baseplate_py_upgrader.config_rules import RemoveOption
+from baseplate_py_upgrader.config_rules import RenameOption
+from baseplate_py_upgrader.config_rules import RequireOption
+from baseplate_py_upgrader.config_rules import WarnOnOption
+from baseplate_py_upgrader.config_rules import When
+from baseplate_py_upgrader.ini import IniDocument
+
+
+RULES = ConfigRules(
+    [
+        RequireOption("app:", "timeout", "[{section}] in {path}: no timeout"),
+        RemoveOption("app:", "use", when=When("use", ("egg:baseplate",))),
+        RenameOption("app:", "*.retries", "*.attempts", when=When("*.endpoint")),
+        WarnOnOption("server:", "workers", "[{section}] has workers"),
+    ]
+)
+
+
+def test_rules(caplog):
+    document = IniDocument.parse(
+        """\
+[DEFAULT]
+use = egg:Baseplate
+a.retries = 1
+
+[app:main]
+a.endpoint = foo
+b.retries = 2
+c.retries = 3
+c.endpoint = bar
+
+[app:other]
+use = egg:other
+timeout = 1
+
+[server:main]
+workers = 2
+
+[other:main]
+use = egg:baseplate
+"""
+    )
+
+    RULES.apply(document, Path("example.ini"))
+
+    assert str(document) == (
+        """\
+[DEFAULT]
+a.attempts = 1
+
+[app:main]
+a.endpoint = foo
+b.retries = 2
+c.attempts = 3
+c.endpoint = bar
+
+[app:other]
+use = egg:other
+timeout = 1
+
+[server:main]
+workers = 2
+
+[other:main]
+use = egg:baseplate
+"""
+    )
+    assert [record.getMessage() for record in caplog.records] == [
+        "[app:main] in example.ini: no timeout",
+        "[server:main] has workers",
+    ]
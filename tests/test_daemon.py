@@ -0,0 +1,82 @@
+import tempfile
+import threading
+
+from pathlib import Path
+
+import pytest
+
+from baseplate_py_upgrader.daemon import DaemonServer
+from baseplate_py_upgrader.daemon import Job
+from baseplate_py_upgrader.daemon import submit
+from baseplate_py_upgrader.daemon import UpgradeDaemon
+
+
+@pytest.fixture
+def service_files(service_files):
+    files = dict(service_files)
+    files["requirements.txt"] = "baseplate==1.5.0\n"
+    del files["setup.py"]
+    return files
+
+
+@pytest.fixture(scope="module")
+def socket_path():
+    # unix socket paths are short, so stay out of pytest's deep temp dirs
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "daemon.sock"
+        daemon = UpgradeDaemon(processes=1)
+        server = DaemonServer(path, daemon)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield path
+        finally:
+            server.shutdown()
+            server.server_close()
+            daemon.close()
+
+
+def test_submit_streams_events(service, socket_path):
+    events = list(submit(Job(root=str(service), check=True), socket_path))
+
+    kinds = [event["event"] for event in events]
+    assert kinds[0] == "start"
+    assert kinds[-1] == "result"
+    assert {
+        "event": "file",
+        "stage": "config",
+        "path": str(service / "example.ini"),
+    } in events
+    assert any(
+        event["event"] == "warning" and event["path"] == str(service / "example.ini")
+        for event in events
+    )
+
+    result = events[-1]
+    assert result["status"] == 1
+    assert result["changed_files"] == [
+        str(service / "app.py"),
+        str(service / "requirements.txt"),
+    ]
+
+
+def test_workers_stay_warm_between_jobs(service, socket_path):
+    for _ in range(2):
+        events = list(submit(Job(root=str(service), check=True), socket_path))
+        assert events[-1]["event"] == "result"
+
+
+def test_errors_end_the_stream(tmp_path, socket_path):
+    (tmp_path / "requirements.txt").write_text("requests==2.0.0\n")
+
+    events = list(submit(Job(root=str(tmp_path), check=True), socket_path))
+
+    assert events == [
+        {"event": "error", "message": "That project doesn't seem to use Baseplate.py!"}
+    ]
+
+
+def test_invalid_jobs_are_rejected(socket_path):
+    events = list(submit(Job(root="/nonexistent")._replace(check="yes"), socket_path))
+
+    assert events[-1]["event"] == "error"
@@ -1,6 +1,12 @@
+from pathlib import Path
+
 import pytest
 
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.docker import ImageReferences
 from baseplate_py_upgrader.docker import replace_docker_image_references
+from baseplate_py_upgrader.docker import upgrade_docker_image_references
+from baseplate_py_upgrader.python_version import guess_python_version
 
 
 @pytest.mark.parametrize(
@@ -36,3 +42,97 @@ from baseplate_py_upgrader.docker import replace_docker_image_references
 def test_replace_docker_image_references(target, input, expected):
     output = replace_docker_image_references(target, input)
     assert output == expected
+
+
+def test_every_reference_is_replaced():
+    content = "".join(
+        f"image{i}: example.com/baseplate-py:1-py3.8-bionic\r\n" for i in range(12)
+    )
+    expected = content.replace("1-py3.8-bionic", "2-py3.8-buster-dev")
+    assert replace_docker_image_references("2.0", content) == expected
+
+
+def test_upgrade_docker_image_references(tmp_path):
+    (tmp_path / "Dockerfile").write_text(
+        "FROM example.com/baseplate-py:1-py3.7-bionic\n"
+    )
+    (tmp_path / "docker-compose.yml").write_text(
+        "services:\n  app:\n    image: example.com/baseplate-py:1-py3.7-bionic-dev\n"
+    )
+    (tmp_path / "k8s").mkdir()
+    (tmp_path / "k8s" / "job.yaml").write_text(
+        "image: example.com/baseplate-py:1-py3.7-bionic\n"
+    )
+    (tmp_path / "notes.md").write_text("baseplate-py:1-py3.7-bionic\n")
+
+    images = ImageReferences()
+    assert guess_python_version(tmp_path, images) == (3, 7)
+    upgrade_docker_image_references("2.0", RunContext(tmp_path), images)
+
+    assert (tmp_path / "Dockerfile").read_text() == (
+        "FROM example.com/baseplate-py:2-py3.7-buster-dev\n"
+    )
+    assert (
+        "baseplate-py:2-py3.7-buster-dev"
+        in (tmp_path / "docker-compose.yml").read_text()
+    )
+    assert (tmp_path / "k8s" / "job.yaml").read_text() == (
+        "image: example.com/baseplate-py:2-py3.7-buster-dev\n"
+    )
+    assert (tmp_path / "notes.md").read_text() == "baseplate-py:1-py3.7-bionic\n"
+
+
+def test_upgraded_files_are_left_alone(tmp_path):
+    (tmp_path / "Dockerfile").write_text(
+        "FROM example.com/baseplate-py:2-py3.7-buster-dev\n"
+    )
+    context = RunContext(tmp_path)
+
+    upgrade_docker_image_references("2.0", context, ImageReferences())
+
+    assert context.changed_files == []
+
+
+def test_guessed_files_are_read_once(monkeypatch, tmp_path):
+    dockerfile = tmp_path / "Dockerfile"
+    dockerfile.write_text("FROM example.com/baseplate-py:1-py3.7-bionic\n")
+    opened = []
+    original_open = Path.open
+
+    def open_(path, *args, **kwargs):
+        opened.append(path.name)
+        return original_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "open", open_)
+    images = ImageReferences()
+    guess_python_version(tmp_path, images)
+    opened.clear()
+
+    upgrade_docker_image_references("2.0", RunContext(tmp_path, check=True), images)
+
+    assert opened == []
+
+
+def test_changed_files_are_read_again(tmp_path):
+    dockerfile = tmp_path / "Dockerfile"
+    dockerfile.write_text("FROM example.com/baseplate-py:1-py3.7-bionic\n")
+    images = ImageReferences()
+    assert images.in_file(dockerfile)
+
+    dockerfile.write_text("FROM example.com/baseplate-py:1-py3.8-bionic\nRUN true\n")
+    upgrade_docker_image_references("2.0", RunContext(tmp_path), images)
+
+    assert dockerfile.read_text() == (
+        "FROM example.com/baseplate-py:2-py3.8-buster-dev\nRUN true\n"
+    )
+
+
+def test_files_that_are_not_utf8_are_skipped(tmp_path):
+    manifest = tmp_path / "deploy.yaml"
+    manifest.write_bytes(b"# \xff\nimage: example.com/baseplate-py:1-py3.7-bionic\n")
+    context = RunContext(tmp_path)
+
+    upgrade_docker_image_references("2.0", context, ImageReferences())
+
+    assert context.skipped_files == [(manifest, "isn't valid UTF-8")]
+    assert context.changed_files == []
@@ -0,0 +1,77 @@
+import configparser
+
+import pytest
+
+from baseplate_py_upgrader.ini import IniDocument
+
+
+@pytest.mark.parametrize(
+    "text",
+    (
+        "",
+        "no sections\n",
+        "[app:main]",
+        "; comment\n\n[DEFAULT]\nfoo = bar\n\n[app:main]\nuse = egg:baseplate\n",
+        "[app:main]\r\nfoo: bar\r\nmulti =\r\n    a\r\n\r\n    b\r\n# comment\r\n",
+        "[app:main]\n  indented = option\nnot an option\n= no name\n[broken\n",
+    ),
+)
+def test_round_trip(text):
+    assert str(IniDocument.parse(text)) == text
+
+
+def test_lookups():
+    document = IniDocument.parse(
+        "[DEFAULT]\nShared = a\n\n[app:main]\nfoo = bar\nmulti =\n  a\n\n  b\n"
+    )
+    section = document.section("app:main")
+
+    assert "FOO" in section
+    assert section.get("multi") == "a\n\nb"
+    assert "shared" not in section
+    assert document.get(section, "shared") == "a"
+    assert document.options(section) == ["foo", "multi", "shared"]
+    assert document.section("APP:MAIN") is None
+
+
+@pytest.mark.parametrize(
+    "text",
+    (
+        "[s]\na = 1\n\n# comment\n\n  indented comment\n",
+        "[s]\na = 1\n  # comment\n  b\nc = 2\n",
+        "[s]\na = 1\n; comment\nb = 2\n  not a continuation of a\n",
+        "[s]\n  a = 1\n  b = 2\n    c\n",
+    ),
+)
+def test_values_match_configparser(text):
+    parser = configparser.RawConfigParser()
+    parser.read_string(text)
+    document = IniDocument.parse(text)
+    section = document.section("s")
+
+    assert str(document) == text
+    assert document.options(section) == parser.options("s")
+    for name in parser.options("s"):
+        assert section.get(name) == parser.get("s", name)
+
+
+def test_edits():
+    document = IniDocument.parse(
+        "[pshell]\nfoo = bar\n\n"
+        "[server:main]\r\nfactory = baseplate.server.thrift\r\nstop_timeout = 10\r\n\r\n"
+        "[app:main]\nfoo.max_retries = 3 ; not a comment\nlong =\n  a\n  b"
+    )
+    assert document.remove_section("pshell")
+    document.section("server:main").set("max_concurrency", "100", after="factory")
+    app = document.section("app:main")
+    assert app.rename("foo.max_retries", "foo.max_connection_attempts")
+    assert not app.rename("missing", "other")
+    app.set("long", "c")
+    app.set("new", "option")
+
+    assert str(document) == (
+        "[server:main]\r\nfactory = baseplate.server.thrift\r\nmax_concurrency = 100\r\n"
+        "stop_timeout = 10\r\n\r\n"
+        "[app:main]\nfoo.max_connection_attempts = 3 ; not a comment\nlong = c\n"
+        "new = option\n"
+    )
@@ -0,0 +1,94 @@
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.fixes.v2_0 import check_for_old_docker_builder
+from baseplate_py_upgrader.inventory import FileInventory
+
+
+THRIFT_HEADER = """\
+#
+# Autogenerated by Thrift Compiler (0.13.0)
+#
+# DO NOT EDIT UNLESS YOU ARE SURE THAT YOU KNOW WHAT YOU ARE DOING
+#
+"""
+
+
+def make_tree(root, files):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def relative_names(root, paths):
+    return [path.relative_to(root).as_posix() for path in paths]
+
+
+def test_generated_and_vendored_code_is_skipped(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            "app/__init__.py": "import baseplate\n",
+            "app/gen.py": THRIFT_HEADER + "x = 1\n",
+            "myservice/__init__.py": "",
+            "myservice/ttypes.py": THRIFT_HEADER,
+            "myservice/MyService.py": "class Client: pass\n",
+            "gen-py/foo.py": "x = 1\n",
+            "node_modules/left-pad/index.js": "module.exports = 1\n",
+            "env/pyvenv.cfg": "home = /usr/bin\n",
+            "env/lib/thing.py": "x = 1\n",
+            ".git/HEAD": "ref: refs/heads/main\n",
+            "README.md": "hello\n",
+        },
+    )
+
+    inventory = FileInventory(tmp_path)
+
+    assert relative_names(tmp_path, inventory.files()) == [
+        "README.md",
+        "app/__init__.py",
+    ]
+    # myservice, gen-py, node_modules and env are pruned without being walked
+    assert inventory.skipped_directories == 4
+    assert inventory.skipped_files == 1
+    assert inventory.skipped_bytes == len(THRIFT_HEADER + "x = 1\n")
+
+
+def test_excludes(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            "app/__init__.py": "",
+            "docs/index.rst": "",
+            "migrations/0001.py": "",
+            "app/migrations/0002.py": "",
+        },
+    )
+
+    inventory = FileInventory(tmp_path, exclude=["docs", "*migrations/*"])
+
+    assert relative_names(tmp_path, inventory.files()) == ["app/__init__.py"]
+    assert inventory.excludes(tmp_path / "docs")
+    assert not inventory.excludes(tmp_path / "app/__init__.py")
+
+
+def test_excluded_drone_config_is_not_checked(tmp_path, caplog):
+    (tmp_path / ".drone.yml").write_text("image: drone-plugin-docker\n")
+
+    context = RunContext(tmp_path, check=True, exclude=[".drone.yml"])
+    check_for_old_docker_builder(tmp_path, context)
+    assert not caplog.records
+
+    check_for_old_docker_builder(tmp_path, RunContext(tmp_path, check=True))
+    assert "drone-plugin-docker" in caplog.text
+
+
+def test_scope_and_find(tmp_path):
+    make_tree(tmp_path, {"a.py": "", "b.py": "", "c.ini": "", "sub/Dockerfile": ""})
+
+    inventory = FileInventory(tmp_path, scope={"a.py", "c.ini", "sub/Dockerfile"})
+
+    assert relative_names(tmp_path, inventory.find("*.py")) == ["a.py"]
+    assert relative_names(tmp_path, inventory.find("*.ini", "Dockerfile*")) == [
+        "c.ini",
+        "sub/Dockerfile",
+    ]
@@ -0,0 +1,140 @@
+import shutil
+
+from pathlib import Path
+
+import pytest
+
+from baseplate_py_upgrader.config_rules import ConfigRules
+from baseplate_py_upgrader.config_rules import update_config_files
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.ini import IniDocument
+from baseplate_py_upgrader.journal import Journal
+from baseplate_py_upgrader.refactor import BaseplateRefactoringTool
+
+
+JOURNAL = Path(".git/baseplate-py-upgrader.journal")
+
+
+class Interrupted(BaseException):
+    pass
+
+
+@pytest.fixture
+def service_files(service_files):
+    files = dict(service_files)
+    files["a.py"] = files.pop("app.py")
+    # files that don't mention baseplate aren't refactored at all
+    for name in "bcde":
+        files[f"{name}.py"] = "import baseplate\n"
+    return files
+
+
+@pytest.fixture
+def refactored_files(monkeypatch):
+    files = []
+    refactor_file = BaseplateRefactoringTool.refactor_file
+
+    def counting_refactor_file(self, filename, *args, **kwargs):
+        if interrupt_after[0] is not None and len(files) >= interrupt_after[0]:
+            raise Interrupted
+        files.append(Path(filename).name)
+        return refactor_file(self, filename, *args, **kwargs)
+
+    interrupt_after = [None]
+    monkeypatch.setattr(
+        BaseplateRefactoringTool, "refactor_file", counting_refactor_file
+    )
+    return files, interrupt_after
+
+
+def test_journal_removed_after_run(pypi, service, run):
+    assert run(service) == 0
+    assert not (service / JOURNAL).exists()
+
+
+def test_resume_skips_finished_files(
+    pypi, tmp_path, service, refactored_files, run, snapshot
+):
+    files, interrupt_after = refactored_files
+    full = tmp_path / "full"
+    shutil.copytree(service, full)
+    assert run(full) == 0
+    files.clear()
+
+    interrupt_after[0] = 3
+    with pytest.raises(Interrupted):
+        run(service)
+    assert files == ["a.py", "b.py", "c.py"]
+    assert (service / JOURNAL).exists()
+
+    # the half-finished tree doesn't count as uncommitted changes
+    files.clear()
+    interrupt_after[0] = None
+    assert run(service, "--resume") == 0
+
+    assert files == ["d.py", "e.py"]
+    assert snapshot(service) == snapshot(full)
+    assert not (service / JOURNAL).exists()
+
+
+def test_resume_skips_finished_files_in_other_stages(monkeypatch, tmp_path):
+    for name in ("a.ini", "b.ini"):
+        (tmp_path / name).write_text("[app:main]\n")
+    path = tmp_path / "journal"
+    journal = Journal.start(path, tmp_path, "abc123", "2.0.5")
+    journal.finish_file("config", tmp_path / "a.ini", [])
+    journal.close()
+
+    read = []
+    original_read = IniDocument.read
+
+    def counting_read(path):
+        read.append(path.name)
+        return original_read(path)
+
+    monkeypatch.setattr(IniDocument, "read", counting_read)
+    context = RunContext(tmp_path)
+    context.use_journal(Journal.resume(path, tmp_path))
+    update_config_files(context, ConfigRules([]), "config")
+    context.journal.close()
+
+    assert read == ["b.ini"]
+
+
+def test_resume_refuses_unexpected_changes(pypi, service, refactored_files, run):
+    _, interrupt_after = refactored_files
+    interrupt_after[0] = 1
+    with pytest.raises(Interrupted):
+        run(service)
+
+    (service / "e.py").write_text("import os\n")
+
+    assert run(service, "--resume") == 1
+    assert (service / JOURNAL).exists()
+
+
+def test_resume_without_journal(pypi, service, run):
+    assert run(service, "--resume") == 1
+
+
+def test_truncated_journal(tmp_path):
+    path = tmp_path / "journal"
+    journal = Journal.start(path, tmp_path, "abc123", "2.0.5")
+    journal.finish_file("python", tmp_path / "a.py", ["baseplate"])
+    journal.finish_stage("config")
+    journal.close()
+    with path.open("a") as f:
+        f.write('{"event": "file", "stage": "py')
+
+    resumed = Journal.resume(path, tmp_path)
+    resumed.finish_stage("text")
+    resumed.close()
+    resumed_again = Journal.resume(path, tmp_path)
+    resumed_again.close()
+    assert resumed_again.is_done("text")
+
+    assert resumed.head == "abc123"
+    assert resumed.is_done("python", tmp_path / "a.py")
+    assert not resumed.is_done("python", tmp_path / "b.py")
+    assert resumed.is_done("config")
+    assert resumed.names_seen == {"baseplate"}
@@ -0,0 +1,40 @@
+import logging
+import threading
+
+from pathlib import Path
+
+import pytest
+
+from baseplate_py_upgrader.parallel import map_files
+
+
+def test_results_and_logs_in_order(caplog):
+    paths = [Path(name) for name in "abcd"]
+    first_started = threading.Event()
+
+    def work(path):
+        if path.name == "a":
+            # make sure later files finish first
+            first_started.wait(timeout=5)
+        else:
+            first_started.set()
+        logging.warning("working on %s", path)
+        return path.name.upper()
+
+    assert map_files(work, paths, max_threads=4) == ["A", "B", "C", "D"]
+    assert [record.getMessage() for record in caplog.records] == [
+        "working on a",
+        "working on b",
+        "working on c",
+        "working on d",
+    ]
+
+
+def test_exceptions_propagate():
+    def work(path):
+        if path.name == "b":
+            raise ValueError(path)
+        return path
+
+    with pytest.raises(ValueError):
+        map_files(work, [Path(name) for name in "abcd"], max_threads=2)
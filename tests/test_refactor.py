@@ -0,0 +1,78 @@
+from pathlib import Path
+
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.refactor import BaseplateRefactoringTool
+from baseplate_py_upgrader.refactor import refactor_python_files
+
+
+def test_names_seen_merged_into_run_context():
+    context = RunContext(Path("."))
+    tool = BaseplateRefactoringTool(
+        ["baseplate_py_upgrader.fixes.v2_0.fix_import_from"], context
+    )
+
+    tool.refactor_string("from baseplate.lib.experiments import foo\n", "a.py")
+    tool.refactor_string("import io\n", "b.py")
+
+    assert "baseplate.lib.experiments" in context.names_seen
+    assert "baseplate.lib.experiments.foo" in context.names_seen
+    assert "baseplate.lib.edge_context" not in context.names_seen
+
+
+def test_per_file_state_does_not_leak():
+    context = RunContext(Path("."))
+    tool = BaseplateRefactoringTool(
+        ["baseplate_py_upgrader.fixes.v2_0.fix_trust_trace_headers"], context
+    )
+
+    tool.refactor_string(
+        "bc = BaseplateConfigurator(baseplate, trust_trace_headers=True)\n", "a.py"
+    )
+    result = tool.refactor_string("import io\n", "b.py")
+
+    assert str(result) == "import io\n"
+
+
+def test_refactor_follows_aliases(tmp_path):
+    (tmp_path / "app.py").write_text(
+        "from baseplate import core\n"
+        "from baseplate.core import Baseplate\n"
+        "token = core.AuthenticationToken()\n"
+    )
+    context = RunContext(tmp_path)
+
+    refactor_python_files(tmp_path, "baseplate_py_upgrader.fixes.v1_0", context)
+
+    assert (tmp_path / "app.py").read_text() == (
+        "import baseplate as core\n"
+        "from baseplate import Baseplate\n"
+        "import baseplate.lib.edge_context\n"
+        "token = baseplate.lib.edge_context.AuthenticationToken()\n"
+    )
+
+
+def test_refactor_skips_rebound_aliases(tmp_path):
+    (tmp_path / "app.py").write_text(
+        "from baseplate import crypto\n"
+        "def check(crypto, a, b):\n"
+        "    return crypto.constant_time_compare(a, b)\n"
+    )
+    context = RunContext(tmp_path)
+
+    refactor_python_files(tmp_path, "baseplate_py_upgrader.fixes.v1_0", context)
+
+    assert (tmp_path / "app.py").read_text() == (
+        "from baseplate.lib import crypto\n"
+        "def check(crypto, a, b):\n"
+        "    return crypto.constant_time_compare(a, b)\n"
+    )
+
+
+def test_module_usage_uses_bottom_matcher():
+    tool = BaseplateRefactoringTool(
+        ["baseplate_py_upgrader.fixes.v1_0.fix_module_usage"], RunContext(Path("."))
+    )
+
+    assert [fixer.fixer_name() for fixer in tool.BM.fixers] == ["module_usage"]
+    assert not any(tool.bmi_pre_order_heads.values())
+    assert not any(tool.bmi_post_order_heads.values())
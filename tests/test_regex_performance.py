@@ -0,0 +1,180 @@
+"""Check that regex-driven parsers take linear time on adversarial input.
+
+Each case builds inputs by repeating a unit between a prefix and a suffix,
+the shape that makes backtracking regexes blow up, and times the parser at
+two sizes. Linear parsers take about factor times as long on the bigger
+input. Quadratic ones take about factor squared times as long.
+
+Fixed cases cover inputs known to be hard for each pattern. Seeded random
+cases cover the rest of each pattern's alphabet. Since they compare wall
+clock times, which a busy machine can skew, they're marked slow and only run
+with "pytest -m slow".
+
+"""
+import random
+import re
+import time
+
+import pytest
+
+from baseplate_py_upgrader import docker
+from baseplate_py_upgrader import package_repo
+from baseplate_py_upgrader import python_version
+from baseplate_py_upgrader import requirements
+from baseplate_py_upgrader.fixes.common import BASEPLATE_NAME_RE
+from baseplate_py_upgrader.fixes.v0_29.thrift import read_tokens
+from baseplate_py_upgrader.fixes.v0_29.thrift import ThriftError
+from baseplate_py_upgrader.fixes.v0_29.thrift import TokenKind
+
+
+SMALL = 1000
+FACTOR = 8
+# leaves plenty of room for noise while still catching quadratic growth
+MAX_GROWTH = FACTOR * 3
+
+
+def best_time(function, text, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def growth(function, prefix, unit, suffix):
+    small = best_time(function, prefix + unit * SMALL + suffix)
+    big = best_time(function, prefix + unit * SMALL * FACTOR + suffix)
+    # very fast runs are mostly timer noise
+    return big / max(small, 1e-4)
+
+
+def assert_linear(parser, prefix, unit, suffix=""):
+    __tracebackhide__ = True
+
+    # one slow run could just be the machine being busy, two are unlikely
+    function = PARSERS[parser]
+    if growth(function, prefix, unit, suffix) > MAX_GROWTH:
+        assert (
+            growth(function, prefix, unit, suffix) <= MAX_GROWTH
+        ), f"{parser} is superlinear on {prefix!r} + {unit!r} * n + {suffix!r}"
+
+
+def tokenize(text):
+    try:
+        for _ in read_tokens(text):
+            pass
+    except ThriftError:
+        pass
+
+
+PARSERS = {
+    "BASEPLATE_NAME_RE": lambda text: BASEPLATE_NAME_RE.sub("x", text),
+    "package_repo.VERSION_RE": package_repo.VERSION_RE.match,
+    "package_repo.REQUIREMENT_RE": package_repo.REQUIREMENT_RE.match,
+    "package_repo.SPECIFIER_RE": package_repo.SPECIFIER_RE.match,
+    "package_repo.PRE_RELEASE_VERSION": package_repo.PRE_RELEASE_VERSION.match,
+    "requirements.REQUIREMENT_RE": requirements.REQUIREMENT_RE.match,
+    "docker.IMAGE_RE": docker.IMAGE_RE.findall,
+    "python_version.PYTHON_REQUIRES_RE": python_version.PYTHON_REQUIRES_RE.findall,
+    "read_tokens": tokenize,
+    **{f"TokenKind.{kind.name}": kind.value.match for kind in TokenKind},
+}
+
+
+@pytest.mark.parametrize(
+    "parser,prefix,unit,suffix",
+    (
+        ("BASEPLATE_NAME_RE", "baseplate.", "a.", "!"),
+        ("BASEPLATE_NAME_RE", "baseplate.", "a", ".."),
+        ("BASEPLATE_NAME_RE", "", "baseplate.a ", ""),
+        ("package_repo.VERSION_RE", "", "1.", "x"),
+        ("package_repo.VERSION_RE", "1.dev1+", "x", ""),
+        ("package_repo.REQUIREMENT_RE", "a", "==1,", "x"),
+        ("package_repo.REQUIREMENT_RE", "a", "<1", "x"),
+        ("package_repo.REQUIREMENT_RE", "", "a", "=="),
+        ("package_repo.REQUIREMENT_RE", "a", " ", "x"),
+        ("package_repo.SPECIFIER_RE", ">=", "1.", "x"),
+        ("package_repo.PRE_RELEASE_VERSION", "", "a1", "x"),
+        ("package_repo.PRE_RELEASE_VERSION", "a", "1", "x"),
+        ("requirements.REQUIREMENT_RE", "", " a", "x"),
+        ("docker.IMAGE_RE", "/baseplate-py:", "1.", ""),
+        ("docker.IMAGE_RE", "", "/baseplate-py:1-py3.8-", ""),
+        ("python_version.PYTHON_REQUIRES_RE", "", "python_requires='>=", ""),
+        ("TokenKind.MULTILINE_COMMENT", "/* ", "*", ""),
+        ("TokenKind.MULTILINE_COMMENT", "/* ", "/", ""),
+        ("TokenKind.MULTILINE_COMMENT", "/* ", "**/", ""),
+        ("TokenKind.DOC_COMMENT", "/** ", "*", ""),
+        ("TokenKind.DOC_COMMENT", "/** ", "a/", ""),
+        ("TokenKind.STRING_LITERAL", '"', "\\\\", ""),
+        ("TokenKind.STRING_LITERAL", "'", "a", ""),
+        ("TokenKind.FLOAT_CONSTANT", "", "1", "x"),
+        ("TokenKind.IDENTIFIER", "a", ".a", "."),
+        ("read_tokens", "", "foo ", ""),
+        ("read_tokens", "", "/* a */\n", ""),
+        ("read_tokens", "/* ", "*", ""),
+    ),
+)
+@pytest.mark.slow
+def test_adversarial_input(parser, prefix, unit, suffix):
+    assert_linear(parser, prefix, unit, suffix)
+
+
+ALPHABETS = {
+    "BASEPLATE_NAME_RE": "baseplate._1 !",
+    "package_repo.VERSION_RE": "1.dev+ab",
+    "package_repo.REQUIREMENT_RE": "a1._- =<>,b",
+    "package_repo.SPECIFIER_RE": "=<>1.ab",
+    "package_repo.PRE_RELEASE_VERSION": "1.abrc",
+    "requirements.REQUIREMENT_RE": "a1.+_- =",
+    "docker.IMAGE_RE": "/baseplate-py:1.3-bionicusterartifactorydev",
+    "python_version.PYTHON_REQUIRES_RE": "python_requires='\">=~3.",
+    "read_tokens": "/*#a1.e+-x\"'\\\n ",
+    **{f"TokenKind.{kind.name}": "/*#a1.e+-x\"'\\\n " for kind in TokenKind},
+}
+
+
+def random_cases(count=8, seed=0):
+    rng = random.Random(seed)
+    for parser, alphabet in sorted(ALPHABETS.items()):
+        for _ in range(count):
+            prefix = "".join(rng.choices(alphabet, k=rng.randint(0, 4)))
+            unit = "".join(rng.choices(alphabet, k=rng.randint(1, 3)))
+            suffix = "".join(rng.choices(alphabet, k=rng.randint(0, 2)))
+            yield parser, prefix, unit, suffix
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("parser,prefix,unit,suffix", list(random_cases()))
+def test_random_input(parser, prefix, unit, suffix):
+    assert_linear(parser, prefix, unit, suffix)
+
+
+def reference_comment(text, doc):
+    # a comment runs from its opener to the first "*/" after it
+    opener = "/**" if doc else "/*"
+    if not text.startswith(opener):
+        return None
+    if not doc and text[2:3] == "*" and text[3:4] != "/":
+        return None  # that's a doc comment
+    end = text.find("*/", len(opener))
+    return text[: end + 2] if end != -1 else None
+
+
+@pytest.mark.parametrize("kind", (TokenKind.MULTILINE_COMMENT, TokenKind.DOC_COMMENT))
+def test_comment_patterns_match_reference(kind):
+    rng = random.Random(1)
+    doc = kind is TokenKind.DOC_COMMENT
+    for _ in range(5000):
+        text = "/*" + "".join(rng.choices("/*a\n", k=rng.randint(0, 10)))
+        m = kind.value.match(text)
+        assert (m.group(0) if m else None) == reference_comment(text, doc), text
+
+
+def test_baseplate_name_re_unchanged():
+    # the pattern this replaced, which could parse a name in many ways
+    previous = re.compile(r"(?P<name>baseplate\.(?:[A-Za-z_][A-Za-z0-9_]*\.?)+)")
+    rng = random.Random(2)
+    for _ in range(5000):
+        text = "".join(rng.choices(["baseplate", ".", "a", "_", "1", " "], k=8))
+        assert previous.findall(text) == BASEPLATE_NAME_RE.findall(text), text
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def service_files(service_files):
+    files = dict(service_files)
+    files["requirements.txt"] = "baseplate==1.5.0\n"
+    del files["setup.py"]
+    files["app.py"] += (
+        "def configure(baseplate):\n"
+        "    baseplate.configure_metrics(metrics_client)\n"
+    )
+    return files
+
+
+def read_events(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_jsonl_log(tmp_path, service, run):
+    log_path = tmp_path / "run.jsonl"
+
+    assert (
+        run(
+            service,
+            "--check",
+            "--log-format",
+            "jsonl",
+            "--log-file",
+            log_path,
+        )
+        == 1
+    )
+
+    events = read_events(log_path)
+    assert events[0]["event"] == "start"
+    assert events[0]["target_series"] == "2.0"
+    assert events[-1]["event"] == "finish"
+    assert events[-1]["status"] == 1
+    assert events[-1]["changed_files"] == 2
+
+    assert {"event": "file", "stage": "python", "path": str(service / "app.py")} in [
+        {key: event.get(key) for key in ("event", "stage", "path")} for event in events
+    ]
+
+    stages = {event["stage"]: event for event in events if event["event"] == "stage"}
+    assert stages["python"]["files"] == 1
+    assert stages["config"]["files"] == 1
+    assert stages["config"]["duration"] >= 0
+
+    fixer_warnings = [
+        event
+        for event in events
+        if event["event"] == "warning" and event["fixer"] is not None
+    ]
+    assert [(w["fixer"], w["path"], w["line"]) for w in fixer_warnings] == [
+        ("rules", str(service / "app.py"), 3)
+    ]
+
+
+def test_jsonl_log_requirement_changes(pypi, tmp_path, service, run):
+    pypi["python-json-logger"] = ["2.0.1"]
+    log_path = tmp_path / "run.jsonl"
+
+    assert run(service, "--log-format", "jsonl", "--log-file", log_path) == 0
+
+    events = read_events(log_path)
+    changes = [
+        (event["distribution"], event["old_version"], event["new_version"])
+        for event in events
+        if event["event"] == "requirement"
+    ]
+    assert ("reddit-experiments", None, "1.0.3") in changes
+    assert changes[-1] == ("baseplate", "1.5.0", "2.0.5")
+    assert events[-1]["requirement_changes"] == len(changes)
+
+
+def test_jsonl_log_records_errors(tmp_path, run):
+    (tmp_path / "requirements.txt").write_text("requests==2.0.0\n")
+    log_path = tmp_path / "run.jsonl"
+
+    assert (
+        run(
+            tmp_path,
+            "--check",
+            "--log-format",
+            "jsonl",
+            "--log-file",
+            log_path,
+        )
+        == 1
+    )
+
+    [event] = read_events(log_path)
+    assert event["event"] == "error"
+    assert event["message"] == "That project doesn't seem to use Baseplate.py!"
+
+
+def test_text_log(tmp_path, service, run):
+    log_path = tmp_path / "run.log"
+
+    run(service, "--check", "--log-file", log_path)
+
+    assert f"WARNING Would update Python code in {service / 'app.py'}" in (
+        log_path.read_text().splitlines()
+    )
@@ -0,0 +1,20 @@
+from baseplate_py_upgrader.scan import file_contains
+from baseplate_py_upgrader.scan import SAMPLE_SIZE
+
+
+def test_file_contains(tmp_path):
+    short = tmp_path / "short"
+    short.write_bytes(b"run thrift1 here\n")
+    long = tmp_path / "long"
+    long.write_bytes(b"x" * SAMPLE_SIZE * 3 + b"thrift1\n")
+    binary = tmp_path / "binary"
+    binary.write_bytes(b"\0\1\2thrift1")
+    empty = tmp_path / "empty"
+    empty.write_bytes(b"")
+
+    assert file_contains(short, b"thrift1")
+    assert file_contains(long, b"thrift1")
+    assert not file_contains(long, b"thrift2")
+    assert not file_contains(binary, b"thrift1")
+    assert not file_contains(empty, b"thrift1")
+    assert not file_contains(tmp_path / "missing", b"thrift1")
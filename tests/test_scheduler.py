@@ -0,0 +1,128 @@
+import logging
+import threading
+
+from pathlib import Path
+
+import pytest
+
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.scheduler import critical_path
+from baseplate_py_upgrader.scheduler import plan
+from baseplate_py_upgrader.scheduler import run_steps
+from baseplate_py_upgrader.scheduler import Step
+from baseplate_py_upgrader.scheduler import StepTiming
+
+
+def noop():
+    pass
+
+
+def test_plan_orders_conflicting_steps():
+    steps = [
+        Step("refactor", noop, reads=["*.py"], writes=["*.py", "names_seen"]),
+        Step("requirements", noop, writes=["requirements.txt"]),
+        Step("names", noop, reads=["names_seen"], writes=["requirements.txt"]),
+        Step("config", noop, writes=["*.ini"]),
+        Step("text", noop, writes=["*.txt", "*.md"]),
+        Step("everything", noop, writes=["*"]),
+        Step("docker", noop, writes=["Dockerfile*"], after=["config"]),
+    ]
+
+    assert plan(steps) == {
+        "refactor": set(),
+        "requirements": set(),
+        "names": {"refactor", "requirements"},
+        "config": set(),
+        "text": {"requirements", "names"},
+        "everything": {"refactor", "requirements", "names", "config", "text"},
+        "docker": {"config", "everything"},
+    }
+
+
+def test_plan_rejects_bad_steps():
+    with pytest.raises(ValueError):
+        plan([Step("a", noop), Step("a", noop)])
+
+    with pytest.raises(ValueError):
+        plan([Step("a", noop, after=["b"]), Step("b", noop)])
+
+
+def test_independent_steps_run_concurrently():
+    both_started = threading.Barrier(2, timeout=5)
+
+    def step():
+        both_started.wait()
+
+    context = RunContext(Path("."))
+    run_steps(
+        context,
+        [Step("a", step, writes=["*.ini"]), Step("b", step, writes=["*.md"])],
+    )
+
+
+def test_logs_come_out_in_step_order(caplog):
+    first_logged = threading.Event()
+
+    def first():
+        first_logged.wait(timeout=5)
+        logging.warning("first")
+
+    def second():
+        logging.warning("second")
+        first_logged.set()
+
+    context = RunContext(Path("."))
+    run_steps(context, [Step("first", first), Step("second", second)])
+
+    assert [record.getMessage() for record in caplog.records] == ["first", "second"]
+
+
+def test_results_and_queued_steps():
+    order = []
+    context = RunContext(Path("."))
+    context.add_step(Step("queued", lambda: order.append("queued"), writes=["*"]))
+
+    result = run_steps(
+        context,
+        [Step("fails", lambda: 1), Step("works", lambda: order.append("works"))],
+    )
+
+    assert result == 1
+    assert order == ["works", "queued"]
+    assert not context.queued_steps
+    assert [t.name for t in context.step_reports[0].timings] == [
+        "fails",
+        "works",
+        "queued",
+    ]
+
+
+def test_exceptions_propagate(caplog):
+    def broken():
+        logging.warning("about to break")
+        raise RuntimeError("broken")
+
+    context = RunContext(Path("."))
+    with pytest.raises(RuntimeError):
+        run_steps(context, [Step("broken", broken)])
+    assert [record.getMessage() for record in caplog.records] == ["about to break"]
+
+
+def test_critical_path():
+    timings = [
+        StepTiming("refactor", 0.0, 5.0),
+        StepTiming("requirements", 0.0, 1.0),
+        StepTiming("names", 5.0, 6.0),
+        StepTiming("config", 0.0, 2.0),
+    ]
+    dependencies = {
+        "refactor": set(),
+        "requirements": set(),
+        "names": {"refactor", "requirements"},
+        "config": set(),
+    }
+
+    assert [t.name for t in critical_path(timings, dependencies)] == [
+        "refactor",
+        "names",
+    ]
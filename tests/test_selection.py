@@ -0,0 +1,122 @@
+from lib2to3.refactor import get_fixers_from_package
+
+import pytest
+
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.context import Selection
+from baseplate_py_upgrader.context import split_names
+from baseplate_py_upgrader.refactor import filter_by_keywords
+from baseplate_py_upgrader.refactor import get_fixer_keywords
+from baseplate_py_upgrader.refactor import refactor_python_files
+from baseplate_py_upgrader.scan import file_contains_any
+from baseplate_py_upgrader.updaters import get_fixer_names
+from baseplate_py_upgrader.updaters import UPDATERS
+
+
+FIXERS = [
+    fixer
+    for module_name in UPDATERS.values()
+    if module_name
+    for fixer in get_fixers_from_package(module_name)
+]
+
+
+def test_selection_stages():
+    everything = Selection()
+    assert everything.wants_stage("python")
+    assert everything.wants_fixer("sentry")
+
+    stages = Selection(select=frozenset({"config", "docker"}))
+    assert stages.wants_stage("config")
+    assert not stages.wants_stage("python")
+    assert not stages.wants_fixer("sentry")
+
+    ignored = Selection(ignore=frozenset({"requirements"}))
+    assert not ignored.wants_stage("requirements")
+    assert ignored.wants_stage("python")
+
+
+def test_selection_fixers():
+    fixers = Selection(select=frozenset({"sentry"}))
+    assert fixers.wants_stage("python")
+    assert not fixers.wants_stage("config")
+    assert fixers.wants_fixer("sentry")
+    assert not fixers.wants_fixer("rules")
+
+    ignored = Selection(ignore=frozenset({"sentry"}))
+    assert ignored.wants_stage("python")
+    assert not ignored.wants_fixer("sentry")
+    assert ignored.wants_fixer("rules")
+
+    python = Selection(select=frozenset({"python"}), ignore=frozenset({"rules"}))
+    assert python.wants_fixer("sentry")
+    assert not python.wants_fixer("rules")
+
+    assert not Selection(ignore=frozenset({"python"})).wants_fixer("sentry")
+
+
+def test_split_names():
+    assert split_names(None) == []
+    assert split_names(["sentry, rules", "config,"]) == ["sentry", "rules", "config"]
+
+
+def test_fixer_names():
+    assert {"sentry", "rules", "module_usage", "thrift_entrypoint"} <= (
+        get_fixer_names()
+    )
+
+
+@pytest.mark.parametrize("fixer", FIXERS)
+def test_fixer_keywords(fixer):
+    keywords = get_fixer_keywords([fixer])
+    assert keywords
+
+    # keywords must be literal names from the fixer's pattern, if it has one
+    # that's more than a token type
+    module = __import__(fixer, fromlist=["*"])
+    fixer_class = next(
+        value
+        for name, value in vars(module).items()
+        if name.startswith("Fix") and isinstance(value, type)
+    )
+    if isinstance(fixer_class.PATTERN, str) and "<" in fixer_class.PATTERN:
+        for keyword in keywords:
+            assert keyword.decode("utf8") in fixer_class.PATTERN
+
+
+def test_file_contains_any(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text("raven.captureException()\n")
+
+    assert file_contains_any(path, [b"sentry", b"raven"])
+    assert file_contains_any(path, [b"raven"])
+    assert not file_contains_any(path, [b"sentry", b"baseplate"])
+
+
+def test_filter_by_keywords(tmp_path):
+    (tmp_path / "a.py").write_text("import baseplate\n")
+    (tmp_path / "b.py").write_text("self.sentry.captureMessage('hi')\n")
+    (tmp_path / "c.py").write_text("import io\n")
+    paths = sorted(tmp_path.glob("*.py"))
+    context = RunContext(tmp_path, check=True)
+
+    assert filter_by_keywords(context, paths, [b"baseplate", b"sentry"]) == paths[:2]
+
+
+def test_refactor_selected_fixers(tmp_path):
+    (tmp_path / "a.py").write_text(
+        "from baseplate.lib.experiments import experiments_client_from_config\n"
+    )
+    (tmp_path / "b.py").write_text("context.sentry.captureException()\n")
+
+    context = RunContext(
+        tmp_path, check=True, selection=Selection(select=frozenset({"sentry"}))
+    )
+    refactor_python_files(tmp_path, "baseplate_py_upgrader.fixes.v2_0", context)
+    assert context.changed_files == [tmp_path / "b.py"]
+
+    context = RunContext(
+        tmp_path, check=True, selection=Selection(ignore=frozenset({"python"}))
+    )
+    refactor_python_files(tmp_path, "baseplate_py_upgrader.fixes.v2_0", context)
+    assert context.changed_files == []
@@ -0,0 +1,75 @@
+import argparse
+import json
+import shutil
+
+import pytest
+
+from baseplate_py_upgrader.inventory import FileInventory
+from baseplate_py_upgrader.shard import parse_shard
+
+
+@pytest.fixture
+def service_files(service_files):
+    files = dict(service_files)
+    del files["app.py"]
+    for i in range(8):
+        files[f"module{i}.py"] = "import io\n"
+    files["module5.py"] = service_files["app.py"]
+    return files
+
+
+def test_parse_shard():
+    assert parse_shard("1/3") == (0, 3)
+    assert parse_shard("3/3") == (2, 3)
+    for invalid in ("0/3", "4/3", "3", "a/b"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(invalid)
+
+
+def test_shards_partition_files(service):
+    all_files = FileInventory(service).files()
+    sharded = [FileInventory(service, shard=(i, 3)).files() for i in range(3)]
+
+    assert sorted(sum(sharded, [])) == sorted(all_files)
+    assert all(sharded)
+
+
+def test_shard_and_merge(pypi, tmp_path, service, run, snapshot):
+    full = tmp_path / "full"
+    shutil.copytree(service, full)
+    assert run(full) == 0
+
+    results = []
+    for i in range(1, 4):
+        clone = tmp_path / f"shard{i}"
+        shutil.copytree(service, clone)
+        result = tmp_path / f"shard{i}.json"
+        assert run(clone, "--shard", f"{i}/3", "--shard-output", result) == 0
+        assert (clone / "requirements.txt").read_text() == (
+            service / "requirements.txt"
+        ).read_text()
+        results.append(result)
+
+    names_seen = set()
+    for result in results:
+        names_seen.update(json.loads(result.read_text())["names_seen"])
+    assert "baseplate.lib.experiments" in names_seen
+
+    args = []
+    for result in results:
+        args.extend(["--merge", result])
+    assert run(service, *args) == 0
+
+    assert snapshot(service) == snapshot(full)
+    assert "reddit-experiments==1.0.3" in (service / "requirements.txt").read_text()
+
+
+def test_merge_requires_every_shard(pypi, tmp_path, service, run, snapshot):
+    clone = tmp_path / "clone"
+    shutil.copytree(service, clone)
+    result = tmp_path / "shard1.json"
+    assert run(clone, "--shard", "1/2", "--shard-output", result) == 0
+
+    before = snapshot(service)
+    assert run(service, "--merge", result) == 1
+    assert snapshot(service) == before
@@ -0,0 +1,103 @@
+import ast
+import textwrap
+
+from baseplate_py_upgrader.symbols import find_references
+from baseplate_py_upgrader.symbols import ImportIndex
+
+
+def references(source):
+    tree = ast.parse(textwrap.dedent(source))
+    return [(r.name, r.line) for r in find_references(tree)]
+
+
+def test_plain_imports():
+    found = references(
+        """\
+        import baseplate.lib.metrics
+        baseplate.lib.metrics.Timer()
+        """
+    )
+    assert found == [("baseplate.lib.metrics", 1), ("baseplate.lib.metrics.Timer", 2)]
+
+
+def test_aliases():
+    assert references(
+        """\
+        import baseplate.lib.metrics as metrics
+        from baseplate import lib
+        from baseplate.lib.experiments import experiments_client_from_config as ecfc
+        metrics.Timer
+        lib.metrics.Timer(ecfc())
+        """
+    ) == [
+        ("baseplate.lib.metrics", 1),
+        ("baseplate.lib", 2),
+        ("baseplate.lib.experiments.experiments_client_from_config", 3),
+        ("baseplate.lib.metrics.Timer", 4),
+        ("baseplate.lib.metrics.Timer", 5),
+        ("baseplate.lib.experiments.experiments_client_from_config", 5),
+    ]
+
+
+def test_unrelated_names_are_ignored():
+    found = references(
+        """\
+        import os.path as baseplate_path
+        from .baseplate import lib
+        from requests import Session
+        lib.metrics
+        Session().get
+        """
+    )
+    assert found == []
+
+
+def test_rebound_aliases_are_ignored():
+    assert references(
+        """\
+        from baseplate import crypto, config
+        import baseplate.lib.metrics as metrics
+        def check(crypto, a, b):
+            return crypto.constant_time_compare(a, b)
+        for metrics in []:
+            metrics.Timer
+        config.String
+        """
+    ) == [
+        ("baseplate.crypto", 1),
+        ("baseplate.config", 1),
+        ("baseplate.lib.metrics", 2),
+        ("baseplate.config.String", 7),
+    ]
+
+
+def test_aliases_bound_to_something_else_are_ignored():
+    assert references(
+        """\
+        from baseplate import config
+        import baseplate.lib.metrics as metrics
+        import baseplate.lib.tracing as metrics
+        import config
+        config.String
+        metrics.Timer
+        """
+    ) == [
+        ("baseplate.config", 1),
+        ("baseplate.lib.metrics", 2),
+        ("baseplate.lib.tracing", 3),
+    ]
+
+
+def test_import_index(tmp_path):
+    (tmp_path / "plain.py").write_text("import baseplate\nbaseplate.config.String\n")
+    (tmp_path / "aliased.py").write_text(
+        "import baseplate\nfrom baseplate import config as cfg\n"
+    )
+    (tmp_path / "other.py").write_text("import os\n")
+    (tmp_path / "broken.py").write_text("from baseplate import (\n")
+
+    index = ImportIndex.build(sorted(tmp_path.glob("*.py")))
+
+    assert len(index) == 1
+    assert index.aliases(str(tmp_path / "aliased.py")) == {"cfg": "baseplate.config"}
+    assert index.aliases(str(tmp_path / "plain.py")) == {}
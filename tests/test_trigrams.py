@@ -0,0 +1,105 @@
+import os
+import subprocess
+
+from baseplate_py_upgrader import trigrams
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.fixes.v0_29 import fix_thrift_compiler_references
+from baseplate_py_upgrader.trigrams import default_index_path
+from baseplate_py_upgrader.trigrams import TrigramIndex
+
+
+def make_index(tmp_path):
+    return TrigramIndex(tmp_path / "index" / "trigrams.sqlite3", tmp_path)
+
+
+def write(path, content):
+    path.write_bytes(content)
+    # make sure a rewrite is noticed even on coarse filesystem clocks
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_candidates(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"run thrift1 here")
+    (tmp_path / "b.txt").write_bytes(b"run thrift here, then 1")
+    (tmp_path / "c.bin").write_bytes(b"\0thrift1")
+    paths = sorted(tmp_path.glob("*.*"))
+
+    index = make_index(tmp_path)
+
+    assert index.candidates(b"thrift1", paths) == [tmp_path / "a.txt"]
+    assert index.candidates(b"here", paths) == [
+        tmp_path / "a.txt",
+        tmp_path / "b.txt",
+    ]
+    assert index.candidates(b"th", paths) == paths
+
+
+def test_big_files_are_always_candidates(monkeypatch, tmp_path):
+    monkeypatch.setattr(trigrams, "MAX_INDEXED_SIZE", 4)
+    (tmp_path / "big.txt").write_bytes(b"nothing to see")
+
+    index = make_index(tmp_path)
+
+    assert index.candidates(b"thrift1", [tmp_path / "big.txt"]) == [
+        tmp_path / "big.txt"
+    ]
+
+
+def test_updates_incrementally(tmp_path):
+    a = tmp_path / "a.txt"
+    b = tmp_path / "b.txt"
+    c = tmp_path / "c.txt"
+    write(a, b"thrift1")
+    write(b, b"thrift")
+    write(c, b"thrift")
+
+    index = make_index(tmp_path)
+    assert index.refresh([a, b, c]) == 3
+    index.close()
+
+    write(b, b"thrift1")
+    c.unlink()
+    # touched but not changed
+    write(a, b"thrift1")
+
+    index = make_index(tmp_path)
+    assert index.refresh([a, b]) == 1
+    assert index.candidates(b"thrift1", [a, b]) == [a, b]
+    assert index.connection.execute("SELECT COUNT(*) FROM files").fetchone() == (2,)
+
+
+def test_invalidate(tmp_path):
+    path = tmp_path / "a.txt"
+    write(path, b"thrift")
+    index = make_index(tmp_path)
+    assert index.candidates(b"thrift1", [path]) == []
+
+    write(path, b"thrift1")
+    assert index.candidates(b"thrift1", [path]) == []
+
+    index.invalidate(path)
+    assert index.candidates(b"thrift1", [path]) == [path]
+
+
+def test_default_index_path(monkeypatch, tmp_path):
+    monkeypatch.setenv("BASEPLATE_PY_UPGRADER_CACHE_DIR", str(tmp_path / "cache"))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+
+    assert default_index_path(repo).parent == tmp_path / "cache" / "trigrams"
+
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    assert default_index_path(repo) == repo / ".git" / trigrams.TRIGRAMS_NAME
+
+
+def test_stage_uses_index(tmp_path):
+    (tmp_path / "Makefile").write_text("thrift1 -gen py foo.thrift\n")
+    (tmp_path / "other.mk").write_text("echo thrift\n")
+    index = make_index(tmp_path)
+    context = RunContext(tmp_path, check=True, trigram_index=index)
+
+    fix_thrift_compiler_references(context)
+
+    assert context.changed_files == [tmp_path / "Makefile"]
+    assert context.files_containing(b"thrift1", [tmp_path / "other.mk"]) == []
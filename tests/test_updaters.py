@@ -0,0 +1,68 @@
+import sys
+
+import pytest
+
+from baseplate_py_upgrader import get_target_series
+from baseplate_py_upgrader import get_upgrades
+from baseplate_py_upgrader import updaters
+from baseplate_py_upgrader import UPGRADES
+from baseplate_py_upgrader.fixes.v2_0 import update as update_2_0
+from baseplate_py_upgrader.updaters import get_updater
+from baseplate_py_upgrader.updaters import no_op_upgrade
+from baseplate_py_upgrader.updaters import UPDATERS
+
+
+def test_every_upgrade_target_has_an_updater():
+    for target in UPGRADES.values():
+        assert target in UPDATERS
+
+
+def test_get_updater():
+    assert get_updater("2.0") is update_2_0
+    assert get_updater("2.1") is no_op_upgrade
+
+
+def test_get_updater_unknown_series():
+    with pytest.raises(KeyError):
+        get_updater("99.0")
+
+
+def test_series_modules_are_imported_on_demand():
+    for name in list(sys.modules):
+        if name.startswith("baseplate_py_upgrader.fixes.v1_3"):
+            del sys.modules[name]
+
+    assert get_target_series("1.2.4") == "1.3"
+    assert "baseplate_py_upgrader.fixes.v1_3" not in sys.modules
+
+    get_updater("1.3")
+    assert "baseplate_py_upgrader.fixes.v1_3" in sys.modules
+
+
+@pytest.fixture
+def plugins(monkeypatch):
+    metadata = pytest.importorskip("importlib.metadata")
+
+    def register(*series):
+        entry_points = [
+            metadata.EntryPoint(
+                name, "baseplate_py_upgrader.updaters:no_op_upgrade", "unused"
+            )
+            for name in series
+        ]
+        monkeypatch.setattr(updaters, "_entry_points", lambda: entry_points)
+
+    return register
+
+
+def test_plugin_series_are_upgraded_to(plugins):
+    plugins("2.8", "2.7", "1.0", "banana")
+
+    upgrades = get_upgrades()
+    assert upgrades["2.6"] == "2.7"
+    assert upgrades["2.7"] == "2.8"
+    # built-in upgrades win
+    assert upgrades["0.30"] == "1.0"
+
+    assert get_target_series("2.6.1") == "2.7"
+    assert get_updater("2.7") is no_op_upgrade
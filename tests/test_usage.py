@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+from baseplate_py_upgrader.fixes.common import RenamedSymbols
+from baseplate_py_upgrader.fixes.common.rules import AttributeRename
+from baseplate_py_upgrader.fixes.common.rules import KeywordRename
+from baseplate_py_upgrader.fixes.common.rules import RuleSet
+from baseplate_py_upgrader.fixes.common.rules import WarnOnUse
+from baseplate_py_upgrader.usage import UsageIndex
+from baseplate_py_upgrader.usage import UsageRules
+
+
+RULES = UsageRules(
+    [
+        ("1.0", RenamedSymbols({"baseplate.core": "baseplate"})),
+        ("2.0", RenamedSymbols({"baseplate.lib.experiments": None})),
+    ],
+    [("2.0", RuleSet([WarnOnUse("configure_metrics", "Use configure_observers().")]))],
+)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = UsageIndex(tmp_path / "index" / "usage.sqlite3")
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def repos(tmp_path):
+    a = tmp_path / "a"
+    a.mkdir()
+    (a / "app.py").write_text(
+        "import baseplate.lib.experiments as experiments\n"
+        "from baseplate.core import Baseplate\n"
+        "baseplate = Baseplate()\n"
+        "baseplate.configure_metrics(experiments.x)\n"
+    )
+    b = tmp_path / "b"
+    b.mkdir()
+    (b / "app.py").write_text("from baseplate.lib.metrics import Timer\n")
+    return a, b
+
+
+def test_query(index, repos):
+    a, b = repos
+    index.scan(a, RULES)
+    index.scan(b, RULES)
+
+    hits = index.query("baseplate.lib.experiments")
+    assert [(hit.path, hit.line, hit.symbol, hit.note) for hit in hits] == [
+        ("app.py", 1, "baseplate.lib.experiments", "removed"),
+        ("app.py", 4, "baseplate.lib.experiments.x", "removed"),
+    ]
+
+    hits = index.query("baseplate.core")
+    assert [(hit.line, hit.series, hit.note) for hit in hits] == [
+        (2, "1.0", "renamed to baseplate.Baseplate"),
+        (3, "1.0", "renamed to baseplate.Baseplate"),
+    ]
+
+    [hit] = index.query("configure_metrics")
+    assert (hit.line, hit.series, hit.note) == (4, "2.0", "Use configure_observers().")
+
+    assert index.repos("baseplate.lib") == [(str(a), 2), (str(b), 1)]
+    assert index.repos("baseplate.lib", deprecated=True) == [(str(a), 2)]
+    assert index.query("baseplate.li") == []
+
+
+def test_rescans_are_incremental(index, repos):
+    a, _ = repos
+    assert index.scan(a, RULES).scanned == 1
+    assert index.scan(a, RULES).scanned == 0
+
+    # same content, new mtime: hashed but not scanned again
+    stat = (a / "app.py").stat()
+    os.utime(a / "app.py", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert index.scan(a, RULES).scanned == 0
+
+    (a / "app.py").write_text("import baseplate.lib.metrics\n")
+    (a / "new.py").write_text("import baseplate.core\n")
+    stats = index.scan(a, RULES)
+    assert (stats.files, stats.scanned) == (2, 2)
+    assert index.query("baseplate.lib.experiments") == []
+
+    (a / "new.py").unlink()
+    assert index.scan(a, RULES).removed == 1
+    assert index.query("baseplate.core") == []
+
+
+def test_changed_rules_rescan_everything(index, repos):
+    a, _ = repos
+    index.scan(a, RULES)
+
+    new_rules = UsageRules([("1.0", RenamedSymbols({"baseplate.core": "baseplate"}))])
+    assert index.scan(a, new_rules).scanned == 1
+    assert index.query("configure_metrics") == []
+
+
+def test_attribute_and_keyword_renames(index, tmp_path):
+    rules = UsageRules(
+        [],
+        [
+            (
+                "2.0",
+                RuleSet(
+                    [
+                        AttributeRename(("request", "context"), "trace", "span"),
+                        KeywordRename(
+                            ("ThriftClient",), "max_retries", "max_connection_attempts"
+                        ),
+                    ]
+                ),
+            )
+        ],
+    )
+    (tmp_path / "app.py").write_text(
+        "span = request.trace\n"
+        "other.trace\n"
+        "client = clients.ThriftClient(\n"
+        "    max_retries=3,\n"
+        ")\n"
+        "Other(max_retries=3)\n"
+    )
+
+    index.scan(tmp_path, rules)
+
+    assert [(hit.line, hit.symbol, hit.note) for hit in index.query("request")] == [
+        (1, "request.trace", "renamed to span")
+    ]
+    assert [(hit.line, hit.note) for hit in index.query("ThriftClient")] == [
+        (4, "keyword renamed to max_connection_attempts")
+    ]
+    assert index.query("other") == index.query("Other") == []
+
+
+def test_unparseable_files_are_recorded(index, tmp_path):
+    (tmp_path / "broken.py").write_text("import baseplate.core\ndef (\n")
+    (tmp_path / "app.py").write_text("import baseplate.core\n")
+
+    stats = index.scan(tmp_path, RULES)
+    [(path, error)] = stats.unparseable
+    assert path == "broken.py"
+    assert error
+    assert [hit.path for hit in index.query("baseplate.core")] == ["app.py"]
+
+    # still reported when the file wasn't scanned again
+    assert index.scan(tmp_path, RULES).unparseable == stats.unparseable
+
+    (tmp_path / "broken.py").write_text("import baseplate.core\n")
+    assert index.scan(tmp_path, RULES).unparseable == []
+    assert len(index.query("baseplate.core")) == 2
@@ -0,0 +1,125 @@
+import sys
+import time
+
+from pathlib import Path
+
+import pytest
+
+from baseplate_py_upgrader.context import RunContext
+from baseplate_py_upgrader.refactor import BaseplateRefactoringTool
+from baseplate_py_upgrader.refactor import refactor_python_files
+from baseplate_py_upgrader.workers import WorkerError
+from baseplate_py_upgrader.workers import WorkerSettings
+
+
+FIX_PACKAGE = "baseplate_py_upgrader.fixes.v2_0"
+
+
+@pytest.fixture
+def service_files():
+    files = {
+        f"module{i}.py": "from baseplate.lib.experiments import foo\n" for i in range(5)
+    }
+    files["clean.py"] = "import io\n"
+    return files
+
+
+@pytest.fixture
+def slow_file(monkeypatch):
+    refactor_file = BaseplateRefactoringTool.refactor_file
+
+    def slow_refactor_file(self, filename, *args, **kwargs):
+        if Path(filename).name == "slow.py":
+            time.sleep(30)
+        return refactor_file(self, filename, *args, **kwargs)
+
+    # workers are forked, so they pick this up too
+    monkeypatch.setattr(BaseplateRefactoringTool, "refactor_file", slow_refactor_file)
+
+
+def test_workers_match_in_process(service, tmp_path_factory):
+    copy = tmp_path_factory.mktemp("copy")
+    for path in service.glob("*.py"):
+        (copy / path.name).write_text(path.read_text())
+
+    in_process = RunContext(service, check=True)
+    refactor_python_files(service, FIX_PACKAGE, in_process)
+
+    supervised = RunContext(copy, check=True, workers=WorkerSettings(jobs=3))
+    refactor_python_files(copy, FIX_PACKAGE, supervised)
+
+    assert supervised.names_seen == in_process.names_seen
+    assert [p.name for p in supervised.changed_files] == [
+        p.name for p in in_process.changed_files
+    ]
+    assert not supervised.skipped_files
+
+
+def test_workers_write_changes(service):
+    context = RunContext(
+        service, workers=WorkerSettings(jobs=2, max_files_per_worker=2)
+    )
+    refactor_python_files(service, FIX_PACKAGE, context)
+
+    assert len(context.changed_files) == 5
+    for i in range(5):
+        assert "reddit_experiments" in (service / f"module{i}.py").read_text()
+    assert (service / "clean.py").read_text() == "import io\n"
+
+
+def test_slow_file_is_skipped(service, slow_file):
+    (service / "slow.py").write_text("import baseplate\n")
+    context = RunContext(service, check=True, workers=WorkerSettings(file_timeout=1))
+
+    start = time.monotonic()
+    refactor_python_files(service, FIX_PACKAGE, context)
+
+    assert time.monotonic() - start < 15
+    assert [(path.name, reason) for path, reason in context.skipped_files] == [
+        ("slow.py", "took longer than 1 seconds")
+    ]
+    assert "baseplate.lib.experiments" in context.names_seen
+
+
+def test_fixer_bugs_fail_the_run(service, monkeypatch):
+    refactor_file = BaseplateRefactoringTool.refactor_file
+
+    def buggy_refactor_file(self, filename, *args, **kwargs):
+        if Path(filename).name == "buggy.py":
+            raise KeyError("oops")
+        return refactor_file(self, filename, *args, **kwargs)
+
+    monkeypatch.setattr(BaseplateRefactoringTool, "refactor_file", buggy_refactor_file)
+    (service / "buggy.py").write_text("import baseplate\n")
+    context = RunContext(service, check=True, workers=WorkerSettings(jobs=2))
+
+    with pytest.raises(WorkerError, match="KeyError: 'oops'"):
+        refactor_python_files(service, FIX_PACKAGE, context)
+    assert not context.skipped_files
+
+
+@pytest.mark.skipif(
+    sys.platform != "linux", reason="RLIMIT_AS is only enforced on Linux"
+)
+def test_memory_hog_is_skipped(service, monkeypatch):
+    refactor_file = BaseplateRefactoringTool.refactor_file
+
+    def greedy_refactor_file(self, filename, *args, **kwargs):
+        if Path(filename).name == "greedy.py":
+            bytearray(1024 * 1024 * 1024)
+        return refactor_file(self, filename, *args, **kwargs)
+
+    monkeypatch.setattr(BaseplateRefactoringTool, "refactor_file", greedy_refactor_file)
+    (service / "greedy.py").write_text("import baseplate\n")
+    context = RunContext(
+        service,
+        check=True,
+        workers=WorkerSettings(file_memory_limit=512 * 1024 * 1024),
+    )
+
+    refactor_python_files(service, FIX_PACKAGE, context)
+
+    assert [(path.name, reason) for path, reason in context.skipped_files] == [
+        ("greedy.py", "exceeded its memory budget")
+    ]
+    assert len(context.changed_files) == 5